@@ -0,0 +1,169 @@
+import argparse
+import glob
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import matplotlib
+
+matplotlib.use('Agg')  # no display is needed, figures are only written to files
+
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+import seaborn as sns
+
+from DataController import DataController
+from ParallelIngest import ParallelIngest
+from ViolationAggregation import ViolationAggregation
+
+DATASET_NAMES = ['violations', 'inspections', 'inventory']
+AVERAGE_CHOICES = {'by type of vendor’s seating': 'averages_by_seating', 'by zip code': 'averages_by_zip'}
+DEFAULT_FORMATS = ['png', 'svg']
+DEFAULT_TOP_CODES = 14
+
+
+class BatchRunner(object):
+    """" runs the load, clean, aggregate and plot pipeline without the GUI, writing the results to a directory."""
+
+    @staticmethod
+    def find_files(source):
+        """" returns the csv files of a data set, given as a directory or a comma separated list of files."""
+        if os.path.isdir(source):
+            return sorted(glob.glob(os.path.join(source, '*.csv')))
+        return source.split(',')
+
+    @staticmethod
+    def load_dataset(filenames, workers=1):
+        """" reads and prepares the three csv files, across worker processes unless workers is 1."""
+        if workers != 1:
+            return ParallelIngest.ingest_dataset(filenames, workers)
+        roles = DataController.get_file_roles(filenames)
+        dataset = [DataController.read_csv_to_frame(roles[name])[1] for name in DATASET_NAMES]
+        dataset[0] = dataset[0].set_index("SERIAL NUMBER")
+        return dataset
+
+    @staticmethod
+    def save_figure(figure, output_dir, name, formats):
+        """" writes the figure in each of the formats and returns the paths."""
+        FigureCanvasAgg(figure)
+        paths = [os.path.join(output_dir, f"{name}.{file_format}") for file_format in formats]
+        for path in paths:
+            figure.savefig(path, bbox_inches='tight')
+        return paths
+
+    @staticmethod
+    def run_dataset(source, output_dir, workers=1, formats=DEFAULT_FORMATS, number=DEFAULT_TOP_CODES):
+        """" runs the pipeline on one data set and returns the seconds taken by each stage and the files written."""
+        os.makedirs(output_dir, exist_ok=True)
+        timings = {}
+        clock = [time.perf_counter()]
+
+        def stage_done(stage):
+            now = time.perf_counter()
+            timings[stage] = now - clock[0]
+            clock[0] = now
+
+        files = []
+        dataset = BatchRunner.load_dataset(BatchRunner.find_files(source), workers)
+        stage_done('ingest')
+
+        clean_timings = {}
+        violations, inspections, inventory = DataController.clean_dataset(dataset, timings=clean_timings)
+        del dataset
+        timings.update({f"clean: {stage}": seconds for stage, seconds in clean_timings.items()})
+        clock[0] = time.perf_counter()
+
+        for choice, name in AVERAGE_CHOICES.items():
+            path = os.path.join(output_dir, f"{name}.csv")
+            DataController.averages(choice, inspections).to_csv(path, index=False)
+            files.append(path)
+        stage_done('averages')
+
+        code_counts = DataController.violation_code_counts(violations, number)
+        zip_counts = DataController.violation_zip_counts(violations)
+        aggregate = ViolationAggregation.aggregate(violations, inspections)
+        establishment_counts = ViolationAggregation.top(aggregate['code'], number)
+        category_counts = ViolationAggregation.top(aggregate['category'])
+        for counts, name in [(code_counts, 'violation_code_counts'), (zip_counts, 'violation_zip_counts'),
+                             (establishment_counts, 'violation_code_establishments'),
+                             (category_counts, 'violation_category_establishments')]:
+            path = os.path.join(output_dir, f"{name}.csv")
+            counts.to_csv(path, index=False)
+            files.append(path)
+        stage_done('violation counts')
+
+        sns.set_theme(style="whitegrid")
+        bar_figure = Figure(figsize=(7, 7))
+        DataController.violation_bar_graph(None, number, bar_figure.subplots(), counts=establishment_counts)
+        files += BatchRunner.save_figure(bar_figure, output_dir, 'violation_bar_graph', formats)
+        category_figure = Figure(figsize=(7, 7))
+        ax = DataController.violation_bar_graph(None, None, category_figure.subplots(), counts=category_counts)
+        ax.tick_params(axis='x', labelrotation=90)
+        category_figure.tight_layout()
+        files += BatchRunner.save_figure(category_figure, output_dir, 'violation_category_graph', formats)
+        scatter_figure = Figure(figsize=(7, 7))
+        DataController.violation_scatter_graph(None, scatter_figure.subplots(), counts=zip_counts)
+        files += BatchRunner.save_figure(scatter_figure, output_dir, 'violation_scatter_graph', formats)
+        stage_done('graphs')
+
+        rows = {'violations': len(violations), 'inspections': len(inspections), 'inventory': len(inventory)}
+        result = {'source': source, 'output': output_dir, 'rows': rows, 'timings': timings,
+                  'total_seconds': sum(timings.values()), 'files': files}
+        with open(os.path.join(output_dir, 'timings.json'), 'w') as outFile:
+            json.dump(result, outFile, indent=2)
+        return result
+
+    @staticmethod
+    def output_names(sources):
+        """" returns the name of the output directory of each data set, numbering the names that repeat."""
+        names = []
+        for source in sources:
+            name = os.path.basename(os.path.normpath(source.split(',')[0]))
+            unique, count = name, 1
+            while unique in names:
+                count += 1
+                unique = f"{name}-{count}"
+            names.append(unique)
+        return names
+
+    @staticmethod
+    def run_datasets(sources, output_dir, jobs=1, workers=1, formats=DEFAULT_FORMATS, number=DEFAULT_TOP_CODES):
+        """" runs the pipeline on each data set, jobs at a time, yielding the result of each as it finishes.
+
+        The results of each data set go in a directory of the output named after the data set, with a
+        number added when data sets from different places have the same name. Each result holds its
+        source and output directory, as they are not yielded in the order of the sources.
+        """
+        outputs = [os.path.join(output_dir, name) for name in BatchRunner.output_names(sources)]
+        if jobs == 1:
+            for source, output in zip(sources, outputs):
+                yield BatchRunner.run_dataset(source, output, workers, formats, number)
+            return
+        with ProcessPoolExecutor(jobs) as executor:
+            futures = [executor.submit(BatchRunner.run_dataset, source, output, workers, formats, number)
+                       for source, output in zip(sources, outputs)]
+            for future in as_completed(futures):
+                yield future.result()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Clean the data sets and write their averages and graphs.")
+    parser.add_argument('datasets', nargs='+',
+                        help="a directory holding the three csv files, or the three files separated by commas")
+    parser.add_argument('--output', default='output', help="directory the results are written to")
+    parser.add_argument('--jobs', type=int, default=1, help="data sets to run at the same time")
+    parser.add_argument('--workers', type=int, default=1, help="worker processes to read each data set with")
+    parser.add_argument('--formats', nargs='+', default=DEFAULT_FORMATS, help="figure file formats")
+    parser.add_argument('--top', type=int, default=DEFAULT_TOP_CODES, help="violation codes in the bar graph")
+    args = parser.parse_args()
+    for result in BatchRunner.run_datasets(args.datasets, args.output, args.jobs, args.workers, args.formats,
+                                           args.top):
+        for stage, seconds in result['timings'].items():
+            print(json.dumps({'source': result['source'], 'stage': stage, 'seconds': seconds}))
+        print(json.dumps({'source': result['source'], 'stage': 'total', 'seconds': result['total_seconds'],
+                          'rows': result['rows']}))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,315 @@
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import matplotlib
+
+matplotlib.use('Agg')
+
+from matplotlib.figure import Figure
+import numpy as np
+import pandas as pd
+
+from DataController import DataController
+from DatabaseController import DatabaseController
+from SyntheticData import SyntheticData
+from ViolationAggregation import ViolationAggregation
+
+DATASET_NAMES = ['violations', 'inspections', 'inventory']
+# a stage this much slower than the baseline is reported as a regression
+REGRESSION_RATIO = 1.1
+# modules whose import cost is tracked by the startup benchmark
+STARTUP_MODULES = ['DataParser', 'DataController', 'DataJobs']
+# slow imports that should only be paid by the features that need them
+HEAVY_MODULES = ['pandas', 'matplotlib', 'seaborn', 'scipy', 'pymongo']
+# the imports listed as the largest part of the import cost of a module
+SLOWEST_IMPORTS = 5
+
+
+def legacy_avg_grouping(inspections, group_by):
+    """" the three groupby implementation of avg_grouping, kept to compare against."""
+    agg_data = inspections[[group_by, 'SCORE', 'ACTIVITY DATE']].groupby(
+        [pd.Grouper(key=group_by), pd.Grouper(key='ACTIVITY DATE', freq='Y')]).agg(
+        'mean').reset_index()
+    agg_data = agg_data.rename(columns={"SCORE": "mean grouped by year"})
+    median = inspections[[group_by, 'SCORE', 'ACTIVITY DATE']].groupby(
+        [pd.Grouper(key=group_by), pd.Grouper(key='ACTIVITY DATE', freq='Y')]).agg(
+        'median').reset_index()
+    median = median.rename(columns={"SCORE": "median grouped by year"})
+    mode = inspections[[group_by, 'SCORE', 'ACTIVITY DATE']].groupby(
+        [pd.Grouper(key=group_by), pd.Grouper(key='ACTIVITY DATE', freq='Y')]) \
+        .apply(pd.DataFrame.mode).dropna().set_index(group_by).reset_index()
+    mode = mode.rename(columns={"SCORE": "mode grouped by year"})
+    agg_data['median grouped by year'] = median['median grouped by year']
+    agg_data['mode grouped by year'] = mode['mode grouped by year']
+    return agg_data
+
+
+def make_inspections(rows, seed=0):
+    """" returns a random cleaned inspections dataframe with the columns the averages use."""
+    rng = np.random.default_rng(seed)
+    descriptions = ['RESTAURANT SEATS LOW RISK', 'RESTAURANT SEATS MODERATE RISK', 'RESTAURANT SEATS HIGH RISK',
+                    'FOOD MKT RETAIL LOW RISK', 'FOOD MKT RETAIL MODERATE RISK', 'FOOD MKT RETAIL HIGH RISK']
+    return pd.DataFrame({
+        'ACTIVITY DATE': pd.to_datetime('2015-01-01') + pd.to_timedelta(rng.integers(0, 5 * 365, rows), unit='D'),
+        'PE DESCRIPTION': rng.choice(descriptions, rows),
+        'Zip Codes': rng.integers(90001, 90400, rows),
+        'SCORE': rng.integers(60, 101, rows),
+    })
+
+
+def time_call(function, *args, repeat=3):
+    """" returns the best wall time in seconds of calling the function repeat times."""
+    best = float('inf')
+    for _ in range(repeat):
+        tic = time.perf_counter()
+        function(*args)
+        best = min(best, time.perf_counter() - tic)
+    return best
+
+
+def benchmark_avg_grouping(inspections, repeat=3):
+    """" times the single pass averages against the three groupby implementation."""
+    results = []
+    for group_by in ['PE DESCRIPTION', 'Zip Codes']:
+        legacy = time_call(legacy_avg_grouping, inspections, group_by, repeat=repeat)
+        current = time_call(DataController.avg_grouping, inspections, group_by, repeat=repeat)
+        results.append({'stage': 'avg_grouping', 'group_by': group_by, 'rows': len(inspections),
+                        'legacy_seconds': legacy, 'seconds': current, 'speedup': legacy / current})
+    return results
+
+
+def benchmark_clean_dataset(dataset, repeat=3):
+    """" times each stage of cleaning the data set, keeping the best time of each stage."""
+    best = {}
+    for _ in range(repeat):
+        timings = {}
+        DataController.clean_dataset([data.copy() for data in dataset], timings=timings)
+        for stage, seconds in timings.items():
+            best[stage] = min(best.get(stage, float('inf')), seconds)
+    rows = len(dataset[0])
+    results = [{'stage': 'clean_dataset', 'step': stage, 'rows': rows, 'seconds': seconds}
+               for stage, seconds in best.items()]
+    results.append({'stage': 'clean_dataset', 'step': 'total', 'rows': rows, 'seconds': sum(best.values())})
+    return results
+
+
+def measure(function, *args, repeat=3, memory=True):
+    """" returns the best wall time in seconds, the peak traced memory in MB and the result of the call.
+
+    The memory is traced on a separate call so the tracing does not slow down the timed calls.
+    """
+    seconds = time_call(function, *args, repeat=repeat)
+    peak = None
+    if memory:
+        tracemalloc.start()
+        try:
+            result = function(*args)
+            peak = tracemalloc.get_traced_memory()[1] / 2 ** 20
+        finally:
+            tracemalloc.stop()
+    else:
+        result = function(*args)
+    return seconds, peak, result
+
+
+def draw_graphs(violations):
+    """" draws the violation bar and scatter graphs on figures that are not shown."""
+    DataController.violation_bar_graph(violations, 14, Figure().subplots())
+    DataController.violation_scatter_graph(violations, Figure().subplots())
+
+
+def database_round_trip(data, name):
+    """" saves the table to a benchmark collection and reads it back."""
+    DataController.replace_database_collection(data, name)
+    return DataController.read_from_database(name)
+
+
+def benchmark_suite(filenames, repeat=3, memory=True, database=False):
+    """" times and traces the memory of each stage of the pipeline on the csv files of a data set."""
+    results = []
+
+    def record(stage, rows, seconds, peak, **extra):
+        results.append({'stage': stage, 'rows': rows, 'seconds': seconds, 'peak_mb': peak, **extra})
+
+    roles = DataController.get_file_roles(filenames)
+    dataset = []
+    for name in DATASET_NAMES:
+        seconds, peak, text = measure(DataController.convert_csv_to_json, roles[name], repeat=repeat, memory=memory)
+        record('convert_csv_to_json', None, seconds, peak, table=name)
+        seconds, peak, data = measure(DataController.prep_data, text, repeat=repeat, memory=memory)
+        record('prep_data', len(data), seconds, peak, table=name)
+        del text, data
+        seconds, peak, (_, data) = measure(DataController.read_csv_to_frame, roles[name], repeat=repeat,
+                                           memory=memory)
+        record('read_csv_to_frame', len(data), seconds, peak, table=name)
+        dataset.append(data)
+    dataset[0] = dataset[0].set_index("SERIAL NUMBER")
+
+    for result in benchmark_clean_dataset(dataset, repeat):
+        record(result['stage'], result['rows'], result['seconds'], None, step=result['step'])
+    seconds, peak, cleaned = measure(lambda: DataController.clean_dataset([data.copy() for data in dataset]),
+                                     repeat=1, memory=memory)
+    record('clean_dataset', len(dataset[0]), None, peak, step='memory')
+    violations, inspections, inventory = cleaned
+
+    for group_by in ['PE DESCRIPTION', 'Zip Codes']:
+        seconds, peak, _ = measure(DataController.avg_grouping, inspections, group_by, repeat=repeat, memory=memory)
+        record('avg_grouping', len(inspections), seconds, peak, group_by=group_by)
+    seconds, peak, _ = measure(draw_graphs, violations, repeat=repeat, memory=memory)
+    record('violation_graphs', len(violations), seconds, peak)
+    seconds, peak, _ = measure(ViolationAggregation.aggregate, violations, inspections, repeat=repeat, memory=memory)
+    record('violation_aggregation', len(violations), seconds, peak)
+
+    if database:
+        for name, data in zip(DATASET_NAMES, cleaned):
+            collection = f"benchmark {name}"
+            seconds, peak, _ = measure(database_round_trip, data, collection, repeat=repeat, memory=memory)
+            record('database_round_trip', len(data), seconds, peak, table=name)
+            DatabaseController.get_collection(collection).drop()
+    return results
+
+
+def run_python(script, *options):
+    """" runs the script in a fresh interpreter in the directory of the project and returns the finished process."""
+    return subprocess.run([sys.executable, *options, '-c', script], cwd=os.path.dirname(os.path.abspath(__file__)),
+                          capture_output=True, text=True)
+
+
+def slowest_imports(module, report):
+    """" returns the direct imports of the module that took longest, from the report of python -X importtime."""
+    lines = []
+    for line in report.splitlines():
+        if not line.startswith('import time:') or line.startswith('import time: self'):
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        lines.append((len(name) - len(name.lstrip()) - 1, int(cumulative), name.strip()))
+    # the imports of a module are reported before it, after the module at the same level that came before it
+    end = max(position for position, (depth, _, name) in enumerate(lines) if depth == 0 and name == module)
+    start = end
+    while start > 0 and lines[start - 1][0] > 0:
+        start -= 1
+    imports = sorted((line for line in lines[start:end] if line[0] == 2), key=lambda line: -line[1])
+    return {name: cumulative / 1e6 for _, cumulative, name in imports[:SLOWEST_IMPORTS]}
+
+
+def benchmark_import(module, repeat=3):
+    """" times importing the module in a fresh interpreter and lists the heavy modules it loads."""
+    script = (f"import sys, time\ntic = time.perf_counter()\nimport {module}\nprint(time.perf_counter() - tic)\n"
+              f"print(','.join(name for name in {HEAVY_MODULES!r} if name in sys.modules))")
+    best = float('inf')
+    for _ in range(repeat):
+        finished = run_python(script)
+        if finished.returncode:
+            return {'stage': 'startup', 'step': f"import {module}", 'rows': None, 'seconds': None,
+                    'error': finished.stderr.strip().splitlines()[-1:]}
+        seconds, heavy = finished.stdout.splitlines()[-2:]
+        best = min(best, float(seconds))
+    report = run_python(f"import {module}", '-X', 'importtime').stderr
+    return {'stage': 'startup', 'step': f"import {module}", 'rows': None, 'seconds': best,
+            'heavy_modules': [name for name in heavy.split(',') if name],
+            'slowest_imports': slowest_imports(module, report)}
+
+
+def benchmark_first_window(repeat=3):
+    """" times starting the GUI until its main window has been drawn, which needs a display."""
+    script = ("import time\ntic = time.perf_counter()\nimport DataParser\n\n\n"
+              "def ready(window):\n    window.update()\n    print(time.perf_counter() - tic)\n    window.destroy()\n\n\n"
+              "DataParser.data_viewer(on_ready=ready)\n")
+    best = float('inf')
+    for _ in range(repeat):
+        finished = run_python(script)
+        if finished.returncode:
+            return {'stage': 'startup', 'step': 'first window', 'rows': None, 'seconds': None,
+                    'error': finished.stderr.strip().splitlines()[-1:]}
+        best = min(best, float(finished.stdout.splitlines()[-1]))
+    return {'stage': 'startup', 'step': 'first window', 'rows': None, 'seconds': best}
+
+
+def benchmark_startup(repeat=3):
+    """" times importing the main modules and bringing up the main window, each in a fresh interpreter."""
+    return [benchmark_import(module, repeat) for module in STARTUP_MODULES] + [benchmark_first_window(repeat)]
+
+
+def result_key(result):
+    """" returns what identifies a result between runs."""
+    return tuple(sorted((key, str(value)) for key, value in result.items()
+                        if key not in ('seconds', 'peak_mb', 'legacy_seconds', 'speedup', 'heavy_modules',
+                                       'slowest_imports', 'error')))
+
+
+def compare_results(results, baseline):
+    """" returns the change in time of each stage against the results of a baseline run."""
+    baseline = {result_key(result): result for result in baseline}
+    changes = []
+    for result in results:
+        previous = baseline.get(result_key(result))
+        if previous is None or not previous.get('seconds') or result.get('seconds') is None:
+            continue
+        ratio = result['seconds'] / previous['seconds']
+        changes.append({**{key: value for key, value in result.items() if key not in ('seconds', 'peak_mb')},
+                        'baseline_seconds': previous['seconds'], 'seconds': result['seconds'], 'ratio': ratio,
+                        'regression': ratio > REGRESSION_RATIO})
+    return changes
+
+
+def current_commit():
+    """" returns the git commit being benchmarked, or None outside a git checkout."""
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=os.path.dirname(os.path.abspath(__file__)),
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the data controller.")
+    parser.add_argument('--rows', type=int, default=100000, help="rows of random inspections for avg_grouping")
+    parser.add_argument('--violations', type=int, default=300000, help="rows of synthetic violations")
+    parser.add_argument('--data', help="directory of csv files to use instead of synthetic data")
+    parser.add_argument('--seed', type=int, default=0, help="seed of the synthetic data")
+    parser.add_argument('--repeat', type=int, default=3, help="times to run each stage, the best is kept")
+    parser.add_argument('--no-memory', action='store_true', help="do not trace the peak memory of each stage")
+    parser.add_argument('--database', action='store_true', help="include the database round trip")
+    parser.add_argument('--output', help="file to write the results to as JSON")
+    parser.add_argument('--compare', help="results file of an earlier run to compare against")
+    parser.add_argument('--startup', action='store_true', help="only time the imports and the first window")
+    args = parser.parse_args()
+
+    results = benchmark_startup(args.repeat)
+    if not args.startup:
+        results += benchmark_avg_grouping(make_inspections(args.rows), args.repeat)
+        data_dir = args.data or tempfile.mkdtemp(prefix="benchmark")
+        try:
+            if args.data:
+                filenames = [os.path.join(data_dir, name) for name in os.listdir(data_dir) if name.endswith('.csv')]
+            else:
+                filenames = list(SyntheticData.write_dataset(data_dir, args.violations, args.seed).values())
+            results += benchmark_suite(filenames, args.repeat, not args.no_memory, args.database)
+        finally:
+            if not args.data:
+                shutil.rmtree(data_dir, ignore_errors=True)
+    for result in results:
+        print(json.dumps(result))
+
+    if args.output:
+        with open(args.output, 'w') as outFile:
+            json.dump({'commit': current_commit(), 'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                       'python': platform.python_version(), 'pandas': pd.__version__, 'config': vars(args),
+                       'results': results}, outFile, indent=2)
+    if args.compare:
+        with open(args.compare) as inFile:
+            baseline = json.load(inFile)
+        for change in compare_results(results, baseline['results']):
+            print(json.dumps(change))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,208 @@
+import numpy as np
+import pandas as pd
+
+from DataController import DataController, INSPECTION_DUPLICATE_COLUMNS
+from Instrumentation import instrumented
+from KeyCodes import KeyCodes, KEY_COLUMNS
+from LazyImport import LazyImport
+
+DatabaseController = LazyImport('DatabaseController', 'DatabaseController')
+
+DATASET_NAMES = ['violations', 'inspections', 'inventory']
+
+
+class DataAppend(object):
+    """" adds a newer export of the source files to a cleaned data set without cleaning the history again.
+
+    Only the new rows are cleaned. Rows already in the data set are found through hash indexes of
+    its SERIAL NUMBERs, which are packed into integers, so the new SERIAL NUMBERs are packed the same
+    way to be looked up. The new rows are cleaned as clean_dataset would clean them with the history:
+    the INACTIVE inspections are dropped, a SERIAL NUMBER with an INACTIVE inspection in the new
+    export loses every violation, those already in the data set included, and a facility with an
+    INACTIVE inspection in the new export is taken out of the inventory.
+
+    Two differences remain. The cleaned data set does not keep which facilities were INACTIVE in
+    earlier exports, so a facility that was only INACTIVE before is added back to the inventory if
+    the new inventory export lists it, where cleaning every export together would leave it out. And
+    rows already in the data set are taken to be exported again, so a new inspection with a SERIAL
+    NUMBER already loaded, or a violation with a SERIAL NUMBER and VIOLATION CODE already loaded, is
+    left out, where cleaning every export together would keep both.
+    """
+
+    @staticmethod
+    def key_index(column):
+        """" returns an index of the distinct values of the column, which holds its hash table once looked up."""
+        if hasattr(column, 'cat'):
+            return column.cat.categories
+        return pd.Index(pd.unique(column.to_numpy()))
+
+    @staticmethod
+    def key_codes(column, index):
+        """" returns the position in the key index of the value of each row."""
+        if hasattr(column, 'cat') and column.cat.categories is index:
+            return column.cat.codes.to_numpy()
+        return index.get_indexer(column)
+
+    @staticmethod
+    @instrumented
+    def read_delta(filenames):
+        """" reads the new csv files, any of the three can be left out, and returns their frames by role."""
+        delta = {}
+        for filename in filenames:
+            role, data = DataController.read_csv_to_frame(filename)
+            if role in delta:
+                raise ValueError(f"more than one {role} file")
+            delta[role] = data
+        return delta
+
+    @staticmethod
+    @instrumented
+    def clean_delta(dataset, delta):
+        """" cleans the new rows against the data set and returns what has to be added and removed.
+
+        The result holds the cleaned new rows of each table, the FACILITY IDs and SERIAL NUMBERs
+        with an INACTIVE inspection in the export, the rows of the data set that are replaced or
+        removed as masks, and the FACILITY IDs whose inventory is replaced.
+        """
+        violations, inspections, inventory = dataset
+        if 'SEAT NUMBERS' not in inspections.columns:
+            raise ValueError("the data set has to be cleaned before new rows are appended")
+        new_violations = delta.get('violations')
+        new_inspections = delta.get('inspections')
+        new_inventory = delta.get('inventory')
+        serial_index = DataAppend.key_index(inspections['SERIAL NUMBER'])
+
+        inactive_fid = pd.Index([])
+        inactive_sn = pd.Index([])
+        if new_inspections is not None:
+            new_inspections = new_inspections.drop(columns=INSPECTION_DUPLICATE_COLUMNS, errors='ignore')
+            active = new_inspections['PROGRAM STATUS'].eq('ACTIVE').to_numpy()
+            inactive_fid = pd.Index(pd.unique(new_inspections['FACILITY ID'].to_numpy()[~active]))
+            inactive_sn = pd.Index(pd.unique(new_inspections['SERIAL NUMBER'].to_numpy()[~active]))
+            # inspections already in the data set, or repeated in the export, are left out, as are the
+            # INACTIVE ones, which takes their violations out with them
+            new_serials = KeyCodes.matching(new_inspections['SERIAL NUMBER'], inspections['SERIAL NUMBER'])
+            new = (serial_index.get_indexer(new_serials) < 0) & \
+                ~new_inspections['SERIAL NUMBER'].duplicated().to_numpy()
+            new_inspections = new_inspections[new & active]
+            new_inspections = new_inspections.assign(**{'ACTIVITY DATE': pd.to_datetime(
+                new_inspections['ACTIVITY DATE'], infer_datetime_format=True)})
+            new_inspections = DataController.create_new_col_for_seat_numbers(new_inspections)
+
+        if new_violations is not None:
+            new_violations = new_violations.reset_index(drop=new_violations.index.name is None)
+            zips = np.full(len(new_violations), np.nan)
+            if new_inspections is not None:
+                new_serials = pd.Index(new_inspections['SERIAL NUMBER'].to_numpy())
+                positions = new_serials.get_indexer(new_violations['SERIAL NUMBER'])
+                zips[positions >= 0] = new_inspections['Zip Codes'].to_numpy(dtype='float64')[
+                    positions[positions >= 0]]
+            violation_serials = KeyCodes.matching(new_violations['SERIAL NUMBER'], inspections['SERIAL NUMBER'])
+            old_positions = serial_index.get_indexer(violation_serials)
+            late = np.isnan(zips) & (old_positions >= 0)
+            if late.any():
+                # the zip code of every serial number in the data set, for violations of earlier inspections
+                serial_codes = DataAppend.key_codes(inspections['SERIAL NUMBER'], serial_index)
+                serial_zip = np.full(len(serial_index), np.nan)
+                serial_zip[serial_codes[serial_codes >= 0]] = \
+                    inspections['Zip Codes'].to_numpy(dtype='float64')[serial_codes >= 0]
+                zips[late] = serial_zip[old_positions[late]]
+                # violations of earlier inspections may have been exported before
+                late_serials = KeyCodes.matching(pd.unique(violation_serials[late]), violations['SERIAL NUMBER'])
+                saved = violations[violations['SERIAL NUMBER'].isin(late_serials)]
+                saved_keys = pd.MultiIndex.from_arrays([saved['SERIAL NUMBER'].to_numpy(dtype=object),
+                                                        saved['VIOLATION CODE'].astype(object)])
+                new_keys = pd.MultiIndex.from_arrays([
+                    KeyCodes.matching(new_violations['SERIAL NUMBER'], violations['SERIAL NUMBER']).astype(object),
+                    new_violations['VIOLATION CODE'].astype(object)])
+                zips[late & new_keys.isin(saved_keys)] = np.nan
+            # as in clean_dataset, an INACTIVE inspection of the serial number takes its violations out,
+            # those of earlier inspections as well
+            zips[inactive_sn.get_indexer(new_violations['SERIAL NUMBER']) >= 0] = np.nan
+            new_violations = new_violations[~np.isnan(zips)].assign(**{'Zip Codes': zips[~np.isnan(zips)]})
+            new_violations = new_violations.astype({'Zip Codes': 'int64'})
+
+        replaced_inventory = np.zeros(len(inventory), dtype=bool)
+        if new_inventory is not None:
+            new_inventory = new_inventory[~new_inventory['FACILITY ID'].isin(inactive_fid)]
+            new_inventory = new_inventory.drop_duplicates(subset=['FACILITY ID'], keep='last')
+            new_inventory = DataController.create_new_col_for_seat_numbers(new_inventory)
+            # the newer export of a facility replaces the one in the data set
+            replaced_fid = inactive_fid.append(pd.Index(new_inventory['FACILITY ID'].to_numpy()))
+        else:
+            replaced_fid = inactive_fid
+        if len(replaced_fid):
+            replaced_inventory = inventory['FACILITY ID'].isin(
+                KeyCodes.matching(replaced_fid, inventory['FACILITY ID'])).to_numpy()
+
+        # the violations already in the data set of a serial number that is now INACTIVE are removed, its
+        # ACTIVE inspections are kept as clean_dataset keeps them
+        removed_violations = np.zeros(len(violations), dtype=bool)
+        if len(inactive_sn):
+            removed_violations = violations['SERIAL NUMBER'].isin(
+                KeyCodes.matching(inactive_sn, violations['SERIAL NUMBER'])).to_numpy()
+
+        added = [DataController.compact_frame(data) if data is not None else None
+                 for data in [new_violations, new_inspections, new_inventory]]
+        return {'added': added,
+                'removed': [removed_violations, np.zeros(len(inspections), dtype=bool), replaced_inventory],
+                'inactive facilities': inactive_fid,
+                'inactive serials': inactive_sn,
+                'replaced facilities': replaced_fid}
+
+    @staticmethod
+    def concat_frames(data, added):
+        """" returns the rows added to the end of the frame, keeping its categorical columns categorical."""
+        if added is None or not len(added):
+            return data
+        for column in KEY_COLUMNS:
+            if column in data.columns and column in added.columns and \
+                    KeyCodes.is_packed(data[column]) != KeyCodes.is_packed(added[column]):
+                # an id that cannot be packed has been added, so the ids are kept as text
+                data, added = [frame.assign(**{column: pd.Categorical(KeyCodes.text(frame[column]))})
+                               for frame in [data, added]]
+        columns = {}
+        for column in data.columns:
+            if hasattr(data[column], 'cat') and column in added.columns:
+                # the new values are added after the existing categories so the existing codes stay the same
+                values = pd.Index(np.asarray(added[column].dropna().unique()))
+                new_values = values.difference(data[column].cat.categories, sort=False)
+                categories = data[column].cat.add_categories(new_values).cat.categories if len(new_values) else \
+                    data[column].cat.categories
+                columns[column] = pd.CategoricalDtype(categories)
+        data = data.astype(columns) if columns else data
+        added = added.astype(columns) if columns else added
+        return pd.concat([data, added[[column for column in data.columns if column in added.columns]]],
+                         ignore_index=True)
+
+    @staticmethod
+    @instrumented
+    def merge_delta(dataset, changes):
+        """" returns the data set with the removed rows taken out and the new rows added."""
+        merged = []
+        for data, added, removed in zip(dataset, changes['added'], changes['removed']):
+            if removed.any():
+                data = data[~removed].reset_index(drop=True)
+                data = data.assign(**{column: data[column].cat.remove_unused_categories()
+                                      for column in data.columns if hasattr(data[column], 'cat')})
+            merged.append(DataAppend.concat_frames(data, added))
+        return merged
+
+    @staticmethod
+    @instrumented
+    def save_delta(dataset, changes):
+        """" writes only the new and removed rows to the database, replacing a collection saved as binary."""
+        removed_keys = [('SERIAL NUMBER', changes['inactive serials']), (None, []),
+                        ('FACILITY ID', changes['replaced facilities'])]
+        for data, name, added, (column, removed) in zip(dataset, DATASET_NAMES, changes['added'], removed_keys):
+            added = added if added is not None else data.iloc[:0]
+            # the database holds the ids as text
+            if not DatabaseController.apply_delta(KeyCodes.unpack_frame(added), name, column,
+                                                  [str(value) for value in removed]):
+                DatabaseController.replace_collection(KeyCodes.unpack_frame(data), name)
+
+    @staticmethod
+    def summary(changes):
+        """" returns the number of rows added and removed in each table."""
+        return {name: {'added': len(added) if added is not None else 0, 'removed': int(removed.sum())}
+                for name, added, removed in zip(DATASET_NAMES, changes['added'], changes['removed'])}
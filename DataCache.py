@@ -0,0 +1,76 @@
+import hashlib
+import os
+import shutil
+
+try:
+    import pyarrow.feather as feather
+except ImportError:  # the snapshot is skipped without pyarrow
+    feather = None
+
+from DataController import CLEANING_VERSION
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache")
+DATASET_NAMES = ['violations', 'inspections', 'inventory']
+
+
+class DataCache(object):
+
+    @staticmethod
+    def is_available():
+        """" returns true if the columnar snapshot can be used."""
+        return feather is not None
+
+    @staticmethod
+    def file_hash(filename):
+        """" returns the sha256 digest of the file contents."""
+        digest = hashlib.sha256()
+        with open(filename, 'rb') as inFile:
+            for block in iter(lambda: inFile.read(1 << 20), b''):
+                digest.update(block)
+        return digest.hexdigest()
+
+    @staticmethod
+    def snapshot_key(filenames):
+        """" returns the key of the snapshot for the source files and the current cleaning version."""
+        digest = hashlib.sha256(f"cleaning version {CLEANING_VERSION}".encode())
+        # sorted so the order the files were selected in does not matter
+        for file_digest in sorted(DataCache.file_hash(filename) for filename in filenames):
+            digest.update(file_digest.encode())
+        return digest.hexdigest()
+
+    @staticmethod
+    def load_snapshot(filenames, cache_dir=DEFAULT_CACHE_DIR):
+        """" returns the cleaned dataset from the snapshot memory mapped, or None if there is no valid snapshot."""
+        if not DataCache.is_available():
+            return None
+        path = os.path.join(cache_dir, DataCache.snapshot_key(filenames))
+        if not os.path.isdir(path):
+            return None
+        return [feather.read_feather(os.path.join(path, f"{name}.feather"), memory_map=True)
+                for name in DATASET_NAMES]
+
+    @staticmethod
+    def save_snapshot(dataset, filenames, cache_dir=DEFAULT_CACHE_DIR):
+        """" writes the cleaned dataset to a snapshot for the source files, replacing any older snapshots."""
+        if not DataCache.is_available():
+            return None
+        key = DataCache.snapshot_key(filenames)
+        staging = os.path.join(cache_dir, f"{key}.tmp")
+        shutil.rmtree(staging, ignore_errors=True)
+        os.makedirs(staging)
+        for name, data in zip(DATASET_NAMES, dataset):
+            # uncompressed so the snapshot can be memory mapped on load
+            feather.write_feather(data.reset_index(drop=True), os.path.join(staging, f"{name}.feather"),
+                                  compression='uncompressed')
+        DataCache.clear_snapshots(cache_dir)
+        os.rename(staging, os.path.join(cache_dir, key))
+        return key
+
+    @staticmethod
+    def clear_snapshots(cache_dir=DEFAULT_CACHE_DIR):
+        """" deletes every finished snapshot in the cache directory."""
+        if not os.path.isdir(cache_dir):
+            return
+        for name in os.listdir(cache_dir):
+            if not name.endswith('.tmp'):
+                shutil.rmtree(os.path.join(cache_dir, name), ignore_errors=True)
@@ -1,14 +1,128 @@
-from concurrent.futures.thread import ThreadPoolExecutor
+import time
 
+import numpy as np
 import pandas as pd
-import pymongo
-import seaborn as sns
-from pymongo.errors import ServerSelectionTimeoutError
+
+from Instrumentation import Instrumentation, instrumented
+from KeyCodes import KeyCodes, KEY_COLUMNS
+from LazyImport import LazyImport
+from PeDescription import PeDescription
+
+# only the graphs and the database need these, so cleaning can be imported without them
+sns = LazyImport('seaborn')
+DatabaseController = LazyImport('DatabaseController', 'DatabaseController')
+
+# bump when the cleaning steps change so snapshots of older cleaned data are rebuilt
+CLEANING_VERSION = 6
+
+# the stages of cleaning in the order they are done, reported as the cleaning goes
+CLEANING_STAGES = ['drop columns', 'seat numbers', 'key indexes', 'filter inspections', 'filter violations',
+                   'filter inventory', 'compact']
+
+# inspection columns that duplicate the inventory and are dropped when cleaning
+INSPECTION_DUPLICATE_COLUMNS = ['OWNER ID', 'OWNER NAME', 'FACILITY NAME', 'RECORD ID', 'PROGRAM NAME',
+                                'PROGRAM ELEMENT (PE)', 'FACILITY ADDRESS', 'FACILITY CITY', 'FACILITY STATE',
+                                'Census Tracts 2010', 'Location', '2011 Supervisorial District Boundaries (Official)',
+                                'Board Approved Statistical Areas']
+
+# compact layout of the cleaned columns, low cardinality text becomes categoricals so each distinct
+# value is only stored once, the ids are packed into integers by KeyCodes, and integers are cast to
+# the smallest type that fits.
+COMPACT_SCHEMA = {
+    'ACTIVITY DATE': 'datetime',
+    'FACILITY ID': 'key',
+    'SERIAL NUMBER': 'key',
+    'OWNER ID': 'category',
+    'RECORD ID': 'category',
+    'EMPLOYEE ID': 'category',
+    'PE DESCRIPTION': 'category',
+    'SEAT NUMBERS': 'category',
+    'PE CATEGORY': 'category',
+    'PROGRAM STATUS': 'category',
+    'PROGRAM NAME': 'category',
+    'SERVICE DESCRIPTION': 'category',
+    'GRADE': 'category',
+    'VIOLATION CODE': 'category',
+    'VIOLATION DESCRIPTION': 'category',
+    'FACILITY CITY': 'category',
+    'FACILITY STATE': 'category',
+    'FACILITY ZIP': 'category',
+    'OWNER CITY': 'category',
+    'OWNER STATE': 'category',
+    'Zip Codes': 'category',
+    'SCORE': 'integer',
+    'POINTS': 'integer',
+    'PROGRAM ELEMENT (PE)': 'integer',
+    'SERVICE CODE': 'integer',
+    'SEATS LOW': 'float',
+    'SEATS HIGH': 'float',
+    'SQ FT LOW': 'float',
+    'SQ FT HIGH': 'float',
+    'RISK LEVEL': 'float',
+}
+
+# dtype schema for each of the three source files, integer columns are read as floats
+# so that missing values can be dropped before they are cast down.
+CSV_SCHEMAS = {
+    'violations': {
+        'SERIAL NUMBER': 'object',
+        'VIOLATION CODE': 'object',
+        'VIOLATION DESCRIPTION': 'object',
+        'POINTS': 'int64',
+    },
+    'inspections': {
+        'ACTIVITY DATE': 'datetime64[ns]',
+        'OWNER ID': 'object',
+        'OWNER NAME': 'object',
+        'FACILITY ID': 'object',
+        'FACILITY NAME': 'object',
+        'RECORD ID': 'object',
+        'PROGRAM NAME': 'object',
+        'PROGRAM STATUS': 'object',
+        'PROGRAM ELEMENT (PE)': 'int64',
+        'PE DESCRIPTION': 'object',
+        'FACILITY ADDRESS': 'object',
+        'FACILITY CITY': 'object',
+        'FACILITY STATE': 'object',
+        'FACILITY ZIP': 'object',
+        'SERVICE CODE': 'int64',
+        'SERVICE DESCRIPTION': 'object',
+        'SCORE': 'int64',
+        'GRADE': 'object',
+        'SERIAL NUMBER': 'object',
+        'EMPLOYEE ID': 'object',
+        'Location': 'object',
+        'Zip Codes': 'int64',
+    },
+    'inventory': {
+        'FACILITY ID': 'object',
+        'FACILITY NAME': 'object',
+        'RECORD ID': 'object',
+        'PROGRAM NAME': 'object',
+        'PROGRAM ELEMENT (PE)': 'int64',
+        'PE DESCRIPTION': 'object',
+        'FACILITY ADDRESS': 'object',
+        'FACILITY CITY': 'object',
+        'FACILITY STATE': 'object',
+        'FACILITY ZIP': 'object',
+        'FACILITY LATITUDE': 'float64',
+        'FACILITY LONGITUDE': 'float64',
+        'OWNER ID': 'object',
+        'OWNER NAME': 'object',
+        'OWNER ADDRESS': 'object',
+        'OWNER CITY': 'object',
+        'OWNER STATE': 'object',
+        'OWNER ZIP': 'object',
+        'Location': 'object',
+        'Zip Codes': 'int64',
+    },
+}
 
 
 class DataController(object):
 
     @staticmethod
+    @instrumented
     def convert_csv_to_json(filename):
         """" opens the csv file converts it into a dictionary then returns it as a json file."""
         try:
@@ -23,44 +137,139 @@ class DataController(object):
             raise ValueError
 
     @staticmethod
-    def replace_database_collection(file, choice):
-        """" replaces the database collection if it exists with the new collection."""
-        client = pymongo.MongoClient("mongodb://localhost:27017/", serverSelectionTimeoutMS=1000)
+    def get_file_role(columns):
+        """" returns which of the three source files the column headings belong to."""
+        if 'ACTIVITY DATE' in columns:
+            return 'inspections'
+        elif 'SERIAL NUMBER' in columns:
+            return 'violations'
+        elif 'FACILITY ID' in columns:
+            return 'inventory'
+        else:
+            raise ValueError("file is not a violations, inspections or inventory file")
+
+    @staticmethod
+    def read_file_role(filename):
+        """" reads the column headings of the csv file and returns which of the three source files it is."""
         try:
-            db = client["DataCollection"]
-            collection = db[choice]
-            collection.drop()  # drops current collection
-            collection.insert_many(file.reset_index().to_dict('records'))
-        except ServerSelectionTimeoutError as exc:
-            raise RuntimeError('Failed to open database') from exc
+            with open(filename, encoding="utf-8-sig", newline='') as inFile:
+                return DataController.get_file_role(pd.read_csv(inFile, nrows=0).columns)
+        except FileNotFoundError:
+            raise FileNotFoundError
+        except TypeError:
+            raise TypeError
+        except ValueError as ve:
+            raise ValueError(f"File not in correct format. {ve}")
 
     @staticmethod
+    def get_file_roles(filenames):
+        """" returns the filename of the violations, inspections and inventory files by their column headings."""
+        roles = {}
+        for filename in filenames:
+            roles[DataController.read_file_role(filename)] = filename
+        for role in ['violations', 'inspections', 'inventory']:
+            if role not in roles:
+                raise FileNotFoundError(f"no {role} file")
+        return roles
+
+    @staticmethod
+    def get_csv_schema(columns):
+        """" returns the file role, the read_csv options and the integer columns for the column headings."""
+        role = DataController.get_file_role(columns)
+        schema = {column: dtype for column, dtype in CSV_SCHEMAS[role].items() if column in columns}
+        dates = [column for column, dtype in schema.items() if dtype == 'datetime64[ns]']
+        dtypes = {column: ('float64' if dtype == 'int64' else dtype)
+                  for column, dtype in schema.items() if column not in dates}
+        integers = {column: dtype for column, dtype in schema.items() if dtype == 'int64'}
+        return role, {'dtype': dtypes, 'parse_dates': dates, 'infer_datetime_format': True}, integers
+
+    @staticmethod
+    @instrumented
+    def read_csv_to_frame(filename):
+        """" reads the csv file straight into a typed dataframe and returns its file role with the prepared data."""
+        try:
+            with open(filename, encoding="utf-8-sig", newline='') as inFile:
+                role, options, integers = DataController.get_csv_schema(pd.read_csv(inFile, nrows=0).columns)
+                inFile.seek(0)
+                data_frame = pd.read_csv(inFile, low_memory=False, **options)
+        except FileNotFoundError:
+            raise FileNotFoundError
+        except TypeError:
+            raise TypeError
+        except ValueError as ve:
+            raise ValueError(f"File not in correct format. {ve}")
+        # integer columns can be cast down now the incomplete rows have gone
+        return role, DataController.prep_frame(data_frame).astype(integers)
+
+    @staticmethod
+    def convert_frame_to_json(data_frame, filename=None):
+        """" exports the dataframe as json records, written to filename if one is given."""
+        return KeyCodes.unpack_frame(data_frame).to_json(filename, orient="records", date_format="iso")
+
+    @staticmethod
+    @instrumented
+    def replace_database_collection(file, choice, progress=None, binary=False):
+        """" replaces the database collection if it exists with the new collection.
+
+        With binary set the rows are saved as compact arrow blocks, which are quicker to write and
+        read back but cannot be aggregated inside the database.
+        """
+        DatabaseController.replace_collection(KeyCodes.unpack_frame(file), choice, binary=binary, progress=progress)
+
+    @staticmethod
+    @instrumented
+    def update_database_collection(file, choice, progress=None, binary=False):
+        """" saves only the rows that have changed since the database collection was last saved.
+
+        With binary set the collection is replaced by arrow blocks instead.
+        """
+        return DatabaseController.update_collection(KeyCodes.unpack_frame(file), choice, progress=progress,
+                                                    binary=binary)
+
+    @staticmethod
+    @instrumented
+    def append_database_collection(file, choice, drop=False):
+        """" appends the rows to the database collection, dropping the existing collection first if drop is set."""
+        DatabaseController.append_collection(file, choice, drop)
+
+    @staticmethod
+    @instrumented
     def read_from_database(choice):
         """" returns the data stored in the database by the file name."""
-        client = pymongo.MongoClient("mongodb://localhost:27017/", serverSelectionTimeoutMS=1000)
-        try:
-            db = client["DataCollection"]
-            collection = db[choice]  # violations, inspections or inventory
-            return pd.DataFrame(collection.find({}, {'index': 0}))
-        except ServerSelectionTimeoutError as exc:
-            raise RuntimeError('Failed to open database') from exc
+        return DatabaseController.read_collection(choice)
 
     @staticmethod
+    @instrumented
     def prep_data(file_name):
         """" reads the file as a json object into a dataframe then drops duplicate and incomplete rows."""
         try:
             data_frame = pd.read_json(file_name, convert_dates=True)
-            data_frame = data_frame.dropna()  # drops incomplete rows
-            data_frame = data_frame.drop_duplicates()  # drops duplicate rows from dataframe.
-            return data_frame
+            return DataController.prep_frame(data_frame)
         except TypeError as te:
             raise TypeError(f"Must be a JSON file. {te}")
         except ValueError as ve:
             raise ValueError(f"File not in correct format. {ve}")
 
     @staticmethod
-    def clean_dataset(dataset):
-        """" cleans the dataset based on the requirements."""
+    @instrumented
+    def prep_frame(data_frame):
+        """" drops duplicate and incomplete rows from the dataframe."""
+        data_frame = data_frame.dropna()  # drops incomplete rows
+        data_frame = data_frame.drop_duplicates()  # drops duplicate rows from dataframe.
+        return data_frame
+
+    @staticmethod
+    @instrumented
+    def clean_dataset(dataset, compact=True, timings=None, progress=None):
+        """" cleans the dataset based on the requirements, compacting the cleaned tables unless compact is false.
+
+        If a timings dictionary is given the seconds taken by each stage are added to it. progress is
+        called with the fraction done after each stage, and stops the cleaning by raising.
+
+        A violation is dropped if any inspection with its SERIAL NUMBER is INACTIVE, and takes the zip
+        code of the first inspection with its SERIAL NUMBER. Each violation is kept once, where merging
+        with the inspections repeated it for every inspection sharing its SERIAL NUMBER.
+        """
         violations = dataset[0]
         inspections = dataset[1]
         inventory = dataset[2]
@@ -68,106 +277,160 @@ class DataController(object):
         if 'OWNER ID' not in inspections.columns:
             raise ValueError
         else:
+            timings = timings if timings is not None else {}
+            clock = [time.perf_counter()]
+
+            def stage_done(stage):
+                now = time.perf_counter()
+                timings[stage] = timings.get(stage, 0) + now - clock[0]
+                Instrumentation.add_stage(f"DataController.clean_dataset: {stage}", now - clock[0])
+                clock[0] = now
+                if progress is not None:
+                    progress(CLEANING_STAGES.index(stage) / len(CLEANING_STAGES), f"cleaning: {stage}")
 
             # Drop duplicated columns in inspections
-            inspections = inspections.drop(columns=['OWNER ID', 'OWNER NAME', 'FACILITY NAME',
-                                                    'RECORD ID', 'PROGRAM NAME', 'PROGRAM ELEMENT (PE)',
-                                                    'FACILITY ADDRESS', 'FACILITY CITY',
-                                                    'FACILITY STATE', 'Census Tracts 2010', 'Location',
-                                                    '2011 Supervisorial District Boundaries (Official)',
-                                                    'Board Approved Statistical Areas'])
+            inspections = inspections.drop(columns=INSPECTION_DUPLICATE_COLUMNS)
 
             # set date values to the correct format
             inspections['ACTIVITY DATE'] = pd.to_datetime(inspections['ACTIVITY DATE'], infer_datetime_format=True)
-
-            # add serial number to violations
-            violations = violations.reset_index()
-            violations = violations.merge(inspections[['Zip Codes', 'SERIAL NUMBER']])
+            stage_done('drop columns')
 
             # create seat numbers
             inspections = DataController.create_new_col_for_seat_numbers(inspections)
             inventory = DataController.create_new_col_for_seat_numbers(inventory)
+            stage_done('seat numbers')
+
+            # build the key indexes once: the inactive facility ids and the zip code and status by serial number
+            active = inspections['PROGRAM STATUS'].eq('ACTIVE').to_numpy()
+            inactive_fid = pd.unique(inspections['FACILITY ID'].to_numpy()[~active])
+            first = ~inspections['SERIAL NUMBER'].duplicated().to_numpy()
+            serial_index = pd.Index(inspections['SERIAL NUMBER'].to_numpy()[first])
+            serial_zip = inspections['Zip Codes'].to_numpy()[first]
+            # a serial number is inactive if any of its inspections is
+            serial_active = np.ones(len(serial_index), dtype=bool)
+            serial_active[serial_index.get_indexer(inspections['SERIAL NUMBER'].to_numpy()[~active])] = False
+            stage_done('key indexes')
 
             # remove inactive records
-            inactive_list = DataController.get_inactive_list(inspections)
-            inactive_list_fid = inactive_list['FACILITY ID']
-            inactive_list_fid = inactive_list_fid.drop_duplicates()
-            inventory = DataController.del_by_facility_id(inactive_list_fid, inventory)
-
-            inactive_list_sn = inactive_list['SERIAL NUMBER']
-            violations = DataController.del_by_serial_number(inactive_list_sn, violations)
-            inspections = DataController.remove_inactive(inspections)
-            # by serial number
+            inspections = inspections[active]
+            stage_done('filter inspections')
+
+            # join violations to their inspection by serial number, keeping active ones and adding the zip code
+            violations = violations.reset_index()
+            positions = serial_index.get_indexer(violations['SERIAL NUMBER'])
+            keep = positions >= 0
+            keep[keep] = serial_active[positions[keep]]
+            violations = violations[keep].assign(**{'Zip Codes': serial_zip[positions[keep]]})
+            violations.index = pd.RangeIndex(len(violations))
+            stage_done('filter violations')
+
+            inventory = inventory[~inventory['FACILITY ID'].isin(inactive_fid)]
+            stage_done('filter inventory')
+
+            if compact:
+                dataset = DataController.compact_dataset([violations, inspections, inventory])[0]
+                stage_done('compact')
+                return dataset
             return [violations, inspections, inventory]
 
     @staticmethod
-    def clean_dataset_threads(dataset):
-
-        violations = dataset[0]
-        inspections = dataset[1]
-        inventory = dataset[2]
-
-        if 'OWNER ID' not in inspections.columns:
-            raise ValueError
-        else:
-
-            with ThreadPoolExecutor() as executor:
-                # Drop duplicated columns in inspections
-                inspections = executor.submit(inspections.drop, columns=['OWNER ID', 'OWNER NAME', 'FACILITY NAME',
-                                                                         'RECORD ID', 'PROGRAM NAME',
-                                                                         'PROGRAM ELEMENT (PE)',
-                                                                         'FACILITY ADDRESS', 'FACILITY CITY',
-                                                                         'FACILITY STATE', 'Census Tracts 2010',
-                                                                         'Location',
-                                                                         '2011 Supervisorial District Boundaries (Official)',
-                                                                         'Board Approved Statistical Areas']).result()
-                # set date values to the correct format
-                inspections['ACTIVITY DATE'] = executor.submit(pd.to_datetime, inspections['ACTIVITY DATE']).result()
+    def compact_column(column, kind):
+        """" returns the column in the compact layout of its kind."""
+        if kind == 'category':
+            if hasattr(column, 'cat'):
+                return column.cat.remove_unused_categories()
+            return column.astype('category')
+        elif kind == 'key':
+            # an id that cannot be packed leaves the column as a categorical
+            packed = KeyCodes.pack_column(column)
+            return packed if packed is not None else DataController.compact_column(column, 'category')
+        elif kind == 'integer':
+            return pd.to_numeric(column, downcast='unsigned' if column.min() >= 0 else 'integer')
+        elif kind == 'float':
+            return pd.to_numeric(column, downcast='float')
+        elif kind == 'datetime':
+            return pd.to_datetime(column, infer_datetime_format=True)
+        return column
 
-                # add serial number to violations
-                violations = violations.reset_index()
-                violations = violations.merge(inspections[['Zip Codes', 'SERIAL NUMBER']])
-
-                # create seat numbers
-                inspections = executor.submit(DataController.create_new_col_for_seat_numbers, inspections).result()
+    @staticmethod
+    def compact_frame(data):
+        """" returns the dataframe with its columns in the compact layout."""
+        return data.assign(**{column: DataController.compact_column(data[column], kind)
+                              for column, kind in COMPACT_SCHEMA.items() if column in data.columns})
 
-                # remove inactive records
-                inactive_list = executor.submit(DataController.get_inactive_list, inspections).result()
-                inactive_list_fid = inactive_list['FACILITY ID']
-                inactive_list_fid = inactive_list_fid.drop_duplicates()
-                inventory = executor.submit(DataController.del_by_facility_id, inactive_list_fid, inventory)
+    @staticmethod
+    def align_keys(dataset):
+        """" returns the tables with an id column left packed only if it is packed in every table holding it."""
+        for column in KEY_COLUMNS:
+            tables = [data for data in dataset if column in data.columns]
+            if all(KeyCodes.is_packed(data[column]) for data in tables):
+                continue
+            dataset = [data.assign(**{column: pd.Categorical(KeyCodes.text(data[column]))})
+                       if column in data.columns and KeyCodes.is_packed(data[column]) else data for data in dataset]
+        return dataset
 
-                inactive_list_sn = inactive_list['SERIAL NUMBER']
-                violations = executor.submit(DataController.del_by_serial_number, inactive_list_sn, violations)
-                inspections = executor.submit(DataController.remove_inactive, inspections)
+    @staticmethod
+    def memory_usage(data):
+        """" returns the memory used by the dataframe in bytes."""
+        return int(data.memory_usage(index=True, deep=True).sum())
 
-                return [violations.result(), inspections.result(), inventory.result()]
+    @staticmethod
+    @instrumented
+    def compact_dataset(dataset, progress=None):
+        """" returns the compacted dataset and a report of the memory used by each table before and after.
+
+        progress is called before each table is compacted, and stops the compacting by raising.
+        """
+        names = ['violations', 'inspections', 'inventory']
+        before = [DataController.memory_usage(data) for data in dataset]
+        compacted = []
+        for position, data in enumerate(dataset):
+            if progress is not None:
+                progress(position / len(dataset), f"compacting {names[position]}")
+            compacted.append(DataController.compact_frame(data))
+        dataset = DataController.align_keys(compacted)
+        after = [DataController.memory_usage(data) for data in dataset]
+        report = pd.DataFrame({'before MB': before, 'after MB': after}, index=names) / 2 ** 20
+        report['reduction'] = report['before MB'] / report['after MB']
+        return dataset, report.round(2)
 
     @staticmethod
+    @instrumented
     def create_new_col_for_seat_numbers(data_to_edit):
-        """" edits the PE description by removing the bracketed numbers into there own column."""
+        """" edits the PE description by removing the bracketed numbers into there own column.
+
+        The base category, the seat and square foot ranges and the risk level are added as their own columns.
+        """
         if 'PE DESCRIPTION' in data_to_edit.columns:
-            pe_description = data_to_edit['PE DESCRIPTION'].str.extract(r'\(([^)]+)\)')  # takes the pe description col
-            data_to_edit['PE DESCRIPTION'] = data_to_edit['PE DESCRIPTION'].str.replace(r'[\(\[].*?[\)\]]', '')
-            data_to_edit['SEAT NUMBERS'] = pe_description  # adds a new col to the dataframe
-            return data_to_edit
+            fields = PeDescription.parse_column(data_to_edit['PE DESCRIPTION'])
+            return data_to_edit.assign(**{column: fields[column] for column in fields.columns})
         else:
             raise ValueError("no 'PE DESCRIPTION' column")
 
     @staticmethod
-    def averages(choice, inspections):
-        """" choices witch averages data to return."""
+    @instrumented
+    def averages(choice, inspections, cube=None, rows=None, filters=None):
+        """" choices witch averages data to return, read from the score cube when one is given.
+
+        filters are those of DatasetIndex.filter_inspections and rows the positions of the inspections
+        passing them, which are averaged from the inspections when there is no cube.
+        """
         try:
             #  check for cleaned data
             if 'SEAT NUMBERS' not in inspections.columns:
                 raise TypeError
             else:
                 if choice == "by type of vendor’s seating":
-                    agg_data = DataController.avg_grouping(inspections, 'PE DESCRIPTION')
-                    return agg_data.round(2)
+                    group_by = 'PE DESCRIPTION'
                 elif choice == "by zip code":
-                    agg_data = DataController.avg_grouping(inspections, 'Zip Codes')
-                    return agg_data.round(2)
+                    group_by = 'Zip Codes'
+                else:
+                    return None
+                if cube is not None:
+                    return cube.filtered_statistics(group_by, inspections, rows, **(filters or {})).round(2)
+                agg_data = DataController.avg_grouping(inspections.iloc[rows] if rows is not None else inspections,
+                                                       group_by)
+                return agg_data.round(2)
 
         except RuntimeError:
             raise RuntimeError("Failed to open database.")
@@ -175,36 +438,130 @@ class DataController(object):
     @staticmethod
     def avg_grouping(inspections, group_by):
         """" create a new dataframe of years group by thr group_by variable."""
-        agg_data = inspections[[group_by, 'SCORE', 'ACTIVITY DATE']].groupby(
-            [pd.Grouper(key=group_by), pd.Grouper(key='ACTIVITY DATE', freq='Y')]).agg(
-            'mean').reset_index()  # groups the mean of score by year
-        agg_data = agg_data.rename(
-            columns={"SCORE": "mean grouped by year"})  # renames the score column to mean by year
-        pe_description_score_median = inspections[[group_by, 'SCORE', 'ACTIVITY DATE']].groupby(
-            [pd.Grouper(key=group_by), pd.Grouper(key='ACTIVITY DATE', freq='Y')]).agg(
-            'median').reset_index()
-        pe_description_score_median = pe_description_score_median.rename(
-            columns={"SCORE": "median grouped by year"})
-        pe_description_score_mode = inspections[[group_by, 'SCORE', 'ACTIVITY DATE']].groupby(
-            [pd.Grouper(key=group_by), pd.Grouper(key='ACTIVITY DATE', freq='Y')]) \
-            .apply(pd.DataFrame.mode).dropna().set_index(group_by).reset_index()
-        pe_description_score_mode = pe_description_score_mode.rename(columns={"SCORE": "mode grouped by year"})
-        #  add the new columns for mean, median and mode to final dataframe.
-        agg_data['median grouped by year'] = pe_description_score_median['median grouped by year']
-        agg_data['mode grouped by year'] = pe_description_score_mode['mode grouped by year']
-        return agg_data
+        return DataController.score_statistics(inspections, group_by)
 
     @staticmethod
+    @instrumented
+    def score_statistics(inspections, group_by):
+        """" returns the mean, median and mode of the score per group and year in a single sorted pass.
+
+        When a group has several modes the lowest score is used.
+        """
+        data = inspections[[group_by, 'SCORE', 'ACTIVITY DATE']].dropna()
+        columns = [group_by, 'ACTIVITY DATE', 'mean grouped by year', 'median grouped by year', 'mode grouped by year']
+        if data.empty:
+            return pd.DataFrame(columns=columns)
+        # one integer key per (group, year)
+        group_codes, groups = pd.factorize(data[group_by], sort=True)
+        year_codes, years = pd.factorize(data['ACTIVITY DATE'].dt.year, sort=True)
+        keys = group_codes.astype('int64') * len(years) + year_codes
+        scores = data['SCORE'].to_numpy(dtype='float64')
+
+        # sort by key then score so every group is a contiguous sorted run
+        order = np.lexsort((scores, keys))
+        keys = keys[order]
+        scores = scores[order]
+        group_keys, starts, counts = np.unique(keys, return_index=True, return_counts=True)
+
+        mean = np.add.reduceat(scores, starts) / counts
+        median = (scores[starts + (counts - 1) // 2] + scores[starts + counts // 2]) / 2
+
+        # runs of the same score within a group, the longest run is the mode
+        new_run = np.ones(len(keys), dtype=bool)
+        new_run[1:] = (keys[1:] != keys[:-1]) | (scores[1:] != scores[:-1])
+        run_starts = np.flatnonzero(new_run)
+        run_lengths = np.diff(np.append(run_starts, len(keys)))
+        run_order = np.lexsort((run_starts, -run_lengths, keys[run_starts]))
+        first_runs = run_order[np.unique(keys[run_starts][run_order], return_index=True)[1]]
+        mode = scores[run_starts[first_runs]]
+
+        return pd.DataFrame({
+            group_by: groups.take(group_keys // len(years)),
+            # labelled with the last day of the year as the yearly grouper does
+            'ACTIVITY DATE': pd.to_datetime([f"{year}-12-31" for year in years.take(group_keys % len(years))]),
+            'mean grouped by year': mean,
+            'median grouped by year': median,
+            'mode grouped by year': mode,
+        }, columns=columns)
+
+    @staticmethod
+    def score_statistics_from_counts(counts, group_by):
+        """" returns the mean, median and mode of the score per group and year from the number of each score.
+
+        Gives the same statistics as score_statistics over the inspections the counts were taken from.
+        """
+        columns = [group_by, 'ACTIVITY DATE', 'mean grouped by year', 'median grouped by year', 'mode grouped by year']
+        if counts.empty:
+            return pd.DataFrame(columns=columns)
+        counts = counts.sort_values([group_by, 'year', 'SCORE'], ignore_index=True)
+        # one code per (group, year), the rows of each are contiguous and sorted by score
+        key = counts.groupby([group_by, 'year'], sort=False).ngroup().to_numpy()
+        number = counts['count'].to_numpy(dtype='int64')
+        scores = counts['SCORE'].to_numpy(dtype='float64')
+        groups = counts.drop_duplicates([group_by, 'year'])
+        starts = groups.index.to_numpy()
+        total = np.add.reduceat(number, starts)
+        cumulative = np.cumsum(number)
+        before = cumulative[starts] - number[starts]
+
+        # the median is the mean of the middle two ranked scores, which are the same when the count is odd
+        lower = np.searchsorted(cumulative, before + (total + 1) // 2)
+        upper = np.searchsorted(cumulative, before + total // 2 + 1)
+        # the most common score, the lowest when there are several as the scores are sorted
+        mode = counts.assign(key=key).sort_values(['key', 'count'], ascending=[True, False], kind='mergesort') \
+            .drop_duplicates('key')['SCORE'].to_numpy(dtype='float64')
+
+        return pd.DataFrame({
+            group_by: groups[group_by].to_numpy(),
+            'ACTIVITY DATE': pd.to_datetime([f"{int(year)}-12-31" for year in groups['year']]),
+            'mean grouped by year': np.add.reduceat(number * scores, starts) / total,
+            'median grouped by year': (scores[lower] + scores[upper]) / 2,
+            'mode grouped by year': mode,
+        }, columns=columns)
+
+    @staticmethod
+    @instrumented
+    def database_averages(choice, start=None, end=None):
+        """" returns the same averages as averages, grouped inside the database rather than in memory."""
+        if choice == "by type of vendor’s seating":
+            group_by = 'PE DESCRIPTION'
+        elif choice == "by zip code":
+            group_by = 'Zip Codes'
+        else:
+            return None
+        counts = DatabaseController.score_counts(group_by, start, end)
+        return DataController.score_statistics_from_counts(counts, group_by).round(2)
+
+    @staticmethod
+    @instrumented
+    def database_violation_code_counts(number):
+        """" returns the same counts as violation_code_counts, counted inside the database."""
+        counts = DatabaseController.value_counts('violations', 'VIOLATION CODE', number)
+        counts = counts.rename(columns={'VIOLATION CODE': 'violation code', 'count': 'number of violations'})
+        return counts[['violation code', 'number of violations']].iloc[::-1].reset_index(drop=True)
+
+    @staticmethod
+    @instrumented
+    def database_violation_zip_counts():
+        """" returns the same counts as violation_zip_counts, counted inside the database."""
+        counts = DatabaseController.value_counts('violations', 'Zip Codes')
+        counts = counts.rename(columns={'Zip Codes': 'zip area', 'count': 'number of violations'})
+        return counts[['zip area', 'number of violations']].iloc[::-1].reset_index(drop=True)
+
+    @staticmethod
+    @instrumented
     def del_by_facility_id(to_remove, data):
         """" delete all rows with the facility id given the the dataframe."""
-        return data[~data['FACILITY ID'].isin(to_remove.values.tolist())]
+        return data[~data['FACILITY ID'].isin(pd.unique(to_remove.to_numpy()))]
 
     @staticmethod
+    @instrumented
     def del_by_serial_number(to_remove, data):
         """" delete all rows with the serial number given the the dataframe."""
-        return data[~data['SERIAL NUMBER'].isin(to_remove.values.tolist())]
+        return data[~data['SERIAL NUMBER'].isin(pd.unique(to_remove.to_numpy()))]
 
     @staticmethod
+    @instrumented
     def get_inactive_list(data):
         """" returns a dataframe with all inactive records."""
         if 'PROGRAM STATUS' in data.columns:
@@ -213,30 +570,58 @@ class DataController(object):
             raise ValueError("no 'PROGRAM STATUS' column")
 
     @staticmethod
+    @instrumented
     def remove_inactive(data):
         """" remove all rows with program status of inactive."""
         if 'PROGRAM STATUS' in data.columns:
-            return data.drop(data[data['PROGRAM STATUS'].ne('ACTIVE')].index)
+            return data[data['PROGRAM STATUS'].eq('ACTIVE')]
         else:
             raise ValueError("no 'PROGRAM STATUS' column")
 
     @staticmethod
-    def violation_bar_graph(violations, number, ax):
-        """" creates a bar graph from violation code and number of violations."""
-        violation_code_count = violations['VIOLATION CODE'].value_counts().reset_index()
+    @instrumented
+    def violation_code_counts(violations, number):
+        """" returns the number of violations of the most common violation codes, or of every code if number is None."""
+        violation_code_count = violations['VIOLATION CODE'].value_counts()
+        # categorical codes count every category, only the codes in the data are kept
+        violation_code_count = violation_code_count[violation_code_count > 0]
+        violation_code_count.index = violation_code_count.index.astype(object)
+        violation_code_count = violation_code_count.reset_index()
         violation_code_count = violation_code_count.rename(columns={
             "VIOLATION CODE": "number of violations", "index": "violation code"})
         violation_code_count = violation_code_count.sort_values(by=['number of violations'])
-        violation_code_count = violation_code_count.tail(number)
-        return sns.barplot(data=violation_code_count, x='violation code', y='number of violations', ax=ax)
+        return violation_code_count if number is None else violation_code_count.tail(number)
 
     @staticmethod
-    def violation_scatter_graph(violations, ax):
-        """" creates a scatter graph from zip code and number of violations."""
-        violation_zip_count = violations[['VIOLATION CODE', 'Zip Codes']]
-        violation_zip_count['Zip Codes'] = violation_zip_count['Zip Codes'].astype('category')
-        violation_zip_count = violation_zip_count['Zip Codes'].value_counts().reset_index()
+    @instrumented
+    def violation_zip_counts(violations):
+        """" returns the number of violations in each zip code."""
+        zip_codes = violations['Zip Codes'].astype('category').cat.remove_unused_categories()
+        violation_zip_count = zip_codes.value_counts().reset_index()
         violation_zip_count = violation_zip_count.rename(columns={
             "Zip Codes": "number of violations", "index": "zip area"})
-        violation_zip_count = violation_zip_count.sort_values(by=['number of violations'])
-        return sns.scatterplot(data=violation_zip_count, x='zip area', y='number of violations', hue_norm=(0, 7), ax=ax)
+        return violation_zip_count.sort_values(by=['number of violations'])
+
+    @staticmethod
+    @instrumented
+    def violation_bar_graph(violations, number, ax, counts=None):
+        """" creates a bar graph from violation code and number of violations.
+
+        Counts of establishments, with the violation codes or their categories first, are drawn instead if given.
+        """
+        if counts is None:
+            counts = DataController.violation_code_counts(violations, number)
+        return sns.barplot(data=counts, x=counts.columns[0], y=DataController.bar_graph_column(counts), ax=ax)
+
+    @staticmethod
+    def bar_graph_column(counts):
+        """" returns the column of the counts the bar graph shows, the establishments when they have been counted."""
+        return 'number of establishments' if 'number of establishments' in counts.columns else 'number of violations'
+
+    @staticmethod
+    @instrumented
+    def violation_scatter_graph(violations, ax, counts=None):
+        """" creates a scatter graph from zip code and number of violations."""
+        if counts is None:
+            counts = DataController.violation_zip_counts(violations)
+        return sns.scatterplot(data=counts, x='zip area', y='number of violations', hue_norm=(0, 7), ax=ax)
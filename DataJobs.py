@@ -0,0 +1,185 @@
+from DataAppend import DataAppend
+from DataCache import DataCache
+from DataController import DataController
+from DataStream import DataStream
+from DatasetSession import DatasetSession
+from LazyImport import LazyImport
+from ParallelIngest import ParallelIngest
+from ScoreCube import ScoreCube
+from ViolationAggregation import ViolationAggregation
+
+# the database and scipy are only imported by the jobs that use them
+DatabaseController = LazyImport('DatabaseController', 'DatabaseController')
+LazyCollection = LazyImport('LazyCollection', 'LazyCollection')
+ZipAnalysis = LazyImport('ZipAnalysis', 'ZipAnalysis')
+
+DATASET_NAMES = ['violations', 'inspections', 'inventory']
+
+
+# Jobs run by the JobScheduler in a worker process or thread, each takes a progress keyword to report to the GUI
+
+def build_score_cube(inspections):
+    """returns the score cube of the inspections or None if they have not been cleaned."""
+    return ScoreCube.build(inspections) if 'SEAT NUMBERS' in inspections.columns else None
+
+
+def load_csv_dataset(roles, workers, progress):
+    """loads the three csv files, from the snapshot of the cleaned data set if there is one.
+
+    The files are read at the same time by the worker processes of the ingest unless workers is 1.
+    Run in a thread, so only the parts are read in processes and the tables are never pickled.
+    """
+    progress(0, "checking for a snapshot")
+    dataset = DataCache.load_snapshot(list(roles.values()))
+    from_snapshot = dataset is not None
+    if not from_snapshot and workers != 1:
+        dataset = ParallelIngest.ingest_dataset(list(roles.values()), workers, progress)
+    elif not from_snapshot:
+        dataset = []
+        for position, name in enumerate(DATASET_NAMES):
+            progress(position / 3, f"reading {name}")
+            dataset.append(DataController.read_csv_to_frame(roles[name])[1])
+        dataset[0] = dataset[0].set_index("SERIAL NUMBER")
+    progress(0.9, "building score statistics")
+    return dataset, from_snapshot, build_score_cube(dataset[1])
+
+
+def stream_csv_dataset(filenames, chunk_size, progress):
+    """cleans the csv files in chunks straight into the database."""
+    return DataStream.stream_dataset(filenames, chunk_size, progress=progress)
+
+
+def read_sources(sources):
+    """returns the tables of the data set given to the job as the sources of the session."""
+    return [DatasetSession.read_source(source) for source in sources]
+
+
+def clean_dataset(sources, source_files, progress):
+    """cleans the data set, keeping a snapshot of it when it came from csv files."""
+    progress(0, "cleaning")
+    dataset = read_sources(sources)
+    dataset = DataController.clean_dataset(dataset, compact=False,
+                                           progress=lambda fraction, message: progress(fraction / 2, message))
+    progress(0.5, "compacting")
+    dataset, memory_report = DataController.compact_dataset(
+        dataset, progress=lambda fraction, message: progress(0.5 + fraction / 5, message))
+    snapshot_error = None
+    if source_files is not None:
+        progress(0.7, "saving snapshot")
+        try:
+            DataCache.save_snapshot(dataset, source_files)
+        except OSError as ex:
+            snapshot_error = ex
+    progress(0.9, "building score statistics")
+    return dataset, build_score_cube(dataset[1]), snapshot_error, memory_report
+
+
+def append_dataset(sources, cube, filenames, source_files, database, progress):
+    """cleans only the rows of the new csv files and merges them into the data set.
+
+    The snapshot is saved again under every source file, and the database is only sent the rows
+    added and removed when database is set. A failed snapshot or database write is returned with
+    the merged data set rather than raised, as the merge itself has succeeded.
+    """
+    progress(0, "reading the new files")
+    dataset = read_sources(sources)
+    delta = DataAppend.read_delta(filenames)
+    progress(0.3, "cleaning the new rows")
+    changes = DataAppend.clean_delta(dataset, delta)
+    progress(0.5, "merging the new rows")
+    dataset = DataAppend.merge_delta(dataset, changes)
+    if cube is not None and changes['added'][1] is not None and len(changes['added'][1]):
+        cube.append(changes['added'][1])
+    snapshot_error = None
+    if source_files is not None:
+        progress(0.7, "saving snapshot")
+        try:
+            DataCache.save_snapshot(dataset, source_files + list(filenames))
+        except OSError as ex:
+            snapshot_error = ex
+    database_error = None
+    if database:
+        progress(0.8, "saving the new rows to the database")
+        try:
+            DataAppend.save_delta(dataset, changes)
+        except RuntimeError as ex:
+            database_error = ex
+    return dataset, cube, DataAppend.summary(changes), snapshot_error, database_error
+
+
+def table_progress(progress, position, tables=3):
+    """returns a progress for one of the tables that reports its fraction of the whole job."""
+    return lambda fraction, message: progress((position + fraction) / tables, message)
+
+
+# The database jobs wait on the database, so they are run in a thread rather than pickling the tables
+
+def save_dataset(sources, binary, progress):
+    """replaces the database collections with the data set, reading a table only while it is saved."""
+    for position, name in enumerate(DATASET_NAMES):
+        progress(position / 3, f"saving {name}")
+        DataController.replace_database_collection(DatasetSession.read_source(sources[position]), name,
+                                                   table_progress(progress, position), binary)
+
+
+def update_dataset(sources, binary, progress):
+    """saves the rows of the data set that have changed to the database, reading a table only while it is saved."""
+    changes = []
+    for position, name in enumerate(DATASET_NAMES):
+        progress(position / 3, f"saving changes to {name}")
+        changes.append(DataController.update_database_collection(DatasetSession.read_source(sources[position]),
+                                                                 name, table_progress(progress, position), binary))
+    return changes
+
+
+def load_database_dataset(progress):
+    """loads the data set from the database."""
+    dataset = []
+    for position, name in enumerate(DATASET_NAMES):
+        progress(position / 3, f"reading {name}")
+        dataset.append(DataController.read_from_database(name))
+    progress(0.8, "compacting")
+    dataset = DataController.compact_dataset(dataset)[0]
+    progress(0.9, "building score statistics")
+    return dataset, build_score_cube(dataset[1])
+
+
+def violation_graph_counts(violations, inspections, hierarchy, progress):
+    """counts the establishments and violations of every violation code, category and zip code for the graphs."""
+    progress(0, "counting establishments per violation code")
+    return ViolationAggregation.aggregate(violations, inspections, hierarchy)
+
+
+def zip_correlation(violations, inspections, permutations, progress):
+    """tests whether the violations per facility depend on the zip code."""
+    progress(0, "counting violations per facility")
+    return ZipAnalysis.analyse(violations, inspections, permutations)
+
+
+def database_averages(choice, progress):
+    """averages the inspection scores inside the database."""
+    progress(0, "grouping scores in the database")
+    return DataController.database_averages(choice)
+
+
+def database_violation_graph_counts(number, progress):
+    """counts the violations for the bar and scatter graphs inside the database."""
+    progress(0, "counting violation codes in the database")
+    code_counts = DataController.database_violation_code_counts(number)
+    progress(0.5, "counting violations by zip code in the database")
+    return code_counts, DataController.database_violation_zip_counts()
+
+
+def collection_columns(choice, progress):
+    """reads the column names of the collection."""
+    progress(0, f"reading the columns of {choice}")
+    return DatabaseController.get_columns(choice)
+
+
+def read_collection_queries(choice, queries, progress):
+    """reads the queries planned by the lazy handle of the collection."""
+    frames = []
+    for position, query in enumerate(queries):
+        progress(position / len(queries), f"reading {choice}")
+        frames += LazyCollection(choice).read([query])
+    return frames
@@ -1,44 +1,52 @@
 import time
 import tkinter as tk
-from concurrent.futures.thread import ThreadPoolExecutor
 from tkinter import messagebox
 from tkinter import ttk, simpledialog
-from tkinter.filedialog import askopenfilename
-
-import matplotlib.figure as plt
-import pandas as pd
-import seaborn as sns
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
-
-import DataController
-
-global violations
-global inspections
-global inventory
-
-
-def data_viewer():
+from tkinter.filedialog import askopenfilename, askopenfilenames, asksaveasfilename
+
+from DataTable import DataTable
+from DatasetSession import DatasetSession, NoDatasetError
+from GraphCache import GraphCache
+from Instrumentation import Instrumentation, PROFILE_MODES
+from JobScheduler import JobScheduler
+from LazyImport import LazyImport
+
+# the data, graph and database modules are imported the first time a button needs them,
+# so the window comes up before pandas, matplotlib, seaborn and pymongo have been loaded
+pd = LazyImport('pandas')
+sns = LazyImport('seaborn')
+FigureCanvasTkAgg = LazyImport('matplotlib.backends.backend_tkagg', 'FigureCanvasTkAgg')
+Figure = LazyImport('matplotlib.figure', 'Figure')
+DataJobs = LazyImport('DataJobs')
+DataController = LazyImport('DataController', 'DataController')
+DataStream = LazyImport('DataStream')
+DatasetIndex = LazyImport('DatasetIndex', 'DatasetIndex')
+LazyCollection = LazyImport('LazyCollection', 'LazyCollection')
+ViolationAggregation = LazyImport('ViolationAggregation', 'ViolationAggregation')
+zip_analysis = LazyImport('ZipAnalysis')
+
+# the columns the averages need, gathered for the filtered rows
+AVERAGE_COLUMNS = ['PE DESCRIPTION', 'Zip Codes', 'SCORE', 'ACTIVITY DATE', 'SEAT NUMBERS']
+# the columns the zip code correlation needs, sent to the worker
+CORRELATION_COLUMNS = {'violations': ['SERIAL NUMBER'],
+                       'inspections': ['FACILITY ID', 'Zip Codes', 'SERIAL NUMBER', 'SEAT NUMBERS']}
+# the columns counting the establishments of each violation needs, sent to the job
+GRAPH_COLUMNS = {'violations': ['SERIAL NUMBER', 'VIOLATION CODE', 'VIOLATION DESCRIPTION', 'Zip Codes'],
+                 'inspections': ['SERIAL NUMBER', 'FACILITY ID']}
+
+
+def data_viewer(on_ready=None):
+    """" opens the main window, on_ready is called with the window once it is first shown."""
     # Clears the data from the tree view
     def clear_tree():
-        my_tree.delete(*my_tree.get_children())
+        data_table.clear()
 
     # Create a three view from the dataframe
-    def setup_tree_view(data):
+    def setup_tree_view(data, rows=None):
         """ populate the tree view with data """
-        # Ref: https://stackoverflow.com/questions/18562123/how-to-make-ttk-treeviews-rows-editable
-
-        # Clear old tree view
-        clear_tree()
-        # Set up new tree view
-        my_tree["column"] = list(data.columns)
-        my_tree["show"] = "headings"
-        # Loop thru column list for headers
-        for column in my_tree["column"]:
-            my_tree.heading(column, text=column)
-
-        # Put data in tree view
-        for row in data.to_numpy().tolist():
-            my_tree.insert("", "end", values=row)
+        # only the rows in view are put into the tree view, the dataframe is kept as the backing store
+        data_table.set_data(data, rows)
+        table_view['name'] = None
 
     # Setup how data is displayed
     def set_pandas_display_options() -> None:
@@ -51,35 +59,99 @@ def data_viewer():
         display.width = None
         display.precision = 2
 
+    # Shows the progress of the running job
+    def show_progress(name, fraction, message):
+        """ update the status bar with the progress of a job."""
+        progress_bar["value"] = fraction * 100
+        status_label.config(text="{}: {}".format(name, message))
+
+    # Shows the error raised by a job that loads csv files
+    def show_file_error(ex):
+        """ show the error for a failed load of the csv files."""
+        if isinstance(ex, FileNotFoundError):
+            messagebox.showerror("Warning", "No files or missing files. The "
+                                            "violations, inspections and inventory files must all be present")
+        elif isinstance(ex, TypeError):
+            messagebox.showerror("Warning", "Files must be in CSV format")
+        elif isinstance(ex, ValueError):
+            messagebox.showerror("Warning", "Files not correctly formatted.")
+        elif isinstance(ex, KeyError):
+            messagebox.showerror("Warning", "Files not correctly formatted, missing column {}".format(ex))
+        elif isinstance(ex, RuntimeError):
+            messagebox.showerror("Warning", "Failed to save to the database. \n"
+                                            "check the database connection ({})".format(ex))
+        else:
+            messagebox.showerror("error", "Failed to load the data set. {}".format(ex))
+
+    # Shows the error raised by a job that saves to the database
+    def show_save_error(ex):
+        """ show the error for a failed save to the database."""
+        messagebox.showerror("Warning", "Failed to save to the database. \n"
+                                        "check the database connection ({})".format(ex))
+
+    # Shows the error raised by a job that reads from the database
+    def show_database_error(ex):
+        """ show the error for a failed query of the database."""
+        messagebox.showerror("Warning", "Failed to query the database. \n"
+                                        "check the database connection ({})".format(ex))
+
+    # Shows that there is no data set loaded
+    def show_no_data():
+        messagebox.showerror("error", "No data to display, \n "
+                                      "load the initial data set \n "
+                                      "or load from the database. ")
+
+    # Replaces the data set held in memory
+    def set_dataset(dataset, cube, source_files=None):
+        """ set the current data set, its score cube and the csv files it was loaded from."""
+        # nothing may keep the old version alive once the session has released it, so the views of it
+        # are dropped first
+        if table_view.get('name') is not None:
+            clear_tree()
+            table_view['name'] = None
+        graph_cache.clear('memory')
+        if 'aggregation' in violation_counts:
+            violation_counts['aggregation'].clear()
+        dataset_index.clear()
+        clear_view_filter()
+        versions['memory'] = dataset_session.set_dataset(dataset, cube, source_files)
+
     # cleans the dataset
     def clean_dataset():
         """ if dataset has been loaded clean it or throw error."""
-        try:
-            global violations
-            global inspections
-            global inventory
-
-            dataset = DataController.clean_dataset([violations, inspections, inventory])
-
-            violations = dataset[0]
-            inspections = dataset[1]
-            inventory = dataset[2]
-
-            messagebox.showinfo("complete", "Data set has been cleaned")
-        except RuntimeError:
-            messagebox.showerror("error", "Failed to open database.")
-        except KeyError as ex:
-            messagebox.showerror("error", "problem with current dataset column. {}".format(ex))
-        except ValueError as ex:
-            messagebox.showerror("error", "current data set has already been cleaned. {}".format(ex))
-        except NameError:
-            messagebox.showerror("error", "No data to display, \n "
-                                          "load the initial data set \n "
-                                          "or load from the database. ")
 
-    # Opens a csv file, cleans then converts it into a JSON file
+        def on_done(result):
+            dataset, cube, snapshot_error, memory_report = result
+            set_dataset(dataset, cube, dataset_session.source_files)
+            if snapshot_error is not None:
+                messagebox.showerror("error", "Data set cleaned but the snapshot could not be saved. {}"
+                                     .format(snapshot_error))
+            else:
+                messagebox.showinfo("complete", "Data set has been cleaned \n\n"
+                                                "memory used by each table (MB) \n{}".format(memory_report))
+
+        def on_error(ex):
+            if isinstance(ex, RuntimeError):
+                messagebox.showerror("error", "Failed to open database.")
+            elif isinstance(ex, KeyError):
+                messagebox.showerror("error", "problem with current dataset column. {}".format(ex))
+            elif isinstance(ex, ValueError):
+                messagebox.showerror("error", "current data set has already been cleaned. {}".format(ex))
+            else:
+                messagebox.showerror("error", "Failed to clean the data set. {}".format(ex))
+
+        try:
+            # a snapshot is kept so the same csv files load already cleaned next time, the worker reads the
+            # tables from their files and they are spilled while it runs to make room for the cleaned tables
+            scheduler.submit("Cleaning", DataJobs.clean_dataset, dataset_session.sources(reserve=True),
+                             dataset_session.source_files, on_done=on_done, on_error=on_error,
+                             conflicts=dataset_buttons)
+        except NoDatasetError:
+            show_no_data()
+
+    # Opens the csv files and loads them into memory
     def prep_initial_dataset():
-        """loads the initial data set and saves it to the database."""
+        """loads the initial data set into memory."""
 
         def open_file():
             """Open a file for editing."""
@@ -92,123 +164,356 @@ def data_viewer():
             else:
                 return filepath
 
-        try:
-            global violations
-            global inspections
-            global inventory
-
-            violations = None
-            inspections = None
-            inventory = None
+        def on_done(result):
+            dataset, from_snapshot, cube = result
+            set_dataset(dataset, cube, list(roles.values()))
+            if from_snapshot:
+                messagebox.showinfo("Completed", "Cleaned data set loaded from the local snapshot.")
+            else:
+                messagebox.showinfo("Completed", "Initial data set prepared and loaded into memory.")
 
+        roles = {}
+        try:
             messagebox.showinfo("Info", "Please select the three CSV files")
 
-            while inspections is None or violations is None or inventory is None:
-                data = DataController.prep_data(DataController.convert_csv_to_json(open_file()))
-                if 'ACTIVITY DATE' in data.columns:
-                    inspections = data
-                elif 'SERIAL NUMBER' in data.columns:
-                    violations = data
-                    violations = violations.set_index("SERIAL NUMBER")
-                elif 'SERIAL NUMBER' not in data.columns and 'FACILITY ID' in data.columns:
-                    inventory = data
-                else:
-                    raise ValueError
-
-            messagebox.showinfo("Completed", "Initial data set prepared and loaded into memory.")
-
-        except FileNotFoundError:
-            messagebox.showerror("Warning", "No files or missing files. The "
-                                            "violations, inspections and inventory files must all be present")
-        except TypeError:
-            messagebox.showerror("Warning", "Files must be in CSV format")
-        except ValueError:
-            messagebox.showerror("Warning", "Files not correctly formatted.")
-
-    def pre_initial_dataset_threads():
-
-        def pre_initial_dataset_thread(data):
-            with ThreadPoolExecutor() as ex:
-                data_file = ex.submit(DataController.convert_csv_to_json, data)
-                data_file = ex.submit(DataController.prep_data, data_file.result())
-            return data_file.result()
+            while len(roles) < 3:
+                filepath = open_file()
+                roles[DataController.read_file_role(filepath)] = filepath
+        except (FileNotFoundError, TypeError, ValueError) as ex:
+            show_file_error(ex)
+            return
+
+        # a snapshot of the same files skips loading and cleaning them again, the loading runs in a thread
+        # so the tables read back from the ingest workers or the snapshot are not pickled to the GUI again
+        scheduler.submit("Loading csv files", DataJobs.load_csv_dataset, roles, None,
+                         on_done=on_done, on_error=show_file_error, conflicts=dataset_buttons, thread=True)
+
+    # Adds a newer export of the csv files to the cleaned data set
+    def append_dataset():
+        """clean only the rows of the new csv files and merge them into the data set."""
+
+        def on_done(result):
+            dataset, cube, summary, snapshot_error, database_error = result
+            source_files = dataset_session.source_files
+            set_dataset(dataset, cube, source_files + list(filepaths) if source_files is not None else None)
+            if database:
+                forget_database_views()
+            report = "\n".join("{}: {} added, {} removed".format(name, counts['added'], counts['removed'])
+                               for name, counts in summary.items())
+            if database_error is not None:
+                messagebox.showerror("error", "New rows added but they could not all be saved to the database. {} "
+                                              "\n Use 'save changes to database' to bring the database up to date."
+                                     .format(database_error))
+            elif snapshot_error is not None:
+                messagebox.showerror("error", "New rows added but the snapshot could not be saved. {}"
+                                     .format(snapshot_error))
+            else:
+                messagebox.showinfo("Completed", "New rows added to the data set \n\n{}".format(report))
 
         try:
-            global violations
-            global inspections
-            global inventory
-            with ThreadPoolExecutor() as pool:
-
-                violations = pool.submit(pre_initial_dataset_thread, 'violations.csv').result()
-                inspections = pool.submit(pre_initial_dataset_thread, 'Inspections.csv').result()
-                inventory = pool.submit(pre_initial_dataset_thread, 'Inventroy.csv').result()
-
-            messagebox.showinfo("Completed", "Initial data set loaded into memory.")
-
-        except FileNotFoundError:
-            messagebox.showerror("Warning", "No files or missing files. The "
-                                            "violations, inspections and inventory files must all be present")
-        except TypeError:
-            messagebox.showerror("Warning", "Files must be in CSV format")
-        except ValueError:
-            messagebox.showerror("Warning", "Files not correctly formatted.")
+            if 'SEAT NUMBERS' not in dataset_session.columns('inspections'):
+                messagebox.showerror("error", "Clean the data set before adding new rows.")
+                return
+        except NoDatasetError:
+            show_no_data()
+            return
+        messagebox.showinfo("Info", "Please select the new CSV files")
+        filepaths = askopenfilenames(
+            filetypes=[("Text Files", "*.csv"), ("All Files", "*.*")]
+        )
+        if not filepaths:
+            return
+        database = messagebox.askyesno("Database", "Also add the new rows to the database? \n"
+                                                   "Only do this if the database holds this data set.")
+        scheduler.submit("Adding new rows", DataJobs.append_dataset, dataset_session.sources(reserve=True),
+                         dataset_session.cube, list(filepaths), dataset_session.source_files, database,
+                         on_done=on_done, on_error=show_file_error, conflicts=dataset_buttons)
+
+    # Streams the csv files through cleaning a chunk at a time into the database
+    def stream_initial_dataset():
+        """cleans the initial data set in chunks and writes it straight to the database."""
+
+        def on_done(rows):
+            forget_database_views()
+            messagebox.showinfo("Completed", "Data set cleaned and saved to the database "
+                                             "({} rows). \n load the dataset from the database "
+                                             "to display it.".format(sum(rows.values())))
+
+        messagebox.showinfo("Info", "Please select the three CSV files")
+        filepaths = askopenfilenames(
+            filetypes=[("Text Files", "*.csv"), ("All Files", "*.*")]
+        )
+        if not filepaths:
+            return
+        chunk_size = simpledialog.askinteger("Chunk size", "Number of rows to read at a time",
+                                             initialvalue=DataStream.DEFAULT_CHUNK_SIZE, minvalue=1000)
+        if chunk_size is None:
+            return
+        scheduler.submit("Streaming csv files", DataJobs.stream_csv_dataset, list(filepaths), chunk_size,
+                         on_done=on_done, on_error=show_file_error, conflicts=database_buttons)
 
     # save dataset to database
     def save_dataset():
         """save the current dataset to the database."""
         try:
-            DataController.replace_database_collection(violations, "violations")
-            DataController.replace_database_collection(inspections, "inspections")
-            DataController.replace_database_collection(inventory, "inventory")
-            messagebox.showinfo("Completed", "dataset as been saved to the database.")
-        except RuntimeError as ex:
-            messagebox.showerror("Warning", "Failed to save to the database. \n"
-                                            "check the database connection ({})".format(ex))
-        except NameError:
+            scheduler.submit("Saving", DataJobs.save_dataset, dataset_session.sources(thread=True), save_binary.get(),
+                             on_done=lambda result: (forget_database_views(), messagebox.showinfo(
+                                 "Completed", "dataset as been saved to the database.")),
+                             on_error=show_save_error, conflicts=database_buttons, thread=True)
+        except NoDatasetError:
             messagebox.showerror("error", "No data to clean, \n "
                                           "load the initial data set \n "
                                           "or load from the database. ")
 
-    # save dataset to database
-    def save_dataset_threads():
-            """save the current dataset to the database."""
-            try:
-                global violations
-                global inspections
-                global inventory
-
-                tic = time.perf_counter()
-                with ThreadPoolExecutor() as executor:
-                    executor.submit(DataController.replace_database_collection, violations, "violations")
-                    executor.submit(DataController.replace_database_collection, inspections, "inspections")
-                    executor.submit(DataController.replace_database_collection, inventory, "inventory")
-                executor.shutdown()
-                toc = time.perf_counter()
-                print(f"in {toc - tic:0.4f}")
-            except RuntimeError as ex:
-                messagebox.showerror("Warning", "Failed to save to the database. \n"
-                                                "check the database connection ({})".format(ex))
-            except NameError:
-                messagebox.showerror("error", "No data to save, \n "
-                                              "load the initial data set \n "
-                                              "or load from the database. ")
+    # save only the changes to the dataset to database
+    def update_dataset():
+        """save the rows that have changed since the last save to the database."""
+
+        def on_done(changes):
+            forget_database_views()
+            changed = sum(sum(change.values()) for change in changes if change is not None)
+            messagebox.showinfo("Completed", "dataset changes saved to the database ({} rows).".format(changed))
 
-    # load dataset from database
-    def load_dataset_from_database():
-        global violations
-        global inspections
-        global inventory
         try:
-            violations = DataController.read_from_database('violations')
-            inspections = DataController.read_from_database('inspections')
-            inventory = DataController.read_from_database('inventory')
-        except RuntimeError as exc:
-            messagebox.showerror("error", 'Failed to open database ({})'.format(exc))
-        except NameError:
-            messagebox.showerror("error", "No data to display, \n "
+            scheduler.submit("Saving changes", DataJobs.update_dataset, dataset_session.sources(thread=True),
+                             save_binary.get(), on_done=on_done, on_error=show_save_error, conflicts=database_buttons,
+                             thread=True)
+        except NoDatasetError:
+            messagebox.showerror("error", "No data to save, \n "
                                           "load the initial data set \n "
                                           "or load from the database. ")
 
+    # load dataset from database
+    def load_dataset_from_database():
+
+        def on_done(result):
+            dataset, cube = result
+            set_dataset(dataset, cube)
+            messagebox.showinfo("Completed", "Data set loaded from the database.")
+
+        scheduler.submit("Loading from database", DataJobs.load_database_dataset,
+                         on_done=on_done,
+                         on_error=lambda ex: messagebox.showerror("error", 'Failed to open database ({})'.format(ex)),
+                         conflicts=dataset_buttons)
+
+    # Shows part of a database collection without loading the data set
+    def browse_database():
+        """ display the chosen columns and dates of a collection, only reading what has not been read yet."""
+
+        def show():
+            choice = collection.get()
+            handle = lazy_collections.setdefault(choice, LazyCollection(choice))
+            columns = [column.strip() for column in columns_entry.get().split(",") if column.strip()] or None
+            start = start_entry.get().strip() or None
+            end = end_entry.get().strip() or None
+            try:
+                if start is not None:
+                    pd.Timestamp(start)
+                if end is not None:
+                    pd.Timestamp(end)
+            except ValueError:
+                messagebox.showerror("error", "Dates must be written as YYYY-MM-DD.")
+                return
+            if columns is None and handle.columns is None:
+                def on_columns(names):
+                    handle.columns = names
+                    show()
+
+                # every column is wanted so the names are read first
+                scheduler.submit("Reading columns", DataJobs.collection_columns, choice,
+                                 on_done=on_columns, on_error=show_database_error, conflicts=[btn_show],
+                                 thread=True)
+                return
+            unknown = [column for column in columns or [] if handle.columns is not None and
+                       column not in handle.columns]
+            if unknown:
+                messagebox.showerror("error", "No such columns: {}".format(", ".join(unknown)))
+                return
+            queries = handle.plan(columns, start, end)
+
+            def on_done(frames):
+                handle.merge(queries, frames)
+                setup_tree_view(handle.view(columns, start, end))
+
+            if queries:
+                scheduler.submit("Reading {}".format(choice), DataJobs.read_collection_queries, choice, queries,
+                                 on_done=on_done, on_error=show_database_error, conflicts=[btn_show], thread=True)
+            else:
+                setup_tree_view(handle.view(columns, start, end))
+
+        pop = tk.Toplevel(window)
+        pop.title("Browse database")
+        collection = tk.StringVar(value="inspections")
+        for name in ["inspections", "inventory", "violations"]:
+            tk.Radiobutton(pop, text=name, variable=collection, value=name).pack(anchor=tk.W)
+        tk.Label(pop, text="columns, separated by commas (blank for all)").pack(anchor=tk.W)
+        columns_entry = tk.Entry(pop, width=60)
+        columns_entry.pack(anchor=tk.W, fill=tk.X)
+        tk.Label(pop, text="inspections from (YYYY-MM-DD)").pack(anchor=tk.W)
+        start_entry = tk.Entry(pop, width=20)
+        start_entry.pack(anchor=tk.W)
+        tk.Label(pop, text="inspections to (YYYY-MM-DD)").pack(anchor=tk.W)
+        end_entry = tk.Entry(pop, width=20)
+        end_entry.pack(anchor=tk.W)
+        btn_show = tk.Button(pop, text="Show", command=show)
+        btn_show.pack(anchor=tk.W, fill=tk.X)
+
+    # Forgets what has been read from the database once it has been written to
+    def forget_database_views():
+        lazy_collections.clear()
+        versions['database'] += 1
+        graph_cache.clear('database')
+
+    # Returns the aggregation of the violations, made the first time the graphs are counted
+    def get_violation_aggregation():
+        """ return the aggregation keeping the establishments of each violation code for each version."""
+        if 'aggregation' not in violation_counts:
+            violation_counts['aggregation'] = ViolationAggregation()
+        return violation_counts['aggregation']
+
+    # Returns the indexes of the cleaned data set in memory, building them once for each version
+    def get_dataset_index():
+        if dataset_index.get('version') != versions['memory']:
+            violations, inspections = dataset_session.views(['violations', 'inspections'], DatasetIndex.COLUMNS)
+            dataset_index.update(index=DatasetIndex.build(violations, inspections), version=versions['memory'])
+        return dataset_index['index']
+
+    # Shows every row of the data set in memory again
+    def clear_view_filter():
+        view_filter.update(settings={}, inspections=None, violations=None)
+        view_filter['version'] += 1
+
+    # Applies filters to the rows of the data set that are displayed, averaged and graphed
+    def set_view_filter(settings):
+        """ keep only the rows passing the filters, as row positions so the data set is not copied."""
+        index = get_dataset_index()
+        inspection_settings = {key: value for key, value in settings.items() if key != 'violation_codes'}
+        inspection_rows = index.filter_inspections(**inspection_settings) if inspection_settings else None
+        violation_rows = index.filter_violations(inspection_rows, settings.get('violation_codes')) \
+            if settings else None
+        view_filter.update(settings=settings, inspections=inspection_rows, violations=violation_rows)
+        view_filter['version'] += 1
+        if table_view.get('name') == "inspections":
+            data_table.set_data(dataset_session.view('inspections'), inspection_rows)
+        elif table_view.get('name') == "violations":
+            data_table.set_data(dataset_session.view('violations'), violation_rows)
+
+    # Filters the data set in memory by date, zip code, score, seating and violation code
+    def display_filters():
+        """ open the filter controls, each change applies a new view of the data set."""
+
+        def split(text):
+            return [value.strip() for value in text.split(",") if value.strip()]
+
+        def apply(*args):
+            start_date = first_date + pd.Timedelta(days=start_scale.get())
+            end_date = first_date + pd.Timedelta(days=end_scale.get())
+            start_label.config(text="from {}".format(start_date.date()))
+            end_label.config(text="to {}".format(end_date.date()))
+            settings = {}
+            if start_scale.get() > 0:
+                settings['start'] = start_date
+            if end_scale.get() < days:
+                settings['end'] = end_date
+            if score_min.get() > 0 or score_max.get() < 100:
+                settings['score_range'] = (score_min.get(), score_max.get())
+            try:
+                zip_codes = [int(zip_code) for zip_code in split(zip_entry.get())]
+            except ValueError:
+                messagebox.showerror("error", "Zip codes must be numbers.")
+                return
+            if zip_codes:
+                settings['zip_codes'] = zip_codes
+            seating = [seating_list.get(position) for position in seating_list.curselection()]
+            if seating:
+                settings['seating'] = seating
+            codes = split(code_entry.get())
+            if codes:
+                settings['violation_codes'] = codes
+            start = time.perf_counter()
+            try:
+                set_view_filter(settings)
+            except (NoDatasetError, KeyError, AttributeError):
+                pop.destroy()
+                messagebox.showerror("error", "Data has not been cleaned.")
+                return
+            rows = {name: len(view_filter[name]) if view_filter[name] is not None else None
+                    for name in ['inspections', 'violations']}
+            count_label.config(text="{} inspections and {} violations in view ({:.1f} ms)".format(
+                "all" if rows['inspections'] is None else rows['inspections'],
+                "all" if rows['violations'] is None else rows['violations'], (time.perf_counter() - start) * 1000))
+
+        def clear():
+            start_scale.set(0)
+            end_scale.set(days)
+            score_min.set(0)
+            score_max.set(100)
+            zip_entry.delete(0, tk.END)
+            code_entry.delete(0, tk.END)
+            seating_list.selection_clear(0, tk.END)
+            apply()
+
+        try:
+            index = get_dataset_index()
+        except NoDatasetError:
+            show_no_data()
+            return
+        except (KeyError, AttributeError):
+            messagebox.showerror("error", "Data has not been cleaned.")
+            return
+        first_date, last_date = index.date_range()
+        if first_date is None:
+            show_no_data()
+            return
+        days = max(1, (last_date - first_date).days)
+        settings = view_filter['settings']
+
+        pop = tk.Toplevel(window)
+        pop.title("Filter dataset")
+        # the sliders are laid out first and only apply the filters once they have been set below
+        start_label = tk.Label(pop)
+        start_label.pack(anchor=tk.W)
+        start_scale = tk.Scale(pop, from_=0, to=days, orient=tk.HORIZONTAL, showvalue=0, length=400)
+        start_scale.pack(anchor=tk.W, fill=tk.X)
+        end_label = tk.Label(pop)
+        end_label.pack(anchor=tk.W)
+        end_scale = tk.Scale(pop, from_=0, to=days, orient=tk.HORIZONTAL, showvalue=0, length=400)
+        end_scale.pack(anchor=tk.W, fill=tk.X)
+        score_min = tk.Scale(pop, from_=0, to=100, orient=tk.HORIZONTAL, label="lowest score")
+        score_min.pack(anchor=tk.W, fill=tk.X)
+        score_max = tk.Scale(pop, from_=0, to=100, orient=tk.HORIZONTAL, label="highest score")
+        score_max.pack(anchor=tk.W, fill=tk.X)
+        tk.Label(pop, text="zip codes, separated by commas (blank for all)").pack(anchor=tk.W)
+        zip_entry = tk.Entry(pop, width=60)
+        zip_entry.bind("<Return>", apply)
+        zip_entry.pack(anchor=tk.W, fill=tk.X)
+        tk.Label(pop, text="seating (none selected for all)").pack(anchor=tk.W)
+        seating_list = tk.Listbox(pop, selectmode=tk.MULTIPLE, exportselection=False, height=8)
+        for seating in index.inspection_indexes['seating'].values:
+            seating_list.insert(tk.END, seating)
+        seating_list.bind("<<ListboxSelect>>", apply)
+        seating_list.pack(anchor=tk.W, fill=tk.X)
+        tk.Label(pop, text="violation codes, separated by commas (blank for all)").pack(anchor=tk.W)
+        code_entry = tk.Entry(pop, width=60)
+        code_entry.bind("<Return>", apply)
+        code_entry.pack(anchor=tk.W, fill=tk.X)
+        tk.Button(pop, text="Clear filters", command=clear).pack(anchor=tk.W, fill=tk.X)
+        count_label = tk.Label(pop, text="filters apply to the data set in memory")
+        count_label.pack(anchor=tk.W)
+
+        # the controls start from the filters in use
+        start_scale.set((settings['start'] - first_date).days if 'start' in settings else 0)
+        end_scale.set((settings['end'] - first_date).days if 'end' in settings else days)
+        score_min.set(settings.get('score_range', (0, 100))[0])
+        score_max.set(settings.get('score_range', (0, 100))[1])
+        zip_entry.insert(0, ", ".join(str(zip_code) for zip_code in settings.get('zip_codes', [])))
+        code_entry.insert(0, ", ".join(settings.get('violation_codes', [])))
+        for position, seating in enumerate(seating_list.get(0, tk.END)):
+            if seating in settings.get('seating', []):
+                seating_list.selection_set(position)
+        for scale in [start_scale, end_scale, score_min, score_max]:
+            scale.config(command=apply)
+
     # Opens one of the databases into the tree view
     def display_dataset():
         """display dataset with a tree view."""
@@ -225,17 +530,15 @@ def data_viewer():
 
             def get_choice():
                 try:
-                    global violations
-                    global inspections
-                    global inventory
                     if v.get() == "inspections":
-                        setup_tree_view(inspections)
+                        setup_tree_view(dataset_session.view('inspections'), view_filter['inspections'])
                     elif v.get() == "inventory":
-                        setup_tree_view(inventory)
+                        setup_tree_view(dataset_session.view('inventory'))
                     if v.get() == "violations":
-                        setup_tree_view(violations)
+                        setup_tree_view(dataset_session.view('violations'), view_filter['violations'])
+                    table_view['name'] = v.get()
 
-                except NameError:
+                except NoDatasetError:
                     pop.destroy()
                     messagebox.showerror("error", "No data to display, \n "
                                                   "load the initial data set \n "
@@ -279,22 +582,36 @@ def data_viewer():
                          "by zip code"]
 
             def get_choice():
+                if in_database.get():
+                    # only the grouped rows come back from the database
+                    pop.destroy()
+                    scheduler.submit("Averaging in the database", DataJobs.database_averages, v.get(),
+                                     on_done=setup_tree_view, on_error=show_database_error,
+                                     conflicts=[btn_display_avg], thread=True)
+                    return
                 try:
-                    global inspections
-
+                    if 'SEAT NUMBERS' not in dataset_session.columns('inspections'):
+                        raise TypeError
+                    # only the columns averaged are read, a spilled table is not read back for them
+                    inspections = dataset_session.view('inspections', AVERAGE_COLUMNS, load=False)
+                    # the cube answers the filters, only the inspections of a month the date range starts or
+                    # ends part way through are read from the filtered rows
+                    rows = view_filter['inspections']
+                    filters = {key: value for key, value in view_filter['settings'].items()
+                               if key != 'violation_codes'}
                     if v.get() == "by type of vendor’s seating":
-                        data = DataController.averages(v.get(), inspections)
+                        data = DataController.averages(v.get(), inspections, dataset_session.cube, rows, filters)
                         setup_tree_view(data)
                         pop.destroy()
                     elif v.get() == "by zip code":
-                        data = DataController.averages(v.get(), inspections)
+                        data = DataController.averages(v.get(), inspections, dataset_session.cube, rows, filters)
                         setup_tree_view(data)
                         pop.destroy()
 
                 except AttributeError:
                     pop.destroy()
                     messagebox.showerror("error", "Data has not been cleaned.")
-                except NameError:
+                except NoDatasetError:
                     pop.destroy()
                     messagebox.showerror("error", "No data to display, \n "
                                                   "load the initial data set \n "
@@ -322,48 +639,240 @@ def data_viewer():
 
     # display data using graphs
     def display_data_graph():
-        pop = tk.Toplevel(window)
-        pop.title("Data Graphs")
-        sns.set_theme(style="whitegrid")
-        frame = tk.Frame(pop, relief=tk.RAISED, bd=2)
-        frame.pack(anchor=tk.CENTER, fill=tk.BOTH)
-        f1 = plt.Figure(figsize=(7, 7))
-        ax1 = f1.subplots()
-        f2 = plt.Figure(figsize=(7, 7))
-        ax2 = f2.subplots()
-        sns.set()
 
-        try:
-            global violations
-            DataController.violation_bar_graph(violations, 14, ax1)
-            DataController.violation_scatter_graph(violations, ax2)
+        def show_graphs(entry):
+            current = graph_window.get('pop')
+            if current is not None and current.winfo_exists():
+                if graph_window['entry'] is entry:
+                    current.lift()
+                    return
+                current.destroy()
+
+            def change_number():
+                try:
+                    number = int(number_box.get())
+                except ValueError:
+                    return
+                if 0 < number and graph_cache.set_number(entry, number):
+                    canvas1.draw_idle()
+
+            pop = tk.Toplevel(window)
+            pop.title("Data Graphs")
+            frame = tk.Frame(pop, relief=tk.RAISED, bd=2)
+            frame.pack(anchor=tk.CENTER, fill=tk.BOTH)
 
             bar_graph_label = tk.Label(frame, text="A bar graph of the most common violations that have been \n"
                                                    "committed by the establishments")
 
             scatter_graph_label = tk.Label(frame, text="A scatter graph of the placement of violations grouped by zip "
                                                        "codes")
+            number_frame = tk.Frame(frame)
+            tk.Label(number_frame, text=f"{entry['code counts'].columns[0]} bars shown").pack(side=tk.LEFT)
+            number_box = tk.Spinbox(number_frame, from_=1, to=max(1, len(entry['code counts'])), width=5,
+                                    command=change_number)
+            number_box.delete(0, tk.END)
+            number_box.insert(0, entry['number'])
+            number_box.bind("<Return>", lambda event: change_number())
+            number_box.pack(side=tk.LEFT)
             bar_graph_label.pack(side=tk.TOP, anchor=tk.NW)
+            number_frame.pack(side=tk.TOP, anchor=tk.NW)
             scatter_graph_label.pack(side=tk.TOP, anchor=tk.NE)
-            canvas1 = FigureCanvasTkAgg(f1, frame)
+            # the figures are kept by the cache so they are drawn again without counting or plotting
+            canvas1 = FigureCanvasTkAgg(entry['bar'], frame)
             canvas1.draw()
             canvas1.get_tk_widget().pack(side=tk.LEFT, expand=1)
-            canvas2 = FigureCanvasTkAgg(f2, frame)
+            canvas2 = FigureCanvasTkAgg(entry['scatter'], frame)
             canvas2.draw()
             canvas2.get_tk_widget().pack(side=tk.RIGHT, expand=1)
-        except NameError:
-            messagebox.showerror("error", "No data to display, \n "
-                                          "load the initial data set \n "
-                                          "or load from the database. ")
-            pop.destroy()
+            graph_window.update(pop=pop, entry=entry)
+
+        def on_done(counts, source, version):
+            code_counts, zip_counts = counts
+            sns.set_theme(style="whitegrid")
+            sns.set()
+            show_graphs(graph_cache.put(source, version, code_counts, zip_counts, 14))
+
+        def on_aggregated(aggregate, version, level):
+            # every level of the version is kept, so the other level is drawn without counting again
+            get_violation_aggregation().put(version, aggregate)
+            # the bar graph is drawn once with every group, least first, and the number of bars shown only moves
+            # its axis limits, so every group is sorted rather than the number first shown. The scatter graph
+            # does not depend on the order of the zip codes, so they are not sorted.
+            on_done((ViolationAggregation.top(aggregate[level]), aggregate['zip']), 'memory', (version, level))
+
+        source = 'database' if in_database.get() else 'memory'
+        version = versions[source]
+        if source == 'memory' and view_filter['violations'] is not None:
+            version = (version, view_filter['version'])
+        # the graphs of the data set in memory show the establishments of each violation code or category
+        level = 'category' if group_violations.get() else 'code'
+        entry = graph_cache.get(source, (version, level) if source == 'memory' else version)
+        if entry is not None:
+            show_graphs(entry)
+            return
+        if in_database.get():
+            scheduler.submit("Counting violations in the database", DataJobs.database_violation_graph_counts, None,
+                             on_done=lambda counts: on_done(counts, source, version),
+                             on_error=show_database_error, conflicts=[btn_display_graph], thread=True)
+            return
+        try:
+            if 'SEAT NUMBERS' not in dataset_session.columns('inspections'):
+                raise KeyError('SEAT NUMBERS')
+            violations, inspections = dataset_session.views(['violations', 'inspections'], GRAPH_COLUMNS)
+            aggregation = get_violation_aggregation()
+            if aggregation.get(version) is not None or view_filter['violations'] is not None:
+                # kept counts, and the counts of the filtered rows through the index, need no worker
+                index = dataset_index.get('index')
+                on_aggregated(aggregation.version_aggregate(
+                    version, violations, inspections, view_filter['violations'],
+                    index.violation_inspection if index is not None else None), version, level)
+                return
+            # the counting runs in a thread, the graphs are drawn when it finishes
+            scheduler.submit("Counting violations", DataJobs.violation_graph_counts,
+                             violations, inspections, aggregation.hierarchy,
+                             on_done=lambda aggregate: on_aggregated(aggregate, version, level),
+                             on_error=lambda ex: messagebox.showerror(
+                                 "error", "Data has not been cleaned" if isinstance(ex, (KeyError, TypeError))
+                                 else "Failed to count the violations. {}".format(ex)),
+                             conflicts=[btn_display_graph], thread=True)
+        except NoDatasetError:
+            show_no_data()
         except KeyError:
             messagebox.showerror("error", "Data has not been cleaned")
-            pop.destroy()
+
+    # Tests whether facilities in some zip codes have more violations
+    def display_zip_correlation():
+        """ show the violations per facility of each zip code and how significant the differences are."""
+
+        def on_done(result):
+            setup_tree_view(result['rates'].round(3))
+            pop = tk.Toplevel(window)
+            pop.title("Violations per facility by zip code")
+            statistics = result['statistics']
+            text = "\n".join("{}: {:.2f} with {} degrees of freedom, p = {:.4f}, permutation p = {:.4f}".format(
+                row['test'], row['statistic'], row['degrees of freedom'], row['p value'], row['permutation p value'])
+                for row in statistics.to_dict('records'))
+            tk.Label(pop, text="{} facilities, {} shuffles of their zip codes \n{}".format(
+                len(result['facilities']), permutations, text), justify=tk.LEFT).pack(anchor=tk.W)
+            canvas = FigureCanvasTkAgg(zip_analysis.ZipAnalysis.draw_figure(result, Figure(figsize=(12, 5))), pop)
+            canvas.draw()
+            canvas.get_tk_widget().pack(fill=tk.BOTH, expand=1)
+
+        permutations = simpledialog.askinteger("Permutation test", "Number of times to shuffle the zip codes",
+                                               initialvalue=zip_analysis.DEFAULT_PERMUTATIONS, minvalue=0,
+                                               maxvalue=100000)
+        if permutations is None:
+            return
+        try:
+            # only the columns the test needs are sent, and the filtered rows when the data set is filtered
+            frames = dict(zip(['violations', 'inspections'],
+                              dataset_session.views(['violations', 'inspections'], CORRELATION_COLUMNS)))
+            for name in frames:
+                if view_filter[name] is not None:
+                    frames[name] = frames[name].iloc[view_filter[name]]
+            scheduler.submit("Testing zip codes", DataJobs.zip_correlation, frames['violations'],
+                             frames['inspections'], permutations, on_done=on_done,
+                             on_error=lambda ex: messagebox.showerror("error", "Failed to test the zip codes. {}"
+                                                                      .format(ex)),
+                             conflicts=[btn_zip_correlation])
+        except NoDatasetError:
+            show_no_data()
+        except (KeyError, AttributeError):
+            messagebox.showerror("error", "Data has not been cleaned")
+
+    # Shows what each data operation has cost since recording was turned on
+    def display_performance():
+        """ open the panel to record, view and export the cost of the data operations."""
+
+        def apply_settings():
+            if record.get():
+                Instrumentation.enable(memory.get(), profile_stage.get() or None, profile_mode.get())
+            else:
+                Instrumentation.disable()
+            refresh()
+
+        def refresh():
+            session = Instrumentation.session
+            totals = pd.DataFrame(session.totals() if session is not None else [],
+                                  columns=['name', 'calls', 'seconds', 'rows_in', 'rows_out', 'peak_mb'])
+            totals_table.set_data(totals.round(3))
+            profiles = session.profiles() if session is not None else []
+            profile_text.delete("1.0", tk.END)
+            if profiles:
+                profile_text.insert(tk.END, profiles[0]['profile'])
+
+        def reset():
+            if Instrumentation.session is not None:
+                Instrumentation.disable()
+                apply_settings()
+            refresh()
+
+        def export(save):
+            if Instrumentation.session is None:
+                messagebox.showerror("error", "Turn on recording first.")
+                return
+            filepath = asksaveasfilename(defaultextension=".json", filetypes=[("JSON Files", "*.json")])
+            if filepath:
+                try:
+                    save(Instrumentation.session, filepath)
+                except OSError as ex:
+                    messagebox.showerror("error", "Failed to export. {}".format(ex))
+
+        pop = tk.Toplevel(window)
+        pop.title("Performance")
+        settings = tk.Frame(pop, relief=tk.RAISED, bd=2)
+        settings.pack(side=tk.TOP, fill=tk.X)
+        session = Instrumentation.session
+        record = tk.BooleanVar(value=session is not None)
+        memory = tk.BooleanVar(value=session is not None and session.memory)
+        profile_stage = tk.StringVar(value=(session.profile_stage or "") if session is not None else "")
+        profile_mode = tk.StringVar(value=session.profile_mode if session is not None else PROFILE_MODES[0])
+        tk.Checkbutton(settings, text="record operations", variable=record,
+                       command=apply_settings).pack(side=tk.LEFT)
+        tk.Checkbutton(settings, text="trace memory", variable=memory, command=apply_settings).pack(side=tk.LEFT)
+        tk.Label(settings, text="profile").pack(side=tk.LEFT)
+        stages = sorted({total['name'] for total in session.totals()}) if session is not None else []
+        stage_box = ttk.Combobox(settings, textvariable=profile_stage, values=[""] + stages, width=40)
+        stage_box.bind("<<ComboboxSelected>>", lambda event: apply_settings())
+        stage_box.bind("<Return>", lambda event: apply_settings())
+        stage_box.pack(side=tk.LEFT)
+        mode_box = ttk.Combobox(settings, textvariable=profile_mode, values=PROFILE_MODES, state="readonly",
+                                width=12)
+        mode_box.bind("<<ComboboxSelected>>", lambda event: apply_settings())
+        mode_box.pack(side=tk.LEFT)
+        tk.Button(settings, text="Refresh", command=refresh).pack(side=tk.LEFT)
+        tk.Button(settings, text="Reset", command=reset).pack(side=tk.LEFT)
+        tk.Button(settings, text="Export JSON",
+                  command=lambda: export(lambda session, path: session.save_json(path))).pack(side=tk.LEFT)
+        tk.Button(settings, text="Export Chrome trace",
+                  command=lambda: export(lambda session, path: session.save_chrome_trace(path))).pack(side=tk.LEFT)
+        totals_frame = tk.Frame(pop, relief=tk.RAISED, bd=2, height=300)
+        totals_frame.pack(side=tk.TOP, fill=tk.BOTH, expand=1)
+        totals_table = DataTable(totals_frame)
+        profile_text = tk.Text(pop, height=15, width=120)
+        profile_text.pack(side=tk.TOP, fill=tk.BOTH)
+        refresh()
+
+    # Shows how much of the memory budget the data set in memory uses
+    def show_memory(session):
+        used, budget, on_disk = session.memory_report()
+        memory_label.config(text="Memory: {:.0f} of {:.0f} MB{}".format(
+            used, budget, " ({} on disk)".format(", ".join(on_disk)) if on_disk else ""),
+            fg="red" if used > budget else "black")
+
+    # Changes the memory the data set in memory may use before tables are spilled to disk
+    def set_memory_budget():
+        budget = simpledialog.askinteger("Memory budget", "Memory the data set may use (MB)",
+                                         initialvalue=int(dataset_session.budget / 2 ** 20), minvalue=1)
+        if budget is not None:
+            dataset_session.set_budget(budget)
 
     def on_closing():
         if messagebox.askokcancel("Quit", "Do you want to quit? \n"
                                           "Any data not saved \n"
                                           "will be lost."):
+            scheduler.shutdown()
+            dataset_session.close()
             window.destroy()
 
     window = tk.Tk()
@@ -379,31 +888,53 @@ def data_viewer():
     save_buttons = tk.Frame(fr_buttons, relief=tk.RAISED, bd=2)
     clean_buttons = tk.Frame(fr_buttons, relief=tk.RAISED, bd=2)
     display_buttons = tk.Frame(fr_buttons, relief=tk.RAISED, bd=2)
-
-    my_tree = ttk.Treeview(tree_frame, selectmode='browse')
-    scroll_vertical = ttk.Scrollbar(tree_frame, orient='vertical', command=my_tree.yview)
-    my_tree.configure(yscroll=scroll_vertical.set)
-    scroll_vertical.pack(side=tk.LEFT, fill=tk.Y)
-
-    scroll_horizontal = ttk.Scrollbar(tree_frame, orient='horizontal', command=my_tree.xview)
-    my_tree.configure(xscroll=scroll_horizontal.set)
-    scroll_horizontal.pack(side=tk.BOTTOM, fill=tk.X)
+    status_buttons = tk.Frame(fr_buttons, relief=tk.RAISED, bd=2)
+    performance_buttons = tk.Frame(fr_buttons, relief=tk.RAISED, bd=2)
+
+    data_table = DataTable(tree_frame)
+    # collections read a part at a time by browse_database
+    lazy_collections = {}
+    # versions of the data set in memory and in the database, which go up whenever they change
+    versions = {'memory': 0, 'database': 0}
+    # the tables of the data set in memory, spilled to disk while they are over the memory budget
+    dataset_session = DatasetSession(on_change=show_memory)
+    # violation counts and graph figures of the current versions, and the graph window showing them
+    graph_cache = GraphCache()
+    graph_window = {}
+    # establishments of each violation code and category of the current versions, made when first counted
+    violation_counts = {}
+    # indexes of the data set in memory, and the rows of it the filters keep where None is every row
+    dataset_index = {}
+    view_filter = {'settings': {}, 'inspections': None, 'violations': None, 'version': 0}
+    # the data set table shown in the tree view, so it can follow the filters
+    table_view = {}
 
     # buttons relating to loading data
     load_labels = tk.Label(load_buttons, text="Loading the dataset")
     btn_open = tk.Button(load_buttons, text="Load dataset from csv files", command=prep_initial_dataset)
-    # btn_open = tk.Button(load_buttons, text="Load initial dataset", command=pre_initial_dataset_threads)
+    btn_append = tk.Button(load_buttons, text="Add new csv exports", command=append_dataset)
+    btn_stream = tk.Button(load_buttons, text="Stream csv files to database", command=stream_initial_dataset)
     btn_load = tk.Button(load_buttons, text="Load dataset from database", command=load_dataset_from_database)
+    btn_browse = tk.Button(load_buttons, text="Browse database", command=browse_database)
     load_labels.pack(anchor=tk.W, fill=tk.BOTH)
     btn_open.pack(anchor=tk.W, fill=tk.BOTH)
+    btn_append.pack(anchor=tk.W, fill=tk.BOTH)
+    btn_stream.pack(anchor=tk.W, fill=tk.BOTH)
     btn_load.pack(anchor=tk.W, fill=tk.BOTH)
+    btn_browse.pack(anchor=tk.W, fill=tk.BOTH)
 
     # button relating to saving data
     save_labels = tk.Label(save_buttons, text="Saving the dataset")
     btn_save = tk.Button(save_buttons, text="save dataset to database", command=save_dataset)
-    # btn_save = tk.Button(save_buttons, text="save dataset to database", command=save_dataset_threads)
+    btn_update = tk.Button(save_buttons, text="save changes to database", command=update_dataset)
+    # the collections are saved as arrow blocks, which are quicker to save and load but cannot be computed on
+    # in the database
+    save_binary = tk.BooleanVar(value=False)
+    chk_save_binary = tk.Checkbutton(save_buttons, text="Save as binary blocks", variable=save_binary)
     save_labels.pack(anchor=tk.W, fill=tk.BOTH)
     btn_save.pack(anchor=tk.W, fill=tk.BOTH)
+    btn_update.pack(anchor=tk.W, fill=tk.BOTH)
+    chk_save_binary.pack(anchor=tk.W, fill=tk.BOTH)
 
     # button relating to cleaning data
     clean_labels = tk.Label(clean_buttons, text="Cleaning dataset")
@@ -416,23 +947,64 @@ def data_viewer():
     btn_display_dataset = tk.Button(display_buttons, text="Display dataset", command=display_dataset)
     btn_display_avg = tk.Button(display_buttons, text="Display dataset Averages", command=display_avg)
     btn_display_graph = tk.Button(display_buttons, text="Display graph Data", command=display_data_graph)
+    btn_zip_correlation = tk.Button(display_buttons, text="Zip code correlation", command=display_zip_correlation)
+    btn_filter = tk.Button(display_buttons, text="Filter dataset", command=display_filters)
     btn_clear_tree = tk.Button(display_buttons, text="Clear window", command=clear_tree)
+    # averages and graphs grouped by the database rather than from the data set in memory
+    in_database = tk.BooleanVar(value=False)
+    chk_in_database = tk.Checkbutton(display_buttons, text="Compute in the database", variable=in_database)
+    # the bar graph shows categories of violation codes rather than each code
+    group_violations = tk.BooleanVar(value=False)
+    chk_group_violations = tk.Checkbutton(display_buttons, text="Group violation codes", variable=group_violations)
     display_labels.pack(anchor=tk.W, fill=tk.BOTH)
     btn_display_dataset.pack(anchor=tk.W, fill=tk.BOTH)
     btn_display_avg.pack(anchor=tk.W, fill=tk.BOTH)
     btn_display_graph.pack(anchor=tk.W, fill=tk.BOTH)
+    btn_zip_correlation.pack(anchor=tk.W, fill=tk.BOTH)
+    btn_filter.pack(anchor=tk.W, fill=tk.BOTH)
     btn_clear_tree.pack(anchor=tk.W, fill=tk.BOTH)
+    chk_in_database.pack(anchor=tk.W, fill=tk.BOTH)
+    chk_group_violations.pack(anchor=tk.W, fill=tk.BOTH)
+
+    # progress of the job running in the background
+    status_label = tk.Label(status_buttons, text="Ready", anchor=tk.W, width=30)
+    progress_bar = ttk.Progressbar(status_buttons, orient='horizontal', mode='determinate', maximum=100)
+    btn_cancel = tk.Button(status_buttons, text="Cancel", command=lambda: scheduler.cancel())
+    status_label.pack(anchor=tk.W, fill=tk.BOTH)
+    progress_bar.pack(anchor=tk.W, fill=tk.BOTH)
+    btn_cancel.pack(anchor=tk.W, fill=tk.BOTH)
+
+    # recording of what the data operations cost
+    performance_labels = tk.Label(performance_buttons, text="Performance")
+    btn_performance = tk.Button(performance_buttons, text="Display performance", command=display_performance)
+    memory_label = tk.Label(performance_buttons, anchor=tk.W)
+    btn_memory_budget = tk.Button(performance_buttons, text="Set memory budget", command=set_memory_budget)
+    performance_labels.pack(anchor=tk.W, fill=tk.BOTH)
+    btn_performance.pack(anchor=tk.W, fill=tk.BOTH)
+    memory_label.pack(anchor=tk.W, fill=tk.BOTH)
+    btn_memory_budget.pack(anchor=tk.W, fill=tk.BOTH)
+    show_memory(dataset_session)
+
+    # buttons disabled while a job is changing the data set or writing to the database
+    dataset_buttons = [btn_open, btn_append, btn_stream, btn_load, btn_save, btn_update, btn_clean_dataset,
+                       btn_display_dataset, btn_display_avg, btn_display_graph, btn_zip_correlation]
+    database_buttons = [btn_open, btn_append, btn_stream, btn_load, btn_save, btn_update, btn_clean_dataset]
+    scheduler = JobScheduler(window, on_progress=show_progress)
 
     fr_buttons.grid(row=0, column=0, sticky="ns")
     load_buttons.grid(row=1, column=0, sticky="nsew", padx=5, pady=2)
     save_buttons.grid(row=2, column=0, sticky="nsew", padx=5, pady=2)
     clean_buttons.grid(row=3, column=0, sticky="nsew", padx=5, pady=2)
     display_buttons.grid(row=4, column=0, sticky="nsew", padx=5, pady=2)
+    status_buttons.grid(row=5, column=0, sticky="nsew", padx=5, pady=2)
+    performance_buttons.grid(row=6, column=0, sticky="nsew", padx=5, pady=2)
 
     tree_frame.grid(row=0, column=1, sticky="nsew")
-    my_tree.pack(expand=tk.YES, fill=tk.BOTH)
     window.protocol("WM_DELETE_WINDOW", on_closing)
+    if on_ready is not None:
+        window.after_idle(on_ready, window)
     window.mainloop()
 
 
-data_viewer()
+if __name__ == '__main__':
+    data_viewer()
@@ -0,0 +1,228 @@
+import os
+import shutil
+import tempfile
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+from DataController import DataController, INSPECTION_DUPLICATE_COLUMNS
+from Instrumentation import instrumented
+
+DEFAULT_CHUNK_SIZE = 100000
+DEFAULT_MAX_HASHES = 5000000
+# hashes are held in this many generations, the oldest is forgotten once the set is over its size
+HASH_GENERATIONS = 4
+DEFAULT_BUFFER_KEYS = 1000000
+
+
+def sorted_lookup(keys, values):
+    """" returns the position of each value in the sorted keys and a mask of the values found."""
+    positions = np.searchsorted(keys, values)
+    found = positions < len(keys)
+    found[found] = keys[positions[found]] == values[found]
+    return positions, found
+
+
+class BoundedHashSet(object):
+    """" a set of row hashes that forgets the oldest hashes once it holds more than max_size.
+
+    The hashes are kept in sorted arrays, so a chunk is looked up and added with array operations.
+    Each chunk adds a sorted run, and runs are merged while the one before is no larger, so there are
+    only a few runs to search. The runs make up generations of max_size / HASH_GENERATIONS hashes,
+    and the oldest generation is forgotten as a whole.
+    """
+
+    def __init__(self, max_size=DEFAULT_MAX_HASHES):
+        self.max_size = max_size
+        self.generation_size = max(1, max_size // HASH_GENERATIONS)
+        self._generations = deque([[]])
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def add_new(self, hashes):
+        """" returns a mask of the hashes that have not been seen and adds them to the set."""
+        # the first of the hashes repeated in the chunk, sorted
+        values, first = np.unique(np.asarray(hashes, dtype='uint64'), return_index=True)
+        seen = np.zeros(len(values), dtype=bool)
+        for runs in self._generations:
+            for run in runs:
+                seen |= sorted_lookup(run, values)[1]
+        mask = np.zeros(len(hashes), dtype=bool)
+        mask[first[~seen]] = True
+        self.add_run(values[~seen])
+        return mask
+
+    def add_run(self, values):
+        runs = self._generations[-1]
+        if sum(len(run) for run in runs) >= self.generation_size:
+            runs = []
+            self._generations.append(runs)
+        runs.append(values)
+        while len(runs) > 1 and len(runs[-2]) <= len(runs[-1]):
+            # the stable sort finds the two sorted runs and merges them
+            runs[-2:] = [np.sort(np.concatenate(runs[-2:]), kind='stable')]
+        self._size += len(values)
+        # forget the oldest hashes so memory stays bounded
+        while len(self._generations) > 1 and self._size > self.max_size:
+            self._size -= sum(len(run) for run in self._generations.popleft())
+
+
+class SpilledKeys(object):
+    """" maps keys to integers, with the keys hashed to 64 bit integers and held in sorted runs on disk.
+
+    Keys are buffered until buffer_size have been added, then written as a sorted run to a file in the
+    directory, which is read memory mapped to look keys up. The memory used follows the buffer rather
+    than the number of keys. A key added more than once has the value it was added with first.
+    """
+
+    def __init__(self, directory, name, buffer_size=DEFAULT_BUFFER_KEYS):
+        self.directory = directory
+        self.name = name
+        self.buffer_size = buffer_size
+        self._keys = []
+        self._values = []
+        self._buffered = 0
+        self._runs = []
+
+    @staticmethod
+    def hash_keys(keys):
+        return pd.util.hash_array(np.asarray(keys, dtype=object))
+
+    def add(self, keys, values=None):
+        """" adds the keys with their values, or with zero if no values are given."""
+        self._keys.append(SpilledKeys.hash_keys(keys))
+        self._values.append(np.zeros(len(keys), dtype='int64') if values is None
+                            else np.asarray(values, dtype='int64'))
+        self._buffered += len(keys)
+        if self._buffered >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        """" writes the buffered keys as a sorted run."""
+        if not self._buffered:
+            return
+        keys = np.concatenate(self._keys)
+        values = np.concatenate(self._values)
+        order = np.argsort(keys, kind='stable')
+        keys, values = keys[order], values[order]
+        # the stable sort keeps the rows of a key in the order they were added, the first is kept
+        first = np.insert(keys[1:] != keys[:-1], 0, True)
+        run = []
+        for part, array in [('keys', keys[first]), ('values', values[first])]:
+            path = os.path.join(self.directory, f"{self.name}-{len(self._runs)}-{part}.npy")
+            np.save(path, array)
+            run.append(np.load(path, mmap_mode='r'))
+        self._runs.append(tuple(run))
+        self._keys, self._values, self._buffered = [], [], 0
+
+    def lookup(self, keys):
+        """" returns the value of each key and a mask of the keys found."""
+        self.flush()
+        hashes = SpilledKeys.hash_keys(keys)
+        values = np.zeros(len(hashes), dtype='int64')
+        found = np.zeros(len(hashes), dtype=bool)
+        # the oldest run holding a key has the value it was added with first
+        for run_keys, run_values in self._runs:
+            missing = np.flatnonzero(~found)
+            positions, hit = sorted_lookup(run_keys, hashes[missing])
+            values[missing[hit]] = run_values[positions[hit]]
+            found[missing[hit]] = True
+        return values, found
+
+    def contains(self, keys):
+        """" returns a mask of the keys that have been added."""
+        return self.lookup(keys)[1]
+
+
+class DataStream(object):
+
+    @staticmethod
+    def read_chunks(filename, chunk_size=DEFAULT_CHUNK_SIZE, max_hashes=DEFAULT_MAX_HASHES):
+        """" yields the csv file a chunk at a time with incomplete rows and duplicates of earlier rows dropped."""
+        try:
+            with open(filename, encoding="utf-8-sig", newline='') as inFile:
+                role, options, integers = DataController.get_csv_schema(pd.read_csv(inFile, nrows=0).columns)
+                inFile.seek(0)
+                seen = BoundedHashSet(max_hashes)
+                for chunk in pd.read_csv(inFile, chunksize=chunk_size, **options):
+                    chunk = DataController.prep_frame(chunk)
+                    chunk = chunk[seen.add_new(pd.util.hash_pandas_object(chunk, index=False).to_numpy())]
+                    yield chunk.astype(integers)
+        except ValueError as ve:
+            raise ValueError(f"File not in correct format. {ve}")
+
+    @staticmethod
+    def clean_inspections_chunk(chunk, inactive_fid, inactive_sn, zip_by_serial):
+        """" cleans a chunk of inspections, recording its inactive keys and zip codes for the other files.
+
+        As in clean_dataset, a serial number takes the zip code of its first inspection and is inactive
+        if any of its inspections is.
+        """
+        chunk = chunk.drop(columns=INSPECTION_DUPLICATE_COLUMNS)
+        chunk = DataController.create_new_col_for_seat_numbers(chunk)
+        inactive_list = DataController.get_inactive_list(chunk)
+        inactive_fid.add(inactive_list['FACILITY ID'])
+        inactive_sn.add(inactive_list['SERIAL NUMBER'])
+        zip_by_serial.add(chunk['SERIAL NUMBER'], chunk['Zip Codes'])
+        return DataController.remove_inactive(chunk)
+
+    @staticmethod
+    def clean_violations_chunk(chunk, inactive_sn, zip_by_serial):
+        """" cleans a chunk of violations by removing inactive serial numbers and adding the zip codes."""
+        chunk = chunk[~inactive_sn.contains(chunk['SERIAL NUMBER'])]
+        zips, found = zip_by_serial.lookup(chunk['SERIAL NUMBER'])
+        # only keep violations with a matching inspection, as the merge in clean_dataset does
+        return chunk[found].assign(**{'Zip Codes': zips[found]})
+
+    @staticmethod
+    def clean_inventory_chunk(chunk, inactive_fid):
+        """" cleans a chunk of inventory by removing inactive facilities and adding the seat numbers."""
+        chunk = chunk[~inactive_fid.contains(chunk['FACILITY ID'])]
+        return DataController.create_new_col_for_seat_numbers(chunk)
+
+    @staticmethod
+    @instrumented
+    def stream_dataset(filenames, chunk_size=DEFAULT_CHUNK_SIZE, max_hashes=DEFAULT_MAX_HASHES, sink=None,
+                       progress=None):
+        """" prepares and cleans the three csv files a chunk at a time and writes each chunk to the sink.
+
+        The sink is called with the chunk, the collection name and whether it is the first chunk for
+        that collection, by default the chunks are written to the database. progress is called with
+        the fraction of the files done and a message after every chunk.
+
+        The inactive keys and the zip code of each serial number are spilled to a temporary directory,
+        so the memory used follows the chunk size and the hash set rather than the size of the files.
+        """
+        if sink is None:
+            sink = DataController.append_database_collection
+        roles = DataController.get_file_roles(filenames)
+        # inspections are streamed first so the other files can be filtered against them
+        directory = tempfile.mkdtemp(prefix="stream")
+        inactive_fid = SpilledKeys(directory, 'inactive_fid')
+        inactive_sn = SpilledKeys(directory, 'inactive_sn')
+        zip_by_serial = SpilledKeys(directory, 'zip_by_serial')
+        rows = {}
+        try:
+            for position, role in enumerate(['inspections', 'violations', 'inventory']):
+                rows[role] = 0
+                first = True
+                for chunk in DataStream.read_chunks(roles[role], chunk_size, max_hashes):
+                    if role == 'inspections':
+                        chunk = DataStream.clean_inspections_chunk(chunk, inactive_fid, inactive_sn, zip_by_serial)
+                    elif role == 'violations':
+                        chunk = DataStream.clean_violations_chunk(chunk, inactive_sn, zip_by_serial)
+                    else:
+                        chunk = DataStream.clean_inventory_chunk(chunk, inactive_fid)
+                    sink(chunk, role, first)
+                    first = False
+                    rows[role] += len(chunk)
+                    if progress is not None:
+                        progress(position / 3, f"{rows[role]} rows of {role} saved")
+        except KeyError as ke:
+            raise ValueError(f"File not in correct format. missing column {ke}")
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+        return rows
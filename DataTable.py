@@ -0,0 +1,173 @@
+import tkinter as tk
+from tkinter import ttk
+
+import numpy as np
+
+from LazyImport import LazyImport
+
+KeyCodes = LazyImport('KeyCodes', 'KeyCodes')
+
+DEFAULT_VISIBLE_ROWS = 40
+DEFAULT_BUFFER_ROWS = 20
+DEFAULT_ROW_HEIGHT = 20
+
+
+class DataTable(object):
+    """" a tree view that keeps the dataframe as its backing store and only holds the rows in view.
+
+    Scrolling, sorting and filtering work on row positions into the dataframe, so opening a table
+    costs the same however many rows it has. Packed ID columns are shown and filtered as their text,
+    and sorted by their codes, which are in the order of the IDs.
+    """
+
+    def __init__(self, master, visible_rows=DEFAULT_VISIBLE_ROWS, buffer_rows=DEFAULT_BUFFER_ROWS):
+        self.visible_rows = visible_rows
+        self.buffer_rows = buffer_rows
+        self.data = None
+        self.rows = np.arange(0)  # the rows of the dataframe the table shows before its own filter
+        self.positions = np.arange(0)
+        self.start = None
+        self.sort_column = None
+        self.sort_ascending = True
+
+        # filter bar above the table
+        tool_bar = tk.Frame(master)
+        self.filter_column = ttk.Combobox(tool_bar, state="readonly", width=30)
+        self.filter_text = tk.Entry(tool_bar, width=30)
+        self.filter_text.bind("<Return>", lambda event: self.apply_filter())
+        btn_filter = tk.Button(tool_bar, text="Filter", command=self.apply_filter)
+        btn_clear_filter = tk.Button(tool_bar, text="Clear filter", command=self.clear_filter)
+        self.row_count = tk.Label(tool_bar, text="")
+        self.filter_column.pack(side=tk.LEFT)
+        self.filter_text.pack(side=tk.LEFT)
+        btn_filter.pack(side=tk.LEFT)
+        btn_clear_filter.pack(side=tk.LEFT)
+        self.row_count.pack(side=tk.RIGHT)
+        tool_bar.pack(side=tk.TOP, fill=tk.X)
+
+        self.tree = ttk.Treeview(master, selectmode='browse', show="headings", height=visible_rows)
+        # the vertical scroll bar moves through the dataframe rather than the tree view
+        self.scroll_vertical = ttk.Scrollbar(master, orient='vertical', command=self.on_scroll)
+        self.scroll_vertical.pack(side=tk.LEFT, fill=tk.Y)
+        self.scroll_horizontal = ttk.Scrollbar(master, orient='horizontal', command=self.tree.xview)
+        self.tree.configure(xscroll=self.scroll_horizontal.set)
+        self.scroll_horizontal.pack(side=tk.BOTTOM, fill=tk.X)
+        self.tree.pack(expand=tk.YES, fill=tk.BOTH)
+
+        self.tree.bind("<MouseWheel>", self.on_mouse_wheel)
+        self.tree.bind("<Button-4>", lambda event: self.on_scroll('scroll', -3, 'units'))
+        self.tree.bind("<Button-5>", lambda event: self.on_scroll('scroll', 3, 'units'))
+        self.tree.bind("<Configure>", self.on_resize)
+
+    def set_data(self, data, rows=None):
+        """" show the dataframe in the table from the first row, only the row positions in rows when given."""
+        self.data = data
+        self.rows = np.arange(len(data)) if rows is None else rows
+        self.positions = self.rows
+        self.sort_column = None
+        self.sort_ascending = True
+        columns = list(data.columns)
+        self.tree["column"] = columns
+        for column in columns:
+            self.tree.heading(column, text=column, command=lambda name=column: self.sort_by(name))
+        self.filter_column["values"] = columns
+        if columns:
+            self.filter_column.current(0)
+        self.start = None
+        self.show_from(0)
+
+    def clear(self):
+        """" remove the data from the table."""
+        self.data = None
+        self.rows = np.arange(0)
+        self.positions = np.arange(0)
+        self.start = None
+        self.tree.delete(*self.tree.get_children())
+        self.tree["column"] = []
+        self.filter_column["values"] = []
+        self.filter_column.set("")
+        self.row_count.config(text="")
+        self.scroll_vertical.set(0, 1)
+
+    def show_from(self, start, force=False):
+        """" put the rows from start, plus the buffer, into the tree view."""
+        if self.data is None:
+            return
+        start = max(0, min(start, len(self.positions) - self.visible_rows))
+        if start == self.start and not force:
+            return
+        self.start = start
+        self.tree.delete(*self.tree.get_children())
+        window = self.positions[start:start + self.visible_rows + self.buffer_rows]
+        for row in KeyCodes.unpack_frame(self.data.iloc[window]).to_numpy().tolist():
+            self.tree.insert("", "end", values=row)
+        total = len(self.positions)
+        if total:
+            self.scroll_vertical.set(start / total, min(1.0, (start + self.visible_rows) / total))
+        else:
+            self.scroll_vertical.set(0, 1)
+        self.row_count.config(text="rows {}-{} of {}".format(min(start + 1, total),
+                                                              min(start + self.visible_rows, total), total))
+
+    def on_scroll(self, action, amount, unit=None):
+        """" move the window of rows for the vertical scroll bar."""
+        if self.start is None:
+            return
+        if action == 'moveto':
+            self.show_from(int(float(amount) * len(self.positions)))
+        elif unit == 'pages':
+            self.show_from(self.start + int(amount) * self.visible_rows)
+        else:
+            self.show_from(self.start + int(amount))
+
+    def on_mouse_wheel(self, event):
+        """" move the window of rows for the mouse wheel."""
+        if self.start is not None:
+            self.show_from(self.start - int(np.sign(event.delta)) * 3)
+        return "break"
+
+    def on_resize(self, event):
+        """" fit the number of visible rows to the height of the tree view."""
+        style_height = ttk.Style().lookup("Treeview", "rowheight")
+        row_height = int(style_height) if style_height else DEFAULT_ROW_HEIGHT
+        visible_rows = max(1, event.height // row_height - 1)
+        if visible_rows != self.visible_rows:
+            self.visible_rows = visible_rows
+            if self.start is not None:
+                self.show_from(self.start, force=True)
+
+    def sort_by(self, column):
+        """" sort the rows by the column on the dataframe, clicking the same column again reverses the order."""
+        self.sort_ascending = not (self.sort_column == column and self.sort_ascending)
+        self.sort_column = column
+        self.positions = self.sorted_positions(self.positions)
+        self.show_from(0, force=True)
+
+    def sorted_positions(self, positions):
+        """" returns the row positions ordered by the sort column."""
+        if self.sort_column is None:
+            return positions
+        values = self.data[self.sort_column].iloc[positions].reset_index(drop=True)
+        order = values.sort_values(ascending=self.sort_ascending, kind='mergesort', na_position='last').index
+        return positions[order.to_numpy()]
+
+    def apply_filter(self):
+        """" keep the rows where the filter column contains the filter text."""
+        if self.data is None:
+            return
+        column = self.filter_column.get()
+        text = self.filter_text.get()
+        if not column or not text:
+            positions = self.rows
+        else:
+            # packed IDs are matched against the text they are shown as
+            values = KeyCodes.unpack_frame(self.data[[column]].iloc[self.rows])[column]
+            matches = values.astype(str).str.contains(text, case=False, regex=False)
+            positions = self.rows[matches.to_numpy()]
+        self.positions = self.sorted_positions(positions)
+        self.show_from(0, force=True)
+
+    def clear_filter(self):
+        """" show every row again."""
+        self.filter_text.delete(0, tk.END)
+        self.apply_filter()
@@ -0,0 +1,440 @@
+import uuid
+
+import pandas as pd
+import pymongo
+from bson.binary import Binary
+from pymongo import DeleteOne, InsertOne, ReplaceOne
+from pymongo.errors import PyMongoError, ServerSelectionTimeoutError
+
+try:
+    import pyarrow as pa
+except ImportError:  # binary encoding of columns needs pyarrow
+    pa = None
+
+DATABASE_URI = "mongodb://localhost:27017/"
+DATABASE_NAME = "DataCollection"
+DEFAULT_BATCH_SIZE = 10000
+MAX_POOL_SIZE = 10
+
+# columns that identify a document in each collection, an inspection can have several
+# violations so violations are keyed by the violation code as well as the serial number
+COLLECTION_KEYS = {
+    'violations': ['SERIAL NUMBER', 'VIOLATION CODE'],
+    'inspections': ['SERIAL NUMBER'],
+    'inventory': ['FACILITY ID'],
+}
+ROW_HASH = "row hash"
+
+# indexes the aggregation pipelines match and group on, created whenever a collection is written
+AGGREGATION_INDEXES = {
+    'violations': [['VIOLATION CODE'], ['Zip Codes']],
+    'inspections': [['ACTIVITY DATE'], ['PE DESCRIPTION', 'ACTIVITY DATE'], ['Zip Codes', 'ACTIVITY DATE']],
+}
+
+# the client is shared so every call reuses the same connection pool
+_client = None
+
+
+class DatabaseController(object):
+
+    @staticmethod
+    def get_client():
+        """" returns the shared database client, opening its connection pool on first use."""
+        global _client
+        if _client is None:
+            _client = pymongo.MongoClient(DATABASE_URI, serverSelectionTimeoutMS=1000, maxPoolSize=MAX_POOL_SIZE)
+        return _client
+
+    @staticmethod
+    def get_collection(choice):
+        """" returns the database collection by the file name."""
+        return DatabaseController.get_client()[DATABASE_NAME][choice]
+
+    @staticmethod
+    def iter_batches(data, batch_size=DEFAULT_BATCH_SIZE):
+        """" yields the dataframe in slices of batch_size rows."""
+        for start in range(0, len(data), batch_size):
+            yield data.iloc[start:start + batch_size]
+
+    @staticmethod
+    def check_pyarrow():
+        """" raises RuntimeError if pyarrow, which encodes and decodes the binary documents, is not installed."""
+        if pa is None:
+            raise RuntimeError("binary encoding needs pyarrow installed")
+
+    @staticmethod
+    def encode_batch(batch, block):
+        """" returns a document holding the batch of rows as a compact arrow binary."""
+        sink = pa.BufferOutputStream()
+        table = pa.Table.from_pandas(batch, preserve_index=False)
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return {'block': block, 'rows': len(batch), 'arrow': Binary(sink.getvalue().to_pybytes())}
+
+    @staticmethod
+    def decode_batch(document, columns=None):
+        """" returns the rows held in an arrow binary document as a dataframe."""
+        DatabaseController.check_pyarrow()
+        table = pa.ipc.open_stream(document['arrow']).read_all()
+        if columns is not None:
+            table = table.select([column for column in columns if column in table.column_names])
+        return table.to_pandas()
+
+    @staticmethod
+    def write_batches(data, collection, batch_size=DEFAULT_BATCH_SIZE, binary=False, progress=None):
+        """" inserts the dataframe into the collection in unordered batches.
+
+        progress is called with the fraction written before each batch, and stops the save by raising.
+        """
+        for block, batch in enumerate(DatabaseController.iter_batches(data, batch_size)):
+            if progress is not None:
+                progress(block * batch_size / len(data), f"writing {collection.name}")
+            if binary:
+                collection.insert_one(DatabaseController.encode_batch(batch, block))
+            else:
+                collection.insert_many(batch.to_dict('records'), ordered=False)
+
+    @staticmethod
+    def replace_collection(data, choice, batch_size=DEFAULT_BATCH_SIZE, binary=False, progress=None):
+        """" writes the dataframe to a staging collection then renames it over the collection.
+
+        The rename only happens once every batch has been written, so a failed save leaves
+        the previous collection in place. Each save has its own staging collection, so two saves
+        of the same collection do not write into each other's, and it is dropped if the save fails.
+        """
+        if binary:
+            DatabaseController.check_pyarrow()
+        staging = DatabaseController.get_collection(f"{choice}_staging_{uuid.uuid4().hex}")
+        try:
+            DatabaseController.write_batches(data.reset_index(), staging, batch_size, binary, progress)
+            # built once the documents are in, which is quicker than keeping them up to date while inserting
+            if binary:
+                # the blocks are read back in order
+                staging.create_index([('block', pymongo.ASCENDING)], name="block")
+            else:
+                DatabaseController.create_aggregation_indexes(staging, choice)
+            if len(data):
+                staging.rename(choice, dropTarget=True)
+            else:
+                # an empty collection is never created so there is nothing to rename
+                DatabaseController.get_collection(choice).drop()
+        except ServerSelectionTimeoutError as exc:
+            raise RuntimeError('Failed to open database') from exc
+        except PyMongoError as exc:
+            raise RuntimeError(f'Failed to save {choice}') from exc
+        finally:
+            # once renamed the staging collection is gone, so this only drops one left by a failed save
+            DatabaseController.drop_quietly(staging)
+
+    @staticmethod
+    def drop_quietly(collection):
+        """" drops the collection, ignoring a database that cannot be reached."""
+        try:
+            collection.drop()
+        except PyMongoError:
+            pass
+
+    @staticmethod
+    def append_collection(data, choice, drop=False, batch_size=DEFAULT_BATCH_SIZE):
+        """" appends the rows to the collection in batches, dropping the existing collection first if drop is set."""
+        try:
+            collection = DatabaseController.get_collection(choice)
+            if drop:
+                collection.drop()
+            DatabaseController.write_batches(data, collection, batch_size)
+            # a no-op once the indexes exist, so only the first chunk of a stream builds them
+            DatabaseController.create_aggregation_indexes(collection, choice)
+        except ServerSelectionTimeoutError as exc:
+            raise RuntimeError('Failed to open database') from exc
+        except PyMongoError as exc:
+            raise RuntimeError(f'Failed to save {choice}') from exc
+
+    @staticmethod
+    def read_collection(choice, columns=None, batch_size=DEFAULT_BATCH_SIZE):
+        """" returns the collection as a dataframe, only fetching the given columns if any are given."""
+        try:
+            collection = DatabaseController.get_collection(choice)
+            if collection.find_one({'arrow': {'$exists': True}}, {'_id': 1}) is not None:
+                cursor = collection.find({}, {'_id': 0, 'arrow': 1}, batch_size=1).sort('block')
+                frames = [DatabaseController.decode_batch(document, columns) for document in cursor]
+            else:
+                if columns is None:
+                    projection = {'_id': 0, 'index': 0, ROW_HASH: 0}
+                else:
+                    projection = dict({column: 1 for column in columns}, _id=0)
+                cursor = collection.find({}, projection, batch_size=batch_size)
+                frames = []
+                batch = []
+                # build the dataframe a batch at a time rather than from one list of every document
+                for document in cursor:
+                    batch.append(document)
+                    if len(batch) == batch_size:
+                        frames.append(pd.DataFrame(batch))
+                        batch = []
+                if batch or not frames:
+                    frames.append(pd.DataFrame(batch, columns=columns))
+            data = pd.concat(frames, ignore_index=True)
+            return data.drop(columns=['index'], errors='ignore')
+        except ServerSelectionTimeoutError as exc:
+            raise RuntimeError('Failed to open database') from exc
+        except PyMongoError as exc:
+            raise RuntimeError(f'Failed to read {choice}') from exc
+
+    @staticmethod
+    def read_query(choice, columns, start=None, end=None, batch_size=DEFAULT_BATCH_SIZE):
+        """" returns the columns of the documents with an ACTIVITY DATE in the range, indexed by document id.
+
+        Only those fields are fetched. Collections saved as binary are decoded and filtered here,
+        indexed by the position of the row.
+        """
+        try:
+            collection = DatabaseController.get_collection(choice)
+            dated = start is not None or end is not None
+            fields = list(columns) + (['ACTIVITY DATE'] if dated and 'ACTIVITY DATE' not in columns else [])
+            if collection.find_one({'arrow': {'$exists': True}}, {'_id': 1}) is not None:
+                cursor = collection.find({}, {'_id': 0, 'arrow': 1}, batch_size=1).sort('block')
+                data = pd.concat([DatabaseController.decode_batch(document, fields) for document in cursor],
+                                 ignore_index=True)
+                if dated:
+                    dates = pd.to_datetime(data['ACTIVITY DATE'])
+                    data = data[dates.between(pd.Timestamp(start or pd.Timestamp.min),
+                                              pd.Timestamp(end or pd.Timestamp.max))]
+                return data.reindex(columns=list(columns))
+            query = {}
+            if dated:
+                query = {'ACTIVITY DATE': {}}
+                if start is not None:
+                    query['ACTIVITY DATE']['$gte'] = pd.Timestamp(start).to_pydatetime()
+                if end is not None:
+                    query['ACTIVITY DATE']['$lte'] = pd.Timestamp(end).to_pydatetime()
+            cursor = collection.find(query, {column: 1 for column in columns}, batch_size=batch_size)
+            frames = []
+            batch = []
+            for document in cursor:
+                batch.append(document)
+                if len(batch) == batch_size:
+                    frames.append(pd.DataFrame(batch))
+                    batch = []
+            frames.append(pd.DataFrame(batch, columns=['_id'] + list(columns)))
+            data = pd.concat(frames, ignore_index=True)
+            data.index = data.pop('_id').astype(str).rename(None)
+            return data.reindex(columns=list(columns))
+        except ServerSelectionTimeoutError as exc:
+            raise RuntimeError('Failed to open database') from exc
+        except PyMongoError as exc:
+            raise RuntimeError(f'Failed to read {choice}') from exc
+
+    @staticmethod
+    def get_columns(choice):
+        """" returns the column names of the collection, read from one of its documents."""
+        try:
+            collection = DatabaseController.get_collection(choice)
+            document = collection.find_one()
+            if document is None:
+                return []
+            if 'arrow' in document:
+                DatabaseController.check_pyarrow()
+                names = pa.ipc.open_stream(document['arrow']).schema.names
+            else:
+                names = list(document)
+            return [column for column in names if column not in ('_id', 'index', ROW_HASH)]
+        except ServerSelectionTimeoutError as exc:
+            raise RuntimeError('Failed to open database') from exc
+        except PyMongoError as exc:
+            raise RuntimeError(f'Failed to read {choice}') from exc
+
+    @staticmethod
+    def get_row_hashes(data):
+        """" returns a hash of every row of the dataframe that fits in a database integer."""
+        return pd.util.hash_pandas_object(data, index=False).to_numpy().view('int64')
+
+    @staticmethod
+    def create_key_index(collection, keys):
+        """" creates the index on the key columns used to find documents to update or delete."""
+        collection.create_index([(key, pymongo.ASCENDING) for key in keys], name=f"{' '.join(keys)} key")
+
+    @staticmethod
+    def update_collection(data, choice, batch_size=DEFAULT_BATCH_SIZE, progress=None, binary=False):
+        """" saves only the rows that have been inserted, changed or removed since the collection was last saved.
+
+        Rows are matched on the key columns of the collection and compared by a hash of the row. The
+        collection is replaced in full when the keys are missing or not unique, or it was saved as binary.
+        A binary save always replaces it, as binary blocks hold many rows that cannot be changed one by one.
+        progress is called before each batch of writes, and stops the save by raising.
+        """
+        if binary:
+            return DatabaseController.replace_collection(data, choice, batch_size, binary=True, progress=progress)
+        keys = COLLECTION_KEYS.get(choice)
+        if data.index.name is not None:
+            data = data.reset_index()
+        if keys is None or not set(keys).issubset(data.columns) or data.duplicated(subset=keys).any():
+            return DatabaseController.replace_collection(data, choice, batch_size, progress=progress)
+        try:
+            collection = DatabaseController.get_collection(choice)
+            if collection.find_one({'arrow': {'$exists': True}}, {'_id': 1}) is not None:
+                return DatabaseController.replace_collection(data, choice, batch_size, progress=progress)
+            DatabaseController.create_key_index(collection, keys)
+
+            current = data[keys].assign(**{ROW_HASH: DatabaseController.get_row_hashes(data)})
+            current['position'] = range(len(data))
+            saved = DatabaseController.read_collection(choice, keys + [ROW_HASH], batch_size)
+            if ROW_HASH not in saved.columns:
+                saved[ROW_HASH] = None  # documents from a full save have no hash so are all updated
+            changes = current.merge(saved, on=keys, how='outer', suffixes=('', ' saved'), indicator=True)
+
+            inserted = changes.loc[changes['_merge'] == 'left_only', 'position']
+            updated = changes.loc[(changes['_merge'] == 'both') &
+                                  (changes[ROW_HASH] != changes[f"{ROW_HASH} saved"]), 'position']
+            deleted = changes.loc[changes['_merge'] == 'right_only', keys]
+
+            operations = []
+            for document in DatabaseController.iter_documents(data, inserted, current[ROW_HASH]):
+                operations.append(InsertOne(document))
+            for document in DatabaseController.iter_documents(data, updated, current[ROW_HASH]):
+                operations.append(ReplaceOne({key: document[key] for key in keys}, document))
+            for document in deleted.to_dict('records'):
+                operations.append(DeleteOne(document))
+            for start in range(0, len(operations), batch_size):
+                if progress is not None:
+                    progress(start / len(operations), f"writing {choice}")
+                collection.bulk_write(operations[start:start + batch_size], ordered=False)
+            DatabaseController.create_aggregation_indexes(collection, choice)
+            return {'inserted': len(inserted), 'updated': len(updated), 'deleted': len(deleted)}
+        except ServerSelectionTimeoutError as exc:
+            raise RuntimeError('Failed to open database') from exc
+        except PyMongoError as exc:
+            raise RuntimeError(f'Failed to save {choice}') from exc
+
+    @staticmethod
+    def apply_delta(added, choice, column=None, removed=(), batch_size=DEFAULT_BATCH_SIZE):
+        """" deletes the documents whose column holds one of the removed values then inserts the added rows.
+
+        Only the documents that change are written, so the cost follows the size of the delta. Documents
+        with the keys of the added rows are deleted before they are inserted, so a delta that failed part
+        way through can be applied again without duplicating the rows it had already inserted.
+        Returns false without writing if the collection was saved as binary, which has to be replaced.
+        """
+        removed = list(removed)
+        keys = COLLECTION_KEYS.get(choice)
+        try:
+            collection = DatabaseController.get_collection(choice)
+            if collection.find_one({'arrow': {'$exists': True}}, {'_id': 1}) is not None:
+                return False
+            if removed:
+                collection.create_index([(column, pymongo.ASCENDING)], name=f"{column} delta")
+                for start in range(0, len(removed), batch_size):
+                    collection.delete_many({column: {'$in': removed[start:start + batch_size]}})
+            if len(added) and keys is not None and set(keys).issubset(added.columns):
+                DatabaseController.create_key_index(collection, keys)
+                DatabaseController.delete_keys(collection, added, keys, batch_size)
+            if len(added):
+                # hashed as update_collection does so the next save sees these rows as unchanged
+                row_hashes = pd.Series(DatabaseController.get_row_hashes(added))
+                documents = DatabaseController.iter_documents(added, pd.RangeIndex(len(added)), row_hashes)
+                batch = []
+                for document in documents:
+                    batch.append(document)
+                    if len(batch) == batch_size:
+                        collection.insert_many(batch, ordered=False)
+                        batch = []
+                if batch:
+                    collection.insert_many(batch, ordered=False)
+            DatabaseController.create_aggregation_indexes(collection, choice)
+            return True
+        except ServerSelectionTimeoutError as exc:
+            raise RuntimeError('Failed to open database') from exc
+        except PyMongoError as exc:
+            raise RuntimeError(f'Failed to save {choice}') from exc
+
+    @staticmethod
+    def delete_keys(collection, data, keys, batch_size=DEFAULT_BATCH_SIZE):
+        """" deletes the documents holding the keys of any row of the dataframe."""
+        rows = data[keys].astype(object).drop_duplicates().to_dict('records')
+        for start in range(0, len(rows), batch_size):
+            batch = rows[start:start + batch_size]
+            if len(keys) == 1:
+                collection.delete_many({keys[0]: {'$in': [row[keys[0]] for row in batch]}})
+            else:
+                collection.delete_many({'$or': batch})
+
+    @staticmethod
+    def create_aggregation_indexes(collection, choice):
+        """" creates the indexes used by the aggregation pipelines of the collection."""
+        for keys in AGGREGATION_INDEXES.get(choice, []):
+            collection.create_index([(key, pymongo.ASCENDING) for key in keys], name=f"{' '.join(keys)} aggregation")
+
+    @staticmethod
+    def aggregate(choice, pipeline):
+        """" runs the aggregation pipeline on the collection and returns the grouped rows as a dataframe."""
+        try:
+            collection = DatabaseController.get_collection(choice)
+            if collection.find_one({'arrow': {'$exists': True}}, {'_id': 1}) is not None:
+                raise RuntimeError(f"{choice} was saved as binary so cannot be aggregated in the database")
+            return pd.DataFrame(list(collection.aggregate(pipeline, allowDiskUse=True)))
+        except ServerSelectionTimeoutError as exc:
+            raise RuntimeError('Failed to open database') from exc
+        except PyMongoError as exc:
+            raise RuntimeError(f'Failed to aggregate {choice}') from exc
+
+    @staticmethod
+    def match_inspections(start=None, end=None, status=None):
+        """" returns the $match stage for scored inspections in the date range with the program status."""
+        match = {'SCORE': {'$ne': None}, 'ACTIVITY DATE': {'$ne': None}}
+        if start is not None:
+            match['ACTIVITY DATE']['$gte'] = pd.Timestamp(start).to_pydatetime()
+        if end is not None:
+            match['ACTIVITY DATE']['$lte'] = pd.Timestamp(end).to_pydatetime()
+        if status is not None:
+            match['PROGRAM STATUS'] = status
+        return {'$match': match}
+
+    @staticmethod
+    def score_counts(group_by, start=None, end=None, status=None):
+        """" returns the number of inspections of each score per group and year.
+
+        The counts are all that is needed for the mean, median and mode, and there are at most
+        a few dozen scores per group and year however many inspections there are.
+        """
+        pipeline = [
+            DatabaseController.match_inspections(start, end, status),
+            {'$group': {'_id': {'group': f"${group_by}", 'year': {'$year': '$ACTIVITY DATE'}, 'score': '$SCORE'},
+                        'count': {'$sum': 1}}},
+            {'$project': {'_id': 0, group_by: '$_id.group', 'year': '$_id.year', 'SCORE': '$_id.score',
+                          'count': 1}},
+        ]
+        counts = DatabaseController.aggregate('inspections', pipeline)
+        return counts if not counts.empty else pd.DataFrame(columns=[group_by, 'year', 'SCORE', 'count'])
+
+    @staticmethod
+    def score_buckets(boundaries, start=None, end=None, status=None):
+        """" returns the number of inspections with a score in each bucket, named by the lowest score in it."""
+        pipeline = [
+            DatabaseController.match_inspections(start, end, status),
+            {'$bucket': {'groupBy': '$SCORE', 'boundaries': list(boundaries), 'default': 'other',
+                         'output': {'count': {'$sum': 1}}}},
+            {'$project': {'_id': 0, 'score from': '$_id', 'count': 1}},
+        ]
+        buckets = DatabaseController.aggregate('inspections', pipeline)
+        return buckets if not buckets.empty else pd.DataFrame(columns=['score from', 'count'])
+
+    @staticmethod
+    def value_counts(choice, column, number=None):
+        """" returns the number of documents with each value of the column, the most common first."""
+        pipeline = [
+            {'$match': {column: {'$ne': None}}},
+            {'$group': {'_id': f"${column}", 'count': {'$sum': 1}}},
+            {'$sort': {'count': -1, '_id': 1}},
+        ]
+        if number is not None:
+            pipeline.append({'$limit': int(number)})
+        pipeline.append({'$project': {'_id': 0, column: '$_id', 'count': 1}})
+        counts = DatabaseController.aggregate(choice, pipeline)
+        return counts if not counts.empty else pd.DataFrame(columns=[column, 'count'])
+
+    @staticmethod
+    def iter_documents(data, positions, row_hashes):
+        """" yields the document, with its row hash, for each of the given row positions."""
+        positions = positions.astype('int64').tolist()
+        for position, document in zip(positions, data.iloc[positions].to_dict('records')):
+            document[ROW_HASH] = int(row_hashes.iat[position])
+            yield document
@@ -0,0 +1,143 @@
+import numpy as np
+import pandas as pd
+
+from Instrumentation import instrumented
+from KeyCodes import KeyCodes
+
+
+class InvertedIndex(object):
+    """" the row positions holding each value of a column, kept as slices of one sorted array."""
+
+    def __init__(self, column):
+        if hasattr(column, 'cat'):
+            self.codes, self.values = column.cat.codes.to_numpy(), column.cat.categories
+        else:
+            self.codes, self.values = pd.factorize(column)
+        self.order = np.argsort(self.codes, kind='stable')
+        self.bounds = np.searchsorted(self.codes[self.order], np.arange(len(self.values) + 1))
+
+    def value_codes(self, values):
+        """" returns the codes of the values that are in the column."""
+        codes = self.values.get_indexer(pd.Index(values).astype(self.values.dtype, copy=False)) \
+            if len(values) else np.arange(0)
+        return codes[codes >= 0]
+
+    def positions(self, values):
+        """" returns the sorted row positions holding any of the values."""
+        codes = self.value_codes(values)
+        if not len(codes):
+            return np.arange(0)
+        return np.sort(np.concatenate([self.order[self.bounds[code]:self.bounds[code + 1]] for code in codes]))
+
+    def count(self, values):
+        """" returns the number of rows holding any of the values."""
+        codes = self.value_codes(values)
+        return int((self.bounds[codes + 1] - self.bounds[codes]).sum())
+
+    def allowed(self, values):
+        """" returns a lookup of whether each code is one of the values, with a last entry for missing values."""
+        allowed = np.zeros(len(self.values) + 1, dtype=bool)
+        allowed[self.value_codes(values)] = True
+        return allowed
+
+
+class DatasetIndex(object):
+    """" indexes of the cleaned inspections and violations built once so filters are quick to apply.
+
+    Inspections are ordered by ACTIVITY DATE so a date range is a slice found with searchsorted,
+    and each filtered column has an inverted index from its values to row positions. Violations
+    are filtered through the first inspection of their SERIAL NUMBER. Filters return row
+    positions, the frames themselves are never copied.
+    """
+
+    INSPECTION_COLUMNS = {'zip codes': 'Zip Codes', 'seating': 'SEAT NUMBERS'}
+    VIOLATION_COLUMNS = {'violation codes': 'VIOLATION CODE', 'zip codes': 'Zip Codes'}
+    # every column the indexes are built from
+    COLUMNS = {'violations': ['SERIAL NUMBER', 'VIOLATION CODE', 'Zip Codes'],
+               'inspections': ['SERIAL NUMBER', 'ACTIVITY DATE', 'SCORE', 'Zip Codes', 'SEAT NUMBERS']}
+
+    def __init__(self, violations, inspections):
+        self.dates = inspections['ACTIVITY DATE'].to_numpy()
+        self.date_order = np.argsort(self.dates, kind='stable')
+        self.sorted_dates = self.dates[self.date_order]
+        self.scores = inspections['SCORE'].to_numpy()
+        self.inspection_indexes = {name: InvertedIndex(inspections[column])
+                                   for name, column in DatasetIndex.INSPECTION_COLUMNS.items()}
+        self.violation_indexes = {name: InvertedIndex(violations[column])
+                                  for name, column in DatasetIndex.VIOLATION_COLUMNS.items()}
+        # the position of the first inspection of the serial number of each violation, -1 when it has none
+        self.violation_inspection = KeyCodes.first_rows(inspections['SERIAL NUMBER'], violations['SERIAL NUMBER'])
+        self.inspection_rows = len(inspections)
+        self.violation_rows = len(violations)
+
+    @staticmethod
+    @instrumented
+    def build(violations, inspections):
+        """" returns the indexes of the cleaned inspections and violations."""
+        return DatasetIndex(violations, inspections)
+
+    def date_range(self):
+        """" returns the first and last ACTIVITY DATE."""
+        if not len(self.sorted_dates):
+            return None, None
+        return pd.Timestamp(self.sorted_dates[0]), pd.Timestamp(self.sorted_dates[-1])
+
+    def filter_inspections(self, start=None, end=None, zip_codes=None, seating=None, score_range=None):
+        """" returns the sorted positions of the inspections that pass every filter given.
+
+        The filter expected to keep the fewest rows gives the starting positions and the others
+        are checked only on those.
+        """
+        low = 0 if start is None else np.searchsorted(self.sorted_dates, np.datetime64(pd.Timestamp(start)), 'left')
+        high = len(self.sorted_dates) if end is None else \
+            np.searchsorted(self.sorted_dates, np.datetime64(pd.Timestamp(end)), 'right')
+        high = max(low, high)
+        values = {'zip codes': zip_codes, 'seating': seating}
+        candidates = [(high - low, 'date')] + [(self.inspection_indexes[name].count(selected), name)
+                                               for name, selected in values.items() if selected is not None]
+        _, first = min(candidates)
+        if first == 'date':
+            positions = np.sort(self.date_order[low:high])
+        else:
+            positions = self.inspection_indexes[first].positions(values[first])
+            if high - low < len(self.sorted_dates):
+                dates = self.dates[positions]
+                positions = positions[(dates >= self.sorted_dates[low]) & (dates <= self.sorted_dates[high - 1])] \
+                    if high > low else positions[:0]
+        for name, selected in values.items():
+            if selected is not None and name != first:
+                index = self.inspection_indexes[name]
+                positions = positions[index.allowed(selected)[index.codes[positions]]]
+        if score_range is not None:
+            scores = self.scores[positions]
+            positions = positions[(scores >= score_range[0]) & (scores <= score_range[1])]
+        return positions
+
+    def filter_violations(self, inspection_positions=None, violation_codes=None):
+        """" returns the sorted positions of the violations of the inspections with one of the violation codes."""
+        if violation_codes is not None:
+            positions = self.violation_indexes['violation codes'].positions(violation_codes)
+        else:
+            positions = np.arange(self.violation_rows)
+        if inspection_positions is not None and len(inspection_positions) < self.inspection_rows:
+            kept = np.zeros(self.inspection_rows + 1, dtype=bool)  # the last entry is for violations with none
+            kept[inspection_positions] = True
+            positions = positions[kept[self.violation_inspection[positions]]]
+        return positions
+
+    def value_counts(self, name, positions, label):
+        """" returns the number of violations at the positions for each value of the indexed column, least first."""
+        index = self.violation_indexes[name]
+        codes = index.codes[positions]
+        counts = np.bincount(codes[codes >= 0], minlength=len(index.values))
+        counts = pd.DataFrame({label: np.asarray(index.values, dtype=object), 'number of violations': counts})
+        return counts[counts['number of violations'] > 0].sort_values(by=['number of violations'])
+
+    def violation_code_counts(self, positions, number=None):
+        """" returns the same counts as DataController.violation_code_counts for the violations at the positions."""
+        counts = self.value_counts('violation codes', positions, 'violation code')
+        return counts if number is None else counts.tail(number)
+
+    def violation_zip_counts(self, positions):
+        """" returns the same counts as DataController.violation_zip_counts for the violations at the positions."""
+        return self.value_counts('zip codes', positions, 'zip area')
@@ -0,0 +1,258 @@
+import gc
+import os
+import shutil
+import tempfile
+import weakref
+
+from LazyImport import LazyImport
+
+# spilled tables are written as feather files, without pyarrow every table stays in memory
+feather = LazyImport('pyarrow.feather')
+pd = LazyImport('pandas')
+DataController = LazyImport('DataController', 'DataController')
+
+DATASET_NAMES = ['violations', 'inspections', 'inventory']
+DEFAULT_BUDGET_MB = 2048
+
+
+class NoDatasetError(LookupError):
+    """" raised when a table of the data set is asked for before a data set has been loaded."""
+
+
+class DatasetSession(object):
+    """" owns the three tables of the data set in memory, with their score cube and source files.
+
+    Every new data set is a new version, and the tables of the old version are released before the
+    new ones are kept. The tables are never changed in place, so the views handed out share their
+    memory and a change is a new version rather than a write to a view. While the tables are larger
+    than the memory budget the least recently used are spilled to feather files, which are read back
+    memory mapped the next time the table is asked for. A table counts against the budget while any
+    view of it is alive, as spilling it would free nothing, so only tables without views are spilled.
+    """
+
+    def __init__(self, budget_mb=DEFAULT_BUDGET_MB, spill_dir=None, on_change=None):
+        self.budget = int(budget_mb * 2 ** 20)
+        self.spill_dir = spill_dir
+        self.on_change = on_change
+        self.tables = {}
+        self.sizes = {}
+        # the feather file of each table that has been written in this version, kept until the version changes
+        self.files = {}
+        # tables that could not be written, such as columns pyarrow cannot convert, stay in memory
+        self.unspillable = set()
+        # weak references to the views of each table that have been handed out
+        self.handed = {}
+        self.last_used = {}
+        self.clock = 0
+        self.cube = None
+        self.source_files = None
+        self.version = 0
+
+    def is_loaded(self):
+        """" returns true once a data set has been given to the session."""
+        return bool(self.sizes)
+
+    def set_dataset(self, dataset, cube=None, source_files=None):
+        """" keeps the tables of a new version of the data set, releasing those of the old version first."""
+        self.release()
+        for name, data in zip(DATASET_NAMES, dataset):
+            self.tables[name] = data
+            self.sizes[name] = DataController.memory_usage(data)
+            self.touch(name)
+        self.cube = cube
+        self.source_files = source_files
+        self.version += 1
+        self.enforce_budget()
+        self.changed()
+        return self.version
+
+    def release(self):
+        """" drops the tables and their spilled files so the memory is freed straight away.
+
+        Only the memory no view of the old version still holds can be freed.
+        """
+        self.tables.clear()
+        self.sizes.clear()
+        self.handed.clear()
+        self.last_used.clear()
+        self.unspillable.clear()
+        self.cube = None
+        # frames refer to themselves through their caches, so they are only freed by a collection
+        gc.collect()
+        for path, _, _ in self.files.values():
+            try:
+                os.remove(path)
+            except OSError:  # still mapped by a view on some systems, removed with the directory on close
+                pass
+        self.files.clear()
+
+    def clear(self):
+        """" forgets the data set, which is a new version without any tables."""
+        self.release()
+        self.source_files = None
+        self.version += 1
+        self.changed()
+
+    def touch(self, name):
+        self.clock += 1
+        self.last_used[name] = self.clock
+
+    def view(self, name, columns=None, keep=(), load=True):
+        """" returns a view of the table sharing its memory, or of only the columns if they are given.
+
+        A spilled table is read back first, unless load is false, when only the view is read memory
+        mapped from its file and the table stays on disk. Tables in keep are not spilled to make room
+        for it. Raises NoDatasetError if no data set has been loaded, and KeyError for a missing column.
+        """
+        if name not in self.sizes:
+            raise NoDatasetError(name)
+        if name not in self.tables and load:
+            self.load(name)
+        if name in self.tables:
+            data = self.tables[name]
+            data = data.copy(deep=False) if columns is None else \
+                pd.DataFrame({column: data[column] for column in columns}, index=data.index, copy=False)
+        else:
+            data = DatasetSession.read_file(*self.files[name], columns=columns)
+        self.touch(name)
+        self.handed.setdefault(name, []).append(weakref.ref(data))
+        self.enforce_budget(keep=[name, *keep])
+        return data
+
+    def views(self, names=DATASET_NAMES, columns=None):
+        """" returns views of the tables in the order of the names, with the columns of each name if given.
+
+        The spilled tables are not read back, each view is read from the file of its table.
+        """
+        columns = columns or {}
+        return [self.view(name, columns.get(name), load=False) for name in names]
+
+    def sources(self, names=DATASET_NAMES, thread=False, reserve=False):
+        """" returns what a job needs to read each table, which read_source turns back into the table.
+
+        A job in a worker process is given the feather file of each table, written first if it has not
+        been in this version, so the tables are not pickled. A job in a thread is given the tables in
+        memory themselves and the files of the spilled ones. A table that cannot be written is given
+        itself. For a job that returns a new version, reserve makes room for one as large as the tables
+        it reads by spilling them while it runs.
+        """
+        sources = []
+        for name in names:
+            if name not in self.sizes:
+                raise NoDatasetError(name)
+            if name in self.tables and (thread or (name not in self.files and not self.write(name))):
+                sources.append(self.view(name))
+            else:
+                sources.append(self.files[name])
+                self.touch(name)
+        self.enforce_budget(reserve=sum(self.sizes[name] for name in names) if reserve else 0)
+        return sources
+
+    @staticmethod
+    def read_source(source, columns=None):
+        """" returns the table of a source given by sources, read memory mapped when it is a file."""
+        if isinstance(source, tuple):
+            return DatasetSession.read_file(*source, columns=columns)
+        return source if columns is None else source[list(columns)]
+
+    def columns(self, name):
+        """" returns the columns of the table without reading it back if it has been spilled."""
+        if name not in self.sizes:
+            raise NoDatasetError(name)
+        if name in self.tables:
+            return self.tables[name].columns
+        path, index, _ = self.files[name]
+        return pd.Index([column for column in feather.read_table(path, memory_map=True).column_names
+                         if column not in index])
+
+    def is_handed(self, name):
+        """" returns true while any view of the table handed out is alive."""
+        alive = [view for view in self.handed.get(name, []) if view() is not None]
+        self.handed[name] = alive
+        return bool(alive)
+
+    def memory_used(self):
+        """" returns the bytes used by the tables held in memory, or held by views of them."""
+        return sum(size for name, size in self.sizes.items() if name in self.tables or self.is_handed(name))
+
+    def memory_report(self):
+        """" returns the memory used by the tables and the budget in MB, and the names of the tables on disk."""
+        on_disk = [name for name in DATASET_NAMES if name in self.sizes and name not in self.tables]
+        return self.memory_used() / 2 ** 20, self.budget / 2 ** 20, on_disk
+
+    def set_budget(self, budget_mb):
+        """" changes the memory budget, spilling tables if they are now over it."""
+        self.budget = int(budget_mb * 2 ** 20)
+        self.enforce_budget()
+        self.changed()
+
+    def enforce_budget(self, keep=(), reserve=0):
+        """" spills the least recently used tables until the rest, and reserve bytes more, fit the budget.
+
+        The tables kept, and those with views alive, are not spilled.
+        """
+        for name in sorted(self.tables, key=lambda table: self.last_used[table]):
+            if self.memory_used() + reserve <= self.budget:
+                break
+            if name not in keep and name not in self.unspillable and not self.is_handed(name):
+                self.spill(name)
+
+    def write(self, name):
+        """" writes the table to its feather file, returning false if it cannot be written."""
+        data = self.tables[name]
+        if self.spill_dir is None:
+            self.spill_dir = tempfile.mkdtemp(prefix="session")
+        path = os.path.join(self.spill_dir, f"{name}-{self.version}.feather")
+        # a feather file has no index, so an index other than the row numbers is written as columns
+        indexed = list(data.index.names) != [None] or not data.index.equals(pd.RangeIndex(len(data)))
+        frame = data.reset_index() if indexed else data
+        try:
+            feather.write_feather(frame, path, compression='uncompressed')
+        except (ImportError, NotImplementedError, OSError, TypeError, ValueError):
+            if os.path.exists(path):
+                os.remove(path)
+            self.unspillable.add(name)
+            return False
+        index = [column for column in frame.columns if column not in data.columns] if indexed else []
+        self.files[name] = (path, index, list(data.index.names))
+        return True
+
+    def spill(self, name):
+        """" drops the table from memory, writing it to a feather file unless it has been written in this version.
+
+        Returns false if the table cannot be written, it is then kept in memory.
+        """
+        if name not in self.files and not self.write(name):
+            return False
+        del self.tables[name]
+        gc.collect()
+        self.changed()
+        return True
+
+    @staticmethod
+    def read_file(path, index, names, columns=None):
+        """" reads a spilled table, or only the columns of it, memory mapped from its feather file."""
+        table = feather.read_table(path, memory_map=True)
+        if columns is not None:
+            # raises KeyError for a column the table does not have
+            table = table.select(index + [column for column in columns if column not in index])
+        data = table.to_pandas()
+        if index:
+            data = data.set_index(index)
+            data.index.names = names
+        return data
+
+    def load(self, name):
+        """" reads a spilled table back into memory."""
+        self.tables[name] = DatasetSession.read_file(*self.files[name])
+        self.changed()
+
+    def changed(self):
+        if self.on_change is not None:
+            self.on_change(self)
+
+    def close(self):
+        """" drops the tables and removes the directory of the spilled files."""
+        self.release()
+        if self.spill_dir is not None:
+            shutil.rmtree(self.spill_dir, ignore_errors=True)
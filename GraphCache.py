@@ -0,0 +1,63 @@
+from collections import OrderedDict
+
+from LazyImport import LazyImport
+
+# imported when the first figure is drawn, not when the window starts
+Figure = LazyImport('matplotlib.figure', 'Figure')
+DataController = LazyImport('DataController', 'DataController')
+
+DEFAULT_MAX_ENTRIES = 4
+
+
+class GraphCache(object):
+    """" keeps the violation counts and graph figures of each version of the data set.
+
+    Entries are keyed by the source of the counts and the version of the data, which goes up
+    whenever the data changes, so an unchanged view is drawn from its kept figures. The bar
+    graph has a bar for every violation code or category, sorted so the most common are last, and
+    showing a different number of them only moves the limits of its axes.
+    """
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+
+    def get(self, source, version):
+        """" returns the entry of the counts and figures, or None if they have not been counted."""
+        entry = self.entries.get((source, version))
+        if entry is not None:
+            self.entries.move_to_end((source, version))
+        return entry
+
+    def put(self, source, version, code_counts, zip_counts, number):
+        """" keeps the counts of every violation code and zip code and draws their figures."""
+        entry = {'code counts': code_counts, 'zip counts': zip_counts, 'number': None,
+                 'bar': Figure(figsize=(7, 7)), 'scatter': Figure(figsize=(7, 7))}
+        DataController.violation_bar_graph(None, None, entry['bar'].subplots(), counts=code_counts)
+        DataController.violation_scatter_graph(None, entry['scatter'].subplots(), counts=zip_counts)
+        GraphCache.set_number(entry, number)
+        self.entries[(source, version)] = entry
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+        return entry
+
+    @staticmethod
+    def set_number(entry, number):
+        """" shows only the number most common violation codes on the bar graph of the entry.
+
+        Returns false if they are already shown.
+        """
+        bars = len(entry['code counts'])
+        number = max(1, min(number, bars))
+        if number == entry['number']:
+            return False
+        ax = entry['bar'].axes[0]
+        ax.set_xlim(bars - number - 0.5, bars - 0.5)
+        ax.set_ylim(0, entry['code counts'][DataController.bar_graph_column(entry['code counts'])].max() * 1.05)
+        entry['number'] = number
+        return True
+
+    def clear(self, source=None):
+        """" forgets the entries of the source, or every entry."""
+        for key in [key for key in self.entries if source is None or key[0] == source]:
+            del self.entries[key]
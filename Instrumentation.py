@@ -0,0 +1,204 @@
+import cProfile
+import functools
+import io
+import json
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+
+PROFILE_MODES = ['cprofile', 'tracemalloc']
+PROFILE_LINES = 25
+
+
+def count_rows(value):
+    """" returns the rows of a dataframe, or of the dataframes in a list or tuple, or None for anything else."""
+    if hasattr(value, 'shape') and hasattr(value, 'index'):
+        return len(value)
+    if isinstance(value, (list, tuple)):
+        counts = [count_rows(item) for item in value]
+        counts = [count for count in counts if count is not None]
+        return sum(counts) if counts else None
+    return None
+
+
+class InstrumentSession(object):
+    """" the operations recorded since recording was turned on, with what each one cost.
+
+    memory traces the peak memory of each operation with tracemalloc, which slows them down.
+    The operation named profile_stage is profiled with cProfile, or has the lines that allocated
+    the most memory attached when profile_mode is tracemalloc.
+    """
+
+    def __init__(self, memory=False, profile_stage=None, profile_mode='cprofile'):
+        if profile_mode not in PROFILE_MODES:
+            raise ValueError(f"profile mode must be one of {PROFILE_MODES}")
+        self.memory = memory
+        self.profile_stage = profile_stage
+        self.profile_mode = profile_mode
+        self.events = []
+        self.stack = []
+        self.lock = threading.Lock()
+
+    def settings(self):
+        """" returns the settings to start the same kind of session in a worker process."""
+        return {'memory': self.memory, 'profile_stage': self.profile_stage, 'profile_mode': self.profile_mode}
+
+    def uses_tracemalloc(self):
+        """" returns true if operations need tracemalloc running."""
+        return self.memory or (self.profile_stage is not None and self.profile_mode == 'tracemalloc')
+
+    def call(self, name, function, args, kwargs):
+        """" calls the function, recording it as an operation of the session."""
+        profiler = snapshot = None
+        if name == self.profile_stage:
+            if self.profile_mode == 'cprofile':
+                profiler = cProfile.Profile()
+            else:
+                snapshot = tracemalloc.take_snapshot()
+        frame = {'memory': tracemalloc.get_traced_memory()[0] if self.memory else 0, 'peak': 0}
+        if self.memory and hasattr(tracemalloc, 'reset_peak'):
+            if self.stack:
+                self.stack[-1]['peak'] = max(self.stack[-1]['peak'], tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+        self.stack.append(frame)
+        wall_start = time.time()
+        start = time.perf_counter()
+        try:
+            if profiler is not None:
+                result = profiler.runcall(function, *args, **kwargs)
+            else:
+                result = function(*args, **kwargs)
+        finally:
+            seconds = time.perf_counter() - start
+            self.stack.pop()
+        event = {'name': name, 'pid': os.getpid(), 'tid': threading.get_ident(), 'start': wall_start,
+                 'seconds': seconds, 'depth': len(self.stack), 'rows_in': count_rows(list(args)),
+                 'rows_out': count_rows(result), 'peak_mb': None}
+        if self.memory:
+            peak = max(tracemalloc.get_traced_memory()[1], frame['peak'])
+            if self.stack:
+                self.stack[-1]['peak'] = max(self.stack[-1]['peak'], peak)
+            event['peak_mb'] = (peak - frame['memory']) / 2 ** 20
+        if profiler is not None:
+            text = io.StringIO()
+            pstats.Stats(profiler, stream=text).sort_stats('cumulative').print_stats(PROFILE_LINES)
+            event['profile'] = text.getvalue()
+        elif snapshot is not None:
+            statistics = tracemalloc.take_snapshot().compare_to(snapshot, 'lineno')[:PROFILE_LINES]
+            event['profile'] = '\n'.join(str(statistic) for statistic in statistics)
+        self.add_events([event])
+        return result
+
+    def add_stage(self, name, seconds):
+        """" records a step inside an operation that was timed by the operation itself."""
+        self.add_events([{'name': name, 'pid': os.getpid(), 'tid': threading.get_ident(),
+                          'start': time.time() - seconds, 'seconds': seconds, 'depth': len(self.stack),
+                          'rows_in': None, 'rows_out': None, 'peak_mb': None}])
+
+    def add_events(self, events):
+        """" adds operations recorded here or in a worker process."""
+        with self.lock:
+            self.events.extend(events)
+
+    def totals(self):
+        """" returns the calls, seconds, rows and largest peak memory of each operation, slowest first."""
+        totals = {}
+        with self.lock:
+            events = list(self.events)
+        for event in events:
+            total = totals.setdefault(event['name'], {'name': event['name'], 'calls': 0, 'seconds': 0.0,
+                                                      'rows_in': 0, 'rows_out': 0, 'peak_mb': None})
+            total['calls'] += 1
+            total['seconds'] += event['seconds']
+            total['rows_in'] += event['rows_in'] or 0
+            total['rows_out'] += event['rows_out'] or 0
+            if event['peak_mb'] is not None:
+                total['peak_mb'] = max(total['peak_mb'] or 0, event['peak_mb'])
+        return sorted(totals.values(), key=lambda total: total['seconds'], reverse=True)
+
+    def profiles(self):
+        """" returns the profiles attached to the operations, latest first."""
+        with self.lock:
+            return [event for event in reversed(self.events) if 'profile' in event]
+
+    def save_json(self, filename):
+        """" writes the operations and their totals to a json file."""
+        with self.lock:
+            events = list(self.events)
+        with open(filename, 'w') as outFile:
+            json.dump({'settings': self.settings(), 'totals': self.totals(), 'events': events}, outFile, indent=2)
+
+    def save_chrome_trace(self, filename):
+        """" writes the operations as a trace that chrome://tracing and Perfetto can open."""
+        with self.lock:
+            events = list(self.events)
+        trace = [{'name': event['name'], 'cat': 'DataController', 'ph': 'X', 'pid': event['pid'],
+                  'tid': event['tid'], 'ts': event['start'] * 1e6, 'dur': event['seconds'] * 1e6,
+                  'args': {key: event[key] for key in ('rows_in', 'rows_out', 'peak_mb')}} for event in events]
+        with open(filename, 'w') as outFile:
+            json.dump({'traceEvents': trace, 'displayTimeUnit': 'ms'}, outFile)
+
+
+class Instrumentation(object):
+    """" turns recording of the instrumented operations on and off.
+
+    While it is off an instrumented operation costs one attribute lookup more than a plain call.
+    """
+    session = None
+
+    @staticmethod
+    def enable(memory=False, profile_stage=None, profile_mode='cprofile'):
+        """" starts recording operations, keeping what has been recorded if it is already on."""
+        session = InstrumentSession(memory, profile_stage, profile_mode)
+        if Instrumentation.session is not None:
+            session.events = Instrumentation.session.events
+        if session.uses_tracemalloc() and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        Instrumentation.session = session
+        return session
+
+    @staticmethod
+    def disable():
+        """" stops recording and returns the session that was recorded."""
+        session = Instrumentation.session
+        Instrumentation.session = None
+        if session is not None and session.uses_tracemalloc() and tracemalloc.is_tracing():
+            tracemalloc.stop()
+        return session
+
+    @staticmethod
+    def is_enabled():
+        """" returns true if operations are being recorded."""
+        return Instrumentation.session is not None
+
+    @staticmethod
+    def add_stage(name, seconds):
+        """" records a step timed inside an operation, if operations are being recorded."""
+        if Instrumentation.session is not None:
+            Instrumentation.session.add_stage(name, seconds)
+
+    @staticmethod
+    def run_job(function, settings, *args, progress):
+        """" runs a job in a worker process with recording on, returning its result and the operations."""
+        session = Instrumentation.enable(**settings)
+        try:
+            result = function(*args, progress=progress)
+        finally:
+            Instrumentation.disable()
+        return result, session.events
+
+
+def instrumented(function):
+    """" records each call of the function while instrumentation is on."""
+    name = function.__qualname__
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        session = Instrumentation.session
+        if session is None:
+            return function(*args, **kwargs)
+        return session.call(name, function, args, kwargs)
+
+    return wrapper
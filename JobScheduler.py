@@ -0,0 +1,200 @@
+import multiprocessing
+import queue
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from Instrumentation import Instrumentation
+
+DEFAULT_POLL_MS = 100
+# jobs that wait on the database or count quickly run in threads, so their tables are not pickled
+DEFAULT_THREADS = 2
+
+
+class JobCancelled(Exception):
+    """" raised inside a running job when it has been cancelled."""
+
+
+class JobProgress(object):
+    """" given to a running job to report its progress, it stops the job once the job is cancelled."""
+
+    def __init__(self, job_id, progress_queue, cancel_event):
+        self.job_id = job_id
+        self.progress_queue = progress_queue
+        self.cancel_event = cancel_event
+
+    def __call__(self, fraction, message=""):
+        if self.cancel_event.is_set():
+            raise JobCancelled(message)
+        self.progress_queue.put((self.job_id, fraction, message))
+
+
+class Job(object):
+    """" a job that has been submitted to the scheduler."""
+
+    def __init__(self, job_id, name, future, cancel_event, on_done, on_error, conflicts, instrumented=False):
+        self.job_id = job_id
+        self.name = name
+        self.future = future
+        self.cancel_event = cancel_event
+        self.on_done = on_done
+        self.on_error = on_error
+        self.conflicts = conflicts
+        # the job returns the operations it recorded along with its result
+        self.instrumented = instrumented
+        # a cancelled job keeps its conflicts disabled until it has stopped, and its result is dropped
+        self.cancelled = False
+
+
+class JobScheduler(object):
+    """" runs jobs in worker processes or threads and reports back to the GUI by polling with after().
+
+    Jobs are functions that can be pickled, they are called with their arguments and a progress
+    keyword which they call with the fraction done and a message. Calling progress after the job
+    has been cancelled raises JobCancelled inside the worker. Jobs submitted with thread set run in
+    a thread of the GUI process instead, for those that wait on the database or are cheap next to
+    pickling their arguments and result.
+    """
+
+    def __init__(self, window, on_progress=None, max_workers=None, poll_ms=DEFAULT_POLL_MS):
+        self.window = window
+        self.on_progress = on_progress
+        self.poll_ms = poll_ms
+        self.max_workers = max_workers
+        # the workers and the manager are started by the first job, not when the window is built
+        self.executor = None
+        self.manager = None
+        self.progress_queue = None
+        self.thread_executor = None
+        self.thread_queue = queue.Queue()
+        self.jobs = {}
+        self.disabled = {}
+        self.next_id = 0
+        self.polling = False
+
+    def start(self):
+        """" starts the worker processes and the manager passing progress back, if they have not been started."""
+        if self.executor is None:
+            self.executor = ProcessPoolExecutor(self.max_workers)
+            self.manager = multiprocessing.Manager()
+            self.progress_queue = self.manager.Queue()
+
+    def submit(self, name, function, *args, on_done=None, on_error=None, conflicts=(), thread=False):
+        """" runs the function in a worker process, disabling the conflicting widgets until it is finished.
+
+        The function runs in a thread of the GUI process instead when thread is set.
+        """
+        self.next_id += 1
+        session = Instrumentation.session
+        if thread:
+            if self.thread_executor is None:
+                self.thread_executor = ThreadPoolExecutor(DEFAULT_THREADS)
+            cancel_event = threading.Event()
+            progress = JobProgress(self.next_id, self.thread_queue, cancel_event)
+            # a thread records its operations straight into the session of the GUI
+            future = self.thread_executor.submit(function, *args, progress=progress)
+            instrumented = False
+        else:
+            self.start()
+            cancel_event = self.manager.Event()
+            progress = JobProgress(self.next_id, self.progress_queue, cancel_event)
+            if session is not None:
+                # the worker records its operations with the same settings and passes them back
+                future = self.executor.submit(Instrumentation.run_job, function, session.settings(), *args,
+                                              progress=progress)
+            else:
+                future = self.executor.submit(function, *args, progress=progress)
+            instrumented = session is not None
+        job = Job(self.next_id, name, future, cancel_event, on_done, on_error, list(conflicts), instrumented)
+        self.jobs[job.job_id] = job
+        for widget in job.conflicts:
+            self.disabled[widget] = self.disabled.get(widget, 0) + 1
+            widget.config(state="disabled")
+        self.report(job, 0, "started")
+        if not self.polling:
+            self.polling = True
+            self.window.after(self.poll_ms, self.poll)
+        return job.job_id
+
+    def is_running(self):
+        """" returns true if any job has not finished."""
+        return bool(self.jobs)
+
+    def cancel(self, job_id=None):
+        """" cancels the job, or every job if no job is given, and drops its result.
+
+        A job that has started stops the next time it reports progress, its conflicting widgets stay
+        disabled until it has, so a cancelled save cannot overlap the next one.
+        """
+        for job in list(self.jobs.values()):
+            if (job_id is None or job.job_id == job_id) and not job.cancelled:
+                job.cancelled = True
+                job.cancel_event.set()
+                if job.future.cancel():
+                    self.report(job, 0, "cancelled")
+                    self.release(job)
+                else:
+                    self.report(job, 0, "cancelling")
+
+    def poll(self):
+        """" passes on the progress and results of the jobs, then polls again while any job is running."""
+        for progress_queue in (self.progress_queue, self.thread_queue):
+            while progress_queue is not None:
+                try:
+                    job_id, fraction, message = progress_queue.get_nowait()
+                except queue.Empty:
+                    break
+                if job_id in self.jobs and not self.jobs[job_id].cancelled:
+                    self.report(self.jobs[job_id], fraction, message)
+        for job in list(self.jobs.values()):
+            if job.future.done():
+                self.finish(job)
+        if self.jobs:
+            self.window.after(self.poll_ms, self.poll)
+        else:
+            self.polling = False
+
+    def finish(self, job):
+        """" calls the done or error callback of a finished job in the GUI, or drops the result of a cancelled job."""
+        self.release(job)
+        if job.cancelled:
+            self.report(job, 0, "cancelled")
+            return
+        exception = job.future.exception()
+        if exception is None:
+            self.report(job, 1, "finished")
+            result = job.future.result()
+            if job.instrumented:
+                result, events = result
+                if Instrumentation.session is not None:
+                    Instrumentation.session.add_events(events)
+            if job.on_done is not None:
+                job.on_done(result)
+        elif not isinstance(exception, JobCancelled):
+            self.report(job, 1, "failed")
+            if job.on_error is not None:
+                job.on_error(exception)
+            else:
+                raise exception
+
+    def release(self, job):
+        """" removes the job and enables the widgets no other job conflicts with."""
+        self.jobs.pop(job.job_id, None)
+        for widget in job.conflicts:
+            self.disabled[widget] -= 1
+            if not self.disabled[widget]:
+                del self.disabled[widget]
+                widget.config(state="normal")
+
+    def report(self, job, fraction, message):
+        """" passes the progress of the job to the GUI."""
+        if self.on_progress is not None:
+            self.on_progress(job.name, fraction, message)
+
+    def shutdown(self):
+        """" cancels every job and stops the worker processes and threads."""
+        self.cancel()
+        if self.executor is not None:
+            self.executor.shutdown(wait=False)
+            self.manager.shutdown()
+        if self.thread_executor is not None:
+            self.thread_executor.shutdown(wait=False)
@@ -0,0 +1,117 @@
+import numpy as np
+import pandas as pd
+
+# the characters of the FACILITY IDs and SERIAL NUMBERs, a code of 0 pads an ID shorter than KEY_WIDTH
+KEY_ALPHABET = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+KEY_BASE = len(KEY_ALPHABET) + 1
+# the widest ID that fits in an int64, KEY_BASE ** KEY_WIDTH < 2 ** 63
+KEY_WIDTH = 12
+KEY_COLUMNS = ['FACILITY ID', 'SERIAL NUMBER']
+# the IDs are packed and unpacked this many at a time, bounding the character arrays
+KEY_BLOCK = 2 ** 20
+
+CHARACTER_CODES = np.full(256, -1, dtype='int64')
+CHARACTER_CODES[0] = 0
+CHARACTER_CODES[np.frombuffer(KEY_ALPHABET.encode(), dtype='uint8')] = np.arange(1, KEY_BASE)
+CODE_CHARACTERS = np.frombuffer(b'\0' + KEY_ALPHABET.encode(), dtype='uint8')
+POWERS = KEY_BASE ** np.arange(KEY_WIDTH - 1, -1, -1, dtype='int64')
+
+
+class KeyCodes(object):
+    """" packs the IDs of the data set into int64 codes, each character a digit in base KEY_BASE.
+
+    A packed ID takes 8 bytes rather than a Python string, and a categorical of IDs that are nearly
+    all distinct stores every string anyway. The packing needs no table of the IDs, so the same ID is
+    the same code in every table and in every export, and the codes sort in the order of the IDs.
+    IDs are unpacked back to text where they are saved or shown. A column with an ID that does not
+    fit, longer than KEY_WIDTH or with other characters, is not packed.
+    """
+
+    @staticmethod
+    def pack(values):
+        """" returns the code of each ID, -1 for one that cannot be packed."""
+        values = np.asarray(values, dtype=object)
+        codes = np.full(len(values), -1, dtype='int64')
+        if pd.api.types.infer_dtype(values, skipna=False) == 'string':
+            strings = np.arange(len(values))
+        else:
+            strings = np.flatnonzero([isinstance(value, str) for value in values])
+        for start in range(0, len(strings), KEY_BLOCK):
+            block = strings[start:start + KEY_BLOCK]
+            # one byte wider than an ID, so a longer ID shows as a character in the last byte
+            try:
+                characters = values[block].astype(f'S{KEY_WIDTH + 1}')
+            except UnicodeEncodeError:
+                characters = pd.Series(values[block], dtype=object).str.encode('ascii', errors='replace') \
+                    .to_numpy().astype(f'S{KEY_WIDTH + 1}')
+            digits = CHARACTER_CODES[np.frombuffer(characters.tobytes(), dtype='uint8').reshape(-1, KEY_WIDTH + 1)]
+            valid = (digits >= 0).all(axis=1) & (digits[:, 0] > 0) & (digits[:, -1] == 0)
+            codes[block[valid]] = digits[valid, :-1] @ POWERS
+        return codes
+
+    @staticmethod
+    def unpack(codes):
+        """" returns the ID of each code as text."""
+        codes = np.asarray(codes, dtype='int64')
+        text = np.empty(len(codes), dtype=object)
+        for start in range(0, len(codes), KEY_BLOCK):
+            digits = codes[start:start + KEY_BLOCK, np.newaxis] // POWERS % KEY_BASE
+            # the padding is trailing zero bytes, which numpy drops from the strings
+            text[start:start + KEY_BLOCK] = CODE_CHARACTERS[digits].view(f'S{KEY_WIDTH}').ravel().astype(str)
+        return text
+
+    @staticmethod
+    def is_packed(column):
+        """" returns true if the ID column holds packed codes rather than text."""
+        return pd.api.types.is_integer_dtype(column)
+
+    @staticmethod
+    def pack_column(column):
+        """" returns the ID column packed into codes, or None if any of its IDs cannot be packed."""
+        if KeyCodes.is_packed(column):
+            return column
+        codes = KeyCodes.pack(column.to_numpy(dtype=object))
+        if (codes < 0).any():
+            return None
+        return pd.Series(codes, index=column.index, name=column.name)
+
+    @staticmethod
+    def text(values):
+        """" returns the IDs as text, unpacking them if they are packed."""
+        if KeyCodes.is_packed(values):
+            return KeyCodes.unpack(values)
+        return np.asarray(values, dtype=object)
+
+    @staticmethod
+    def matching(values, like):
+        """" returns the IDs in the form of the column like, so they can be looked up in it.
+
+        An ID that cannot be packed is -1 when like is packed, which no ID of like is.
+        """
+        if not KeyCodes.is_packed(like):
+            return KeyCodes.text(values)
+        if KeyCodes.is_packed(values):
+            return np.asarray(values)
+        return KeyCodes.pack(values)
+
+    @staticmethod
+    def first_rows(column, values):
+        """" returns the position of the first row of the ID column holding each ID, -1 for one it does not hold.
+
+        An ID can be held by more than one row, such as a SERIAL NUMBER shared by inspections, and is
+        then found at its first row, the one clean_dataset takes the zip code of its violations from.
+        """
+        column = pd.Series(np.asarray(column), index=column.index) if hasattr(column, 'cat') else column
+        first = ~column.duplicated().to_numpy()
+        positions = pd.Index(column.to_numpy()[first]).get_indexer(KeyCodes.matching(values, column))
+        found = positions >= 0
+        positions[found] = np.flatnonzero(first)[positions[found]]
+        return positions
+
+    @staticmethod
+    def unpack_frame(data):
+        """" returns the frame with its packed ID columns back as text."""
+        packed = [column for column in KEY_COLUMNS if column in data.columns and KeyCodes.is_packed(data[column])]
+        if not packed:
+            return data
+        return data.assign(**{column: KeyCodes.unpack(data[column]) for column in packed})
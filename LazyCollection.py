@@ -0,0 +1,129 @@
+import pandas as pd
+
+from DatabaseController import DatabaseController
+
+DATED_COLLECTIONS = ['inspections']
+# the precision of dates in the database, so ranges next to each other do not share a date
+RANGE_STEP = pd.Timedelta(milliseconds=1)
+
+
+class LazyCollection(object):
+    """" a database collection that is only fetched as far as the views of it need.
+
+    Each view asks for some columns and an ACTIVITY DATE range. Only the columns and dates that
+    have not been fetched yet are read from the database, and what has been fetched is kept for
+    the next view. Fetching is split into plan, read and merge so the reading can be done by a
+    worker process while the fetched rows stay with the handle.
+    """
+
+    def __init__(self, choice, columns=None):
+        self.choice = choice
+        self.dated = choice in DATED_COLLECTIONS
+        self.columns = columns  # every column of the collection, read on first use when not given
+        self.data = pd.DataFrame()
+        # date ranges that every fetched column has been read for, as sorted (start, end) timestamps
+        self.ranges = []
+
+    def all_columns(self):
+        """" returns every column of the collection."""
+        if self.columns is None:
+            self.columns = DatabaseController.get_columns(self.choice)
+        return self.columns
+
+    def bounds(self, start=None, end=None):
+        """" returns the date range as timestamps, an open end being the earliest or latest date."""
+        if not self.dated:
+            return pd.Timestamp.min, pd.Timestamp.max
+        return pd.Timestamp(start) if start is not None else pd.Timestamp.min, \
+            pd.Timestamp(end) if end is not None else pd.Timestamp.max
+
+    def missing_ranges(self, start, end):
+        """" returns the parts of the date range that have not been fetched."""
+        missing = []
+        for fetched_start, fetched_end in self.ranges:
+            if fetched_end < start or fetched_start > end:
+                continue
+            if fetched_start > start:
+                missing.append((start, fetched_start - RANGE_STEP))
+            if fetched_end >= end:
+                return missing
+            start = fetched_end + RANGE_STEP
+        missing.append((start, end))
+        return missing
+
+    def plan(self, columns=None, start=None, end=None):
+        """" returns the queries needed before the view can be given, which is empty when it is all fetched.
+
+        A query is a dictionary of the columns and the date range to read, and its kind: 'columns' for
+        new columns of a range already fetched, or 'range' for a range that has not been fetched.
+        """
+        columns = list(columns) if columns is not None else self.all_columns()
+        if self.dated and 'ACTIVITY DATE' not in columns:
+            columns.append('ACTIVITY DATE')  # kept so the fetched rows can be sliced by date
+        start, end = self.bounds(start, end)
+        queries = []
+        new_columns = [column for column in columns if column not in self.data.columns]
+        if new_columns:
+            # the rows already fetched need the new columns as well
+            queries += [{'kind': 'columns', 'columns': new_columns, 'start': fetched_start, 'end': fetched_end}
+                        for fetched_start, fetched_end in self.ranges]
+        fetched_columns = list(self.data.columns) + new_columns
+        queries += [{'kind': 'range', 'columns': fetched_columns, 'start': missing_start, 'end': missing_end}
+                    for missing_start, missing_end in self.missing_ranges(start, end)]
+        return queries
+
+    def read(self, queries):
+        """" reads the queries from the database and returns the frames."""
+        frames = []
+        for query in queries:
+            start = query['start'] if query['start'] != pd.Timestamp.min else None
+            end = query['end'] if query['end'] != pd.Timestamp.max else None
+            frames.append(DatabaseController.read_query(self.choice, query['columns'], start, end))
+        return frames
+
+    def merge(self, queries, frames):
+        """" adds the frames read for the queries to what has been fetched.
+
+        The new columns of every fetched range are joined onto the rows already fetched in one go,
+        before the rows of the new ranges, which have every column, are added.
+        """
+        added = {}
+        for query, frame in zip(queries, frames):
+            if query['kind'] == 'columns':
+                added.setdefault(tuple(query['columns']), []).append(frame[query['columns']])
+        for columns, column_frames in added.items():
+            self.data = self.data.join(pd.concat(column_frames))
+        for query, frame in zip(queries, frames):
+            if query['kind'] == 'range':
+                self.data = pd.concat([self.data, frame[list(self.data.columns)]]) if len(self.data.columns) \
+                    else frame
+                self.ranges = self.merged_ranges(self.ranges + [(query['start'], query['end'])])
+        if self.dated and 'ACTIVITY DATE' in self.data.columns:
+            self.data['ACTIVITY DATE'] = pd.to_datetime(self.data['ACTIVITY DATE'])
+
+    @staticmethod
+    def merged_ranges(ranges):
+        """" returns the date ranges sorted with the ranges that touch joined together."""
+        merged = []
+        for start, end in sorted(ranges):
+            if merged and start - RANGE_STEP <= merged[-1][1]:
+                merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+            else:
+                merged.append((start, end))
+        return merged
+
+    def view(self, columns=None, start=None, end=None):
+        """" returns the fetched rows in the date range with the columns, which must have been fetched."""
+        columns = list(columns) if columns is not None else self.all_columns()
+        data = self.data
+        if self.dated and (start is not None or end is not None):
+            start, end = self.bounds(start, end)
+            data = data[data['ACTIVITY DATE'].between(start, end)]
+        return data[columns]
+
+    def fetch(self, columns=None, start=None, end=None):
+        """" returns the view, reading whatever it needs from the database first."""
+        queries = self.plan(columns, start, end)
+        if queries:
+            self.merge(queries, self.read(queries))
+        return self.view(columns, start, end)
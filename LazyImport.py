@@ -0,0 +1,41 @@
+import importlib
+
+# names kept on the proxy itself, looked up before the module has been imported
+PROXY_NAMES = ('_module', '_attribute', '_target')
+
+
+class LazyImport(object):
+    """" stands in for a module, or a name in a module, that is only imported the first time it is used.
+
+    Modules that are slow to import, such as seaborn, matplotlib and pymongo, are bound to a proxy
+    at the top of a module, so importing that module stays cheap and the import is paid by the first
+    feature that needs it.
+    """
+
+    def __init__(self, module, attribute=None):
+        self._module = module
+        self._attribute = attribute
+        self._target = None
+
+    def resolve(self):
+        """" imports the module if it has not been imported yet and returns what the proxy stands in for."""
+        if self._target is None:
+            target = importlib.import_module(self._module)
+            self._target = getattr(target, self._attribute) if self._attribute is not None else target
+        return self._target
+
+    def is_imported(self):
+        """" returns true once the module has been imported."""
+        return self._target is not None
+
+    def __getattr__(self, name):
+        if name in PROXY_NAMES:
+            raise AttributeError(name)
+        return getattr(self.resolve(), name)
+
+    def __call__(self, *args, **kwargs):
+        return self.resolve()(*args, **kwargs)
+
+    def __repr__(self):
+        name = f"{self._module}.{self._attribute}" if self._attribute is not None else self._module
+        return f"<LazyImport {name}{'' if self.is_imported() else ' (not imported)'}>"
@@ -0,0 +1,107 @@
+import io
+import os
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+except ImportError:  # without pyarrow the parts are passed back by pickling
+    pa = None
+
+from DataController import DataController
+from Instrumentation import instrumented
+
+DATASET_NAMES = ['violations', 'inspections', 'inventory']
+# files smaller than this are read by one worker
+MIN_RANGE_BYTES = 32 * 1024 * 1024
+
+
+class ParallelIngest(object):
+
+    @staticmethod
+    def split_byte_ranges(filename, parts):
+        """" returns the header and the byte ranges that split the rows of the file into parts.
+
+        Ranges end on a line break, so rows must not hold quoted line breaks.
+        """
+        size = os.path.getsize(filename)
+        with open(filename, 'rb') as inFile:
+            header = inFile.readline()
+            starts = [inFile.tell()]
+            for part in range(1, parts):
+                inFile.seek(max(starts[-1], size * part // parts))
+                inFile.readline()  # move to the start of the next row
+                if inFile.tell() >= size:
+                    break
+                if inFile.tell() > starts[-1]:
+                    starts.append(inFile.tell())
+        return header, list(zip(starts, starts[1:] + [size]))
+
+    @staticmethod
+    def read_byte_range(filename, header, start, end, output_dir=None):
+        """" prepares the rows in the byte range of the csv file, written as an arrow file if there is an output_dir."""
+        with open(filename, 'rb') as inFile:
+            inFile.seek(start)
+            rows = inFile.read(end - start)
+        text = io.StringIO((header + rows).decode("utf-8-sig"), newline='')
+        role, options, integers = DataController.get_csv_schema(pd.read_csv(io.StringIO(header.decode("utf-8-sig")),
+                                                                            nrows=0).columns)
+        try:
+            data_frame = pd.read_csv(text, low_memory=False, **options)
+        except ValueError as ve:
+            raise ValueError(f"File not in correct format. {ve}")
+        data_frame = DataController.prep_frame(data_frame).astype(integers).reset_index(drop=True)
+        if output_dir is None:
+            return data_frame
+        path = os.path.join(output_dir, f"{os.path.basename(filename)}.{start}.arrow")
+        table = pa.Table.from_pandas(data_frame, preserve_index=False)
+        with pa.OSFile(path, 'wb') as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+        return path
+
+    @staticmethod
+    def read_part(part):
+        """" returns the part passed back by a worker as a dataframe."""
+        if not isinstance(part, str):
+            return part
+        with pa.memory_map(part) as source:
+            return pa.ipc.open_file(source).read_all().to_pandas()
+
+    @staticmethod
+    @instrumented
+    def ingest_dataset(filenames, workers=None, progress=None):
+        """" loads and prepares the three csv files at the same time across worker processes.
+
+        Large files are split into byte ranges so one file can be read by several workers. Workers
+        write their rows as arrow files, which are memory mapped back rather than pickled, so this is
+        called in the process that keeps the data set rather than in a worker of its own.
+        """
+        workers = workers or os.cpu_count() or 1
+        roles = DataController.get_file_roles(filenames)
+        output_dir = tempfile.mkdtemp(prefix="ingest") if pa is not None else None
+        try:
+            with ProcessPoolExecutor(workers) as executor:
+                futures = {}
+                for role in DATASET_NAMES:
+                    filename = roles[role]
+                    parts = max(1, min(workers, os.path.getsize(filename) // MIN_RANGE_BYTES))
+                    header, ranges = ParallelIngest.split_byte_ranges(filename, parts)
+                    futures[role] = [executor.submit(ParallelIngest.read_byte_range, filename, header,
+                                                     start, end, output_dir) for start, end in ranges]
+                dataset = []
+                for position, role in enumerate(DATASET_NAMES):
+                    if progress is not None:
+                        progress(position / 3, f"reading {role}")
+                    frames = [ParallelIngest.read_part(future.result()) for future in futures[role]]
+                    data_frame = frames[0] if len(frames) == 1 else pd.concat(frames, ignore_index=True)
+                    # duplicates can be split across parts
+                    dataset.append(data_frame.drop_duplicates() if len(frames) > 1 else data_frame)
+        finally:
+            if output_dir is not None:
+                shutil.rmtree(output_dir, ignore_errors=True)
+        dataset[0] = dataset[0].set_index("SERIAL NUMBER")
+        return dataset
@@ -0,0 +1,64 @@
+import re
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+BRACKET = re.compile(r'\(([^)]+)\)')
+BRACKETS = re.compile(r'[\(\[].*?[\)\]]')
+NUMBER = re.compile(r'\d[\d,]*')
+SQUARE_FEET = re.compile(r'\bSF\b|\bSQ')
+RISK = re.compile(r'\b(LOW|MODERATE|HIGH) RISK\b')
+RISK_LEVELS = {'LOW': 1, 'MODERATE': 2, 'HIGH': 3}
+
+# text columns are returned as categoricals and the ranges as floats so a missing bound can be NaN
+TEXT_COLUMNS = ['PE DESCRIPTION', 'SEAT NUMBERS', 'PE CATEGORY']
+NUMBER_COLUMNS = ['SEATS LOW', 'SEATS HIGH', 'SQ FT LOW', 'SQ FT HIGH', 'RISK LEVEL']
+
+
+class PeDescription(object):
+    """" parses the PE DESCRIPTION of a vendor, such as 'RESTAURANT (31-60) SEATS HIGH RISK', into its fields.
+
+    The column only has a few dozen distinct descriptions, so each one is parsed once and the
+    fields are mapped back to the rows through the codes of the column.
+    """
+
+    @staticmethod
+    @lru_cache(maxsize=None)
+    def parse(description):
+        """" returns the fields of one description as a tuple in the order of TEXT_COLUMNS then NUMBER_COLUMNS.
+
+        An open range such as '151 + ' has no high bound.
+        """
+        bracket = BRACKET.search(description)
+        seat_numbers = bracket.group(1) if bracket else np.nan
+        bounds = [np.nan, np.nan, np.nan, np.nan]
+        if bracket:
+            numbers = [float(number.replace(',', '')) for number in NUMBER.findall(seat_numbers)]
+            if numbers:
+                high = numbers[1] if len(numbers) > 1 else (np.nan if '+' in seat_numbers else numbers[0])
+                offset = 2 if SQUARE_FEET.search(seat_numbers) else 0
+                bounds[offset:offset + 2] = numbers[0], high
+        risk = RISK.search(description)
+        category = description[:bracket.start()] if bracket else RISK.sub('', description)
+        return (BRACKETS.sub('', description), seat_numbers, category.strip(), *bounds,
+                RISK_LEVELS[risk.group(1)] if risk else np.nan)
+
+    @staticmethod
+    def parse_column(descriptions):
+        """" returns a dataframe of the fields of each description, parsing each distinct description once."""
+        if hasattr(descriptions, 'cat'):
+            codes, uniques = descriptions.cat.codes.to_numpy(), descriptions.cat.categories
+        else:
+            codes, uniques = pd.factorize(descriptions)
+        # the extra last row is picked by the -1 code of a missing description
+        fields = pd.DataFrame([PeDescription.parse(description) for description in uniques] +
+                              [(np.nan,) * (len(TEXT_COLUMNS) + len(NUMBER_COLUMNS))],
+                              columns=TEXT_COLUMNS + NUMBER_COLUMNS)
+        columns = {}
+        for column in TEXT_COLUMNS:
+            field_codes, categories = pd.factorize(fields[column])
+            columns[column] = pd.Categorical.from_codes(field_codes[codes], categories)
+        for column in NUMBER_COLUMNS:
+            columns[column] = fields[column].to_numpy(dtype='float64')[codes]
+        return pd.DataFrame(columns, index=descriptions.index)
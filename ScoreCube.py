@@ -0,0 +1,141 @@
+import numpy as np
+import pandas as pd
+
+from Instrumentation import instrumented
+
+CUBE_DIMENSIONS = ['PE DESCRIPTION', 'SEAT NUMBERS', 'Zip Codes']
+
+
+class ScoreCube(object):
+    """" score histograms of the cleaned inspections per vendor type, seating, zip code and month.
+
+    Any filter or date range can be answered from the histograms without going back to the inspections.
+    """
+
+    def __init__(self, histogram):
+        # one row per (PE DESCRIPTION, SEAT NUMBERS, Zip Codes, month) and one column per score
+        self.histogram = histogram
+        self.totals = pd.DataFrame({
+            'count': histogram.sum(axis=1),
+            'sum': histogram.to_numpy() @ histogram.columns.to_numpy(dtype='float64'),
+        }, index=histogram.index)
+
+    @staticmethod
+    @instrumented
+    def build(inspections):
+        """" returns the cube of the scores of the cleaned inspections."""
+        if 'SEAT NUMBERS' not in inspections.columns:
+            raise TypeError("inspections have not been cleaned")
+        data = inspections[CUBE_DIMENSIONS + ['SCORE', 'ACTIVITY DATE']].dropna(subset=['SCORE', 'ACTIVITY DATE'])
+        histogram = data.groupby(
+            CUBE_DIMENSIONS + [data['ACTIVITY DATE'].dt.to_period('M').rename('month'), 'SCORE'],
+            dropna=False, observed=True).size().unstack('SCORE', fill_value=0)
+        return ScoreCube(histogram.astype('int32'))
+
+    def append(self, inspections):
+        """" adds the scores of newly cleaned inspections to the cube."""
+        other = ScoreCube.build(inspections).histogram
+        histogram = self.histogram.add(other, fill_value=0).fillna(0).astype('int32')
+        self.__init__(histogram.sort_index(axis=1))
+        return self
+
+    def remove(self, inspections):
+        """" takes the scores of inspections that have been removed from the data set out of the cube."""
+        other = ScoreCube.build(inspections).histogram
+        histogram = self.histogram.sub(other, fill_value=0).fillna(0).astype('int32')
+        # cells left without any scores are dropped so the cube only holds what is in the data set
+        self.__init__(histogram[histogram.sum(axis=1) > 0])
+        return self
+
+    def select(self, start=None, end=None, filters=None, score_range=None):
+        """" returns the histogram rows inside the date range and matching the column filters.
+
+        filters maps a cube dimension to the values to keep, and score_range keeps the columns of the
+        scores from its lowest to its highest.
+        """
+        mask = np.ones(len(self.histogram), dtype=bool)
+        months = self.histogram.index.get_level_values('month')
+        if start is not None:
+            mask &= months >= pd.Period(start, 'M')
+        if end is not None:
+            mask &= months <= pd.Period(end, 'M')
+        for column, values in (filters or {}).items():
+            mask &= self.histogram.index.get_level_values(column).isin(values)
+        histogram = self.histogram[mask]
+        if score_range is not None:
+            scores = histogram.columns.to_numpy()
+            histogram = histogram.loc[:, (scores >= score_range[0]) & (scores <= score_range[1])]
+        return histogram
+
+    @instrumented
+    def statistics(self, group_by, start=None, end=None, filters=None, freq='Y', score_range=None):
+        """" returns the mean, median and mode of the score per group and year, or month if freq is 'M'.
+
+        When a group has several modes the lowest score is used, as in DataController.score_statistics.
+        """
+        return ScoreCube.histogram_statistics(self.select(start, end, filters, score_range), group_by, freq)
+
+    @instrumented
+    def filtered_statistics(self, group_by, inspections, rows=None, start=None, end=None, zip_codes=None,
+                            seating=None, score_range=None, freq='Y'):
+        """" returns the statistics of the inspections passing the filters of DatasetIndex.filter_inspections.
+
+        The zip codes, seating, scores and the whole months of the date range are answered from the
+        cube. Only the inspections of a month the range starts or ends part way through are read and
+        added to it, from the rows when the positions passing the filters are known.
+        """
+        first = last = None
+        if start is not None:
+            start = pd.Timestamp(start)
+            first = pd.Period(start, 'M')
+            first = first + 1 if start > first.start_time else first
+        if end is not None:
+            end = pd.Timestamp(end)
+            last = pd.Period(end, 'M')
+            last = last - 1 if end.normalize() < last.end_time.normalize() else last
+        filters = {column: values for column, values in [('Zip Codes', zip_codes), ('SEAT NUMBERS', seating)]
+                   if values is not None}
+        histogram = self.select(first, last, filters, score_range)
+        if (first is not None and start < first.start_time) or (last is not None and end > last.end_time):
+            rows = np.arange(len(inspections)) if rows is None else np.asarray(rows)
+            dates = inspections['ACTIVITY DATE'].to_numpy()[rows]
+            partial = np.zeros(len(rows), dtype=bool)
+            if first is not None:
+                partial |= (dates >= np.datetime64(start)) & (dates < np.datetime64(first.start_time))
+            if last is not None:
+                partial |= (dates <= np.datetime64(end)) & (dates > np.datetime64(last.end_time))
+            if first is not None and last is not None and first > last:
+                # the range starts and ends inside the same month
+                partial = (dates >= np.datetime64(start)) & (dates <= np.datetime64(end))
+            part = inspections.iloc[rows[partial]]
+            for column, values in filters.items():
+                part = part[part[column].isin(values)]
+            if score_range is not None:
+                part = part[part['SCORE'].between(*score_range)]
+            if len(part):
+                histogram = histogram.add(ScoreCube.build(part).histogram, fill_value=0).fillna(0).sort_index(axis=1)
+        return ScoreCube.histogram_statistics(histogram, group_by, freq)
+
+    @staticmethod
+    def histogram_statistics(histogram, group_by, freq='Y'):
+        """" returns the mean, median and mode of the score per group and period of the histogram rows."""
+        periods = histogram.index.get_level_values('month').asfreq(freq)
+        grouped = histogram.groupby([histogram.index.get_level_values(group_by), periods], observed=True).sum()
+        grouped = grouped[grouped.sum(axis=1) > 0].sort_index()
+        counts = grouped.to_numpy()
+        scores = grouped.columns.to_numpy(dtype='float64')
+        total = counts.sum(axis=1)
+        cumulative = counts.cumsum(axis=1)
+
+        # the median is the mean of the middle two ranked scores, which are the same when the count is odd
+        lower = (cumulative < ((total + 1) // 2)[:, None]).sum(axis=1)
+        upper = (cumulative < (total // 2 + 1)[:, None]).sum(axis=1)
+
+        return pd.DataFrame({
+            group_by: grouped.index.get_level_values(0),
+            'ACTIVITY DATE': grouped.index.get_level_values(1).to_timestamp(how='end').normalize(),
+            'mean grouped by year': counts @ scores / total,
+            'median grouped by year': (scores[lower] + scores[upper]) / 2,
+            # a histogram without any score has no groups, and no column to take a mode from
+            'mode grouped by year': scores[counts.argmax(axis=1)] if counts.size else scores[:0],
+        })
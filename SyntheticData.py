@@ -0,0 +1,194 @@
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_CHUNK_SIZE = 1000000
+# one inspection for every three violations and one facility for every five inspections, as in the exports
+VIOLATIONS_PER_INSPECTION = 3
+INSPECTIONS_PER_FACILITY = 5
+
+PE_DESCRIPTIONS = {
+    1630: 'RESTAURANT (0-30) SEATS LOW RISK',
+    1631: 'RESTAURANT (0-30) SEATS MODERATE RISK',
+    1632: 'RESTAURANT (0-30) SEATS HIGH RISK',
+    1633: 'RESTAURANT (31-60) SEATS LOW RISK',
+    1634: 'RESTAURANT (31-60) SEATS MODERATE RISK',
+    1635: 'RESTAURANT (31-60) SEATS HIGH RISK',
+    1636: 'RESTAURANT (61-150) SEATS LOW RISK',
+    1637: 'RESTAURANT (61-150) SEATS MODERATE RISK',
+    1638: 'RESTAURANT (61-150) SEATS HIGH RISK',
+    1639: 'RESTAURANT (151 + ) SEATS LOW RISK',
+    1640: 'RESTAURANT (151 + ) SEATS MODERATE RISK',
+    1641: 'RESTAURANT (151 + ) SEATS HIGH RISK',
+    1610: 'FOOD MKT RETAIL (1-1,999 SF) LOW RISK',
+    1611: 'FOOD MKT RETAIL (1-1,999 SF) MODERATE RISK',
+    1612: 'FOOD MKT RETAIL (1-1,999 SF) HIGH RISK',
+    1613: 'FOOD MKT RETAIL (2,000+ SF) LOW RISK',
+    1614: 'FOOD MKT RETAIL (2,000+ SF) MODERATE RISK',
+    1615: 'FOOD MKT RETAIL (2,000+ SF) HIGH RISK',
+}
+VIOLATION_CODES = [f"F{number:03d}" for number in range(1, 60)]
+SERVICES = {1: 'ROUTINE INSPECTION', 401: 'OWNER INITIATED ROUTINE INSPECT.'}
+CITIES = ['LOS ANGELES', 'LONG BEACH', 'PASADENA', 'SANTA MONICA', 'GLENDALE', 'TORRANCE']
+
+
+class SyntheticData(object):
+    """" writes random violations, inspections and inventory csv files with the columns of the real exports.
+
+    The files carry the anomalies cleaning has to handle: duplicated rows, missing values, INACTIVE
+    vendors and the bracketed seat and square foot ranges in PE DESCRIPTION. The same seed always
+    writes the same files.
+    """
+
+    @staticmethod
+    def add_anomalies(data, rng, duplicate_rate, missing_rate, columns):
+        """" returns the rows with a share repeated and a share of the values in the columns removed."""
+        if duplicate_rate > 0:
+            data = pd.concat([data, data.sample(frac=duplicate_rate, random_state=rng.integers(1 << 31))])
+        if missing_rate > 0:
+            for column in columns:
+                if pd.api.types.is_integer_dtype(data[column]):
+                    data[column] = data[column].astype('Int64')  # so the integers are not written as floats
+                data.loc[rng.random(len(data)) < missing_rate / len(columns), column] = np.nan
+        return data
+
+    @staticmethod
+    def make_inventory(facilities, rng, inactive_rate=0.1):
+        """" returns the inventory of the facilities and which of them are inactive."""
+        codes = rng.choice(list(PE_DESCRIPTIONS), facilities)
+        zips = rng.integers(90001, 91800, facilities)
+        inventory = pd.DataFrame({
+            'FACILITY ID': [f"FA{number:07d}" for number in range(facilities)],
+            'FACILITY NAME': [f"FACILITY {number}" for number in range(facilities)],
+            'RECORD ID': [f"PR{number:07d}" for number in range(facilities)],
+            'PROGRAM NAME': [f"PROGRAM {number % 5000}" for number in range(facilities)],
+            'PROGRAM ELEMENT (PE)': codes,
+            'PE DESCRIPTION': [PE_DESCRIPTIONS[code] for code in codes],
+            'FACILITY ADDRESS': [f"{number % 9999 + 1} MAIN ST" for number in range(facilities)],
+            'FACILITY CITY': rng.choice(CITIES, facilities),
+            'FACILITY STATE': 'CA',
+            'FACILITY ZIP': zips.astype(str),
+            'FACILITY LATITUDE': rng.uniform(33.7, 34.8, facilities).round(6),
+            'FACILITY LONGITUDE': rng.uniform(-118.9, -117.6, facilities).round(6),
+            'OWNER ID': [f"OW{number // 2:07d}" for number in range(facilities)],
+            'OWNER NAME': [f"OWNER {number // 2}" for number in range(facilities)],
+            'OWNER ADDRESS': [f"{number % 999 + 1} OAK AVE" for number in range(facilities)],
+            'OWNER CITY': rng.choice(CITIES, facilities),
+            'OWNER STATE': 'CA',
+            'OWNER ZIP': zips.astype(str),
+            'Location': '(34.0, -118.2)',
+            'Census Tracts 2010': rng.integers(1000, 2000, facilities).astype(float),
+            '2011 Supervisorial District Boundaries (Official)': rng.integers(1, 6, facilities).astype(float),
+            'Board Approved Statistical Areas': rng.integers(1, 300, facilities).astype(float),
+            'Zip Codes': zips - 67000,
+        })
+        return inventory, rng.random(facilities) < inactive_rate
+
+    @staticmethod
+    def make_inspections(start, rows, inventory, inactive, rng):
+        """" returns the inspections with serial numbers from start, each of a random facility of the inventory."""
+        facility = rng.integers(0, len(inventory), rows)
+        owner = inventory.iloc[facility].reset_index(drop=True)
+        scores = rng.choice(np.arange(60, 101), rows, p=SyntheticData.score_weights())
+        services = rng.choice(list(SERVICES), rows, p=[0.9, 0.1])
+        return pd.DataFrame({
+            'ACTIVITY DATE': (pd.Timestamp('2015-07-01') + pd.to_timedelta(rng.integers(0, 4 * 365, rows), unit='D'))
+            .strftime('%m/%d/%Y'),
+            'OWNER ID': owner['OWNER ID'],
+            'OWNER NAME': owner['OWNER NAME'],
+            'FACILITY ID': owner['FACILITY ID'],
+            'FACILITY NAME': owner['FACILITY NAME'],
+            'RECORD ID': owner['RECORD ID'],
+            'PROGRAM NAME': owner['PROGRAM NAME'],
+            'PROGRAM STATUS': np.where(inactive[facility], 'INACTIVE', 'ACTIVE'),
+            'PROGRAM ELEMENT (PE)': owner['PROGRAM ELEMENT (PE)'],
+            'PE DESCRIPTION': owner['PE DESCRIPTION'],
+            'FACILITY ADDRESS': owner['FACILITY ADDRESS'],
+            'FACILITY CITY': owner['FACILITY CITY'],
+            'FACILITY STATE': owner['FACILITY STATE'],
+            'FACILITY ZIP': owner['FACILITY ZIP'],
+            'SERVICE CODE': services,
+            'SERVICE DESCRIPTION': [SERVICES[code] for code in services],
+            'SCORE': scores,
+            'GRADE': np.select([scores >= 90, scores >= 80, scores >= 70], ['A', 'B', 'C'], ' '),
+            'SERIAL NUMBER': [f"DA{number:08d}" for number in range(start, start + rows)],
+            'EMPLOYEE ID': [f"EE{number:07d}" for number in rng.integers(0, 500, rows)],
+            'Location': owner['Location'],
+            '2011 Supervisorial District Boundaries (Official)':
+                owner['2011 Supervisorial District Boundaries (Official)'],
+            'Census Tracts 2010': owner['Census Tracts 2010'],
+            'Board Approved Statistical Areas': owner['Board Approved Statistical Areas'],
+            'Zip Codes': owner['Zip Codes'],
+        })
+
+    @staticmethod
+    def score_weights():
+        """" returns the chance of each score from 60 to 100, most scores are in the nineties."""
+        weights = np.exp(-((np.arange(60, 101) - 93) / 5.0) ** 2)
+        return weights / weights.sum()
+
+    @staticmethod
+    def make_violations(rows, serials, rng):
+        """" returns the violations of random inspections out of the serials numbered 0 to serials."""
+        codes = rng.choice(VIOLATION_CODES, rows)
+        return pd.DataFrame({
+            'SERIAL NUMBER': [f"DA{number:08d}" for number in rng.integers(0, serials, rows)],
+            'VIOLATION  STATUS': 'OUT OF COMPLIANCE',
+            'VIOLATION CODE': codes,
+            'VIOLATION DESCRIPTION': [f"# {code[1:]}. VIOLATION {code}" for code in codes],
+            'POINTS': rng.choice([0, 1, 2, 4], rows, p=[0.2, 0.5, 0.2, 0.1]),
+        })
+
+    @staticmethod
+    def write_frame(data, filename, first):
+        """" writes the rows to the csv file, starting it with the header if this is the first part."""
+        data.to_csv(filename, mode='w' if first else 'a', header=first, index=False)
+
+    @staticmethod
+    def write_dataset(output_dir, violations, seed=0, chunk_size=DEFAULT_CHUNK_SIZE, duplicate_rate=0.01,
+                      missing_rate=0.01, inactive_rate=0.1):
+        """" writes the three csv files with about that many violations and returns their file names.
+
+        Rows are generated and written a chunk at a time so the size is not bounded by memory.
+        """
+        os.makedirs(output_dir, exist_ok=True)
+        rng = np.random.default_rng(seed)
+        filenames = {'violations': os.path.join(output_dir, 'violations.csv'),
+                     'inspections': os.path.join(output_dir, 'Inspections.csv'),
+                     'inventory': os.path.join(output_dir, 'Inventroy.csv')}
+        inspections = max(1, violations // VIOLATIONS_PER_INSPECTION)
+        inventory, inactive = SyntheticData.make_inventory(max(1, inspections // INSPECTIONS_PER_FACILITY), rng,
+                                                           inactive_rate)
+        SyntheticData.write_frame(SyntheticData.add_anomalies(inventory, rng, duplicate_rate, missing_rate,
+                                                              ['FACILITY NAME', 'OWNER ADDRESS']),
+                                  filenames['inventory'], True)
+        for start in range(0, inspections, chunk_size):
+            chunk = SyntheticData.make_inspections(start, min(chunk_size, inspections - start), inventory, inactive, rng)
+            chunk = SyntheticData.add_anomalies(chunk, rng, duplicate_rate, missing_rate, ['SCORE', 'EMPLOYEE ID'])
+            SyntheticData.write_frame(chunk, filenames['inspections'], start == 0)
+        for start in range(0, violations, chunk_size):
+            chunk = SyntheticData.make_violations(min(chunk_size, violations - start), inspections, rng)
+            chunk = SyntheticData.add_anomalies(chunk, rng, duplicate_rate, missing_rate, ['POINTS'])
+            SyntheticData.write_frame(chunk, filenames['violations'], start == 0)
+        return filenames
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write random data set csv files shaped like the real exports.")
+    parser.add_argument('output', help="directory the three csv files are written to")
+    parser.add_argument('--violations', type=int, default=100000, help="rows of violations, 10k to 50M")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help="rows generated at a time")
+    parser.add_argument('--duplicates', type=float, default=0.01, help="share of rows written twice")
+    parser.add_argument('--missing', type=float, default=0.01, help="share of rows with a missing value")
+    parser.add_argument('--inactive', type=float, default=0.1, help="share of facilities that are INACTIVE")
+    args = parser.parse_args()
+    for role, filename in SyntheticData.write_dataset(args.output, args.violations, args.seed, args.chunk_size,
+                                                      args.duplicates, args.missing, args.inactive).items():
+        print(f"{role}: {filename}")
+
+
+if __name__ == '__main__':
+    main()
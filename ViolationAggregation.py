@@ -0,0 +1,216 @@
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from Instrumentation import instrumented
+from KeyCodes import KeyCodes
+
+# rules grouping the violation codes into categories, as (category, kind, patterns). A 'prefix' rule
+# matches the start of the VIOLATION CODE and a 'keyword' rule any part of the VIOLATION DESCRIPTION.
+# The first rule a code matches gives its category, codes that match none are OTHER_CATEGORY.
+DEFAULT_HIERARCHY = [
+    ('TIME AND TEMPERATURE', 'keyword', ['TEMPERATURE', 'COOLING', 'COOKING', 'REHEATING', 'THAWING',
+                                         'THERMOMETER']),
+    ('EMPLOYEE HEALTH AND HYGIENE', 'keyword', ['HAND', 'HYGIENE', 'COMMUNICABLE', 'DISCHARGE', 'EATING',
+                                                'TOBACCO', 'PERSONAL CLEANLINESS', 'HAIR']),
+    ('PROTECTION FROM CONTAMINATION', 'keyword', ['CONTAMINAT', 'SEPARATED', 'ADULTERATED', 'SANITIZ', 'TOXIC',
+                                                  'RE-SERVICE', 'WASHING FRUITS', 'SELF-SERVICE']),
+    ('FOOD SOURCE AND LABELLING', 'keyword', ['APPROVED SOURCE', 'SHELL STOCK', 'OYSTER', 'LABEL', 'ADVISORY',
+                                              'HACCP', 'VARIANCE']),
+    ('VERMIN', 'keyword', ['RODENT', 'INSECT', 'VERMIN', 'ANIMAL', 'COCKROACH']),
+    ('WATER, PLUMBING AND WASTE', 'keyword', ['WATER', 'SEWAGE', 'PLUMBING', 'GARBAGE', 'REFUSE', 'TOILET']),
+    ('PREMISES AND EQUIPMENT', 'keyword', ['FLOOR', 'WALL', 'CEILING', 'EQUIPMENT', 'UTENSIL', 'WAREWASH',
+                                           'VENTILATION', 'LIGHTING', 'NONFOOD', 'LINEN', 'WIPING', 'PREMISES']),
+    ('PERMITS AND SUPERVISION', 'keyword', ['PERMIT', 'PLAN REVIEW', 'PERSON IN CHARGE', 'CERTIFICATION',
+                                            'KNOWLEDGE', 'SIGNS POSTED']),
+]
+OTHER_CATEGORY = 'OTHER'
+HIERARCHY_KINDS = ['prefix', 'keyword']
+# the column naming the groups of each level
+LEVELS = {'code': 'violation code', 'category': 'violation category', 'zip': 'zip area'}
+# facility by group cells marked in one array, beyond this the distinct pairs are found by sorting
+DENSE_CELLS = 50000000
+DEFAULT_MAX_ENTRIES = 4
+
+
+class ViolationAggregation(object):
+    """" counts the establishments that have committed each violation code, category of codes and zip code.
+
+    An establishment is a distinct FACILITY ID, found through the inspection of each violation.
+    The codes, facilities and categories are integer codes so each count is a bincount, and the
+    codes are put into categories once per distinct code rather than once per row. The counts of
+    every group are kept for each version of the data, so showing a different number of them or
+    the other level does not count again.
+    """
+
+    def __init__(self, hierarchy=None, max_entries=DEFAULT_MAX_ENTRIES):
+        self.hierarchy = DEFAULT_HIERARCHY if hierarchy is None else ViolationAggregation.check_hierarchy(hierarchy)
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+
+    @staticmethod
+    def check_hierarchy(hierarchy):
+        """" returns the rules of the hierarchy, raising a ValueError for a rule of an unknown kind."""
+        for category, kind, patterns in hierarchy:
+            if kind not in HIERARCHY_KINDS:
+                raise ValueError(f"the rule for {category} is {kind}, not one of {HIERARCHY_KINDS}")
+        return [(category, kind, [pattern.upper() for pattern in patterns]) for category, kind, patterns in hierarchy]
+
+    @staticmethod
+    def categorise(codes, descriptions, hierarchy):
+        """" returns the category of each violation code from the first rule of the hierarchy it matches."""
+        categories = []
+        for code, description in zip(codes, descriptions):
+            code = str(code).upper()
+            description = '' if pd.isna(description) else str(description).upper()
+            for category, kind, patterns in hierarchy:
+                if kind == 'prefix' and any(code.startswith(pattern) for pattern in patterns) or \
+                        kind == 'keyword' and any(pattern in description for pattern in patterns):
+                    categories.append(category)
+                    break
+            else:
+                categories.append(OTHER_CATEGORY)
+        return categories
+
+    @staticmethod
+    def column_codes(column):
+        """" returns the integer code of each row, -1 when it is missing, and the distinct values of the column."""
+        if hasattr(column, 'cat'):
+            return column.cat.codes.to_numpy(), column.cat.categories
+        return pd.factorize(column)
+
+    @staticmethod
+    def violation_codes(violations):
+        """" returns the code of each violation, -1 when it is missing, the distinct codes and their descriptions.
+
+        The description of a code is that of its first violation.
+        """
+        codes, values = ViolationAggregation.column_codes(violations['VIOLATION CODE'])
+        descriptions = np.full(len(values), None, dtype=object)
+        if 'VIOLATION DESCRIPTION' in violations.columns:
+            first = pd.Series(codes).drop_duplicates()
+            first = first[first.to_numpy() >= 0]
+            descriptions[first.to_numpy()] = violations['VIOLATION DESCRIPTION'].to_numpy(dtype=object)[
+                first.index.to_numpy()]
+        return codes, np.asarray(values, dtype=object), descriptions
+
+    @staticmethod
+    def violation_facilities(violations, inspections, violation_inspection=None):
+        """" returns the facility code of each violation, -1 without an inspection, and the number of facilities.
+
+        A violation belongs to the facility of the first inspection of its SERIAL NUMBER, as its zip
+        code does, so a SERIAL NUMBER shared by inspections of other facilities is counted once.
+        violation_inspection is the position of the inspection of each violation if it is already known.
+        """
+        if 'FACILITY ID' not in inspections.columns:
+            raise TypeError("the inspections have no FACILITY ID")
+        codes, facilities = ViolationAggregation.column_codes(inspections['FACILITY ID'])
+        if violation_inspection is None:
+            serial_codes, serial_values = ViolationAggregation.column_codes(violations['SERIAL NUMBER'])
+            # each distinct serial number is looked up once, then given to its violations by their codes
+            violation_inspection = np.append(KeyCodes.first_rows(inspections['SERIAL NUMBER'], serial_values),
+                                             -1)[serial_codes]
+        # the last entry is for the violations without an inspection
+        return np.append(codes, -1)[violation_inspection], len(facilities)
+
+    @staticmethod
+    def distinct_counts(groups, facilities, group_count, facility_count):
+        """" returns the number of distinct facilities in each group."""
+        valid = (groups >= 0) & (facilities >= 0)
+        keys = groups[valid].astype('int64') * facility_count + facilities[valid]
+        cells = group_count * facility_count
+        if cells <= DENSE_CELLS:
+            seen = np.zeros(cells, dtype=bool)
+            seen[keys] = True
+            cells = np.flatnonzero(seen)
+        else:
+            cells = np.unique(keys)
+        return np.bincount(cells // max(1, facility_count), minlength=group_count)
+
+    @staticmethod
+    @instrumented
+    def aggregate(violations, inspections, hierarchy=None, rows=None, violation_inspection=None):
+        """" returns the establishments and violations of every violation code, category and zip code with any.
+
+        rows are the positions of the violations to count, all of them if None. The result maps each
+        level to a frame of its groups, in no particular order.
+        """
+        hierarchy = DEFAULT_HIERARCHY if hierarchy is None else ViolationAggregation.check_hierarchy(hierarchy)
+        codes, values, descriptions = ViolationAggregation.violation_codes(violations)
+        facilities, facility_count = ViolationAggregation.violation_facilities(violations, inspections,
+                                                                               violation_inspection)
+        zips, zip_values = ViolationAggregation.column_codes(violations['Zip Codes']) \
+            if 'Zip Codes' in violations.columns else (np.full(len(violations), -1), np.arange(0))
+        if rows is not None:
+            codes, facilities, zips = codes[rows], facilities[rows], zips[rows]
+        categories, category_of_code = np.unique(ViolationAggregation.categorise(values, descriptions, hierarchy),
+                                                 return_inverse=True)
+        # a missing code stays missing through the last entry
+        category_of_code = np.append(category_of_code, -1)
+        groups = {'code': (codes, values, len(values)),
+                  'category': (category_of_code[codes], categories, len(categories)),
+                  'zip': (zips, np.asarray(zip_values), len(zip_values))}
+        result = {}
+        for level, (group_codes, names, size) in groups.items():
+            counts = pd.DataFrame({
+                LEVELS[level]: names,
+                'number of establishments': ViolationAggregation.distinct_counts(group_codes, facilities, size,
+                                                                                 facility_count),
+                'number of violations': np.bincount(group_codes[group_codes >= 0], minlength=size)})
+            if level == 'code':
+                counts[LEVELS['category']] = categories[category_of_code[:-1]]
+            result[level] = counts[counts['number of violations'] > 0].reset_index(drop=True)
+        return result
+
+    @staticmethod
+    def top(counts, number=None, by='number of establishments'):
+        """" returns the number groups with the highest counts, or every group, least first as the bar graph is.
+
+        Only the groups kept are sorted, the rest are set aside with a partition. A number of zero or
+        less keeps no groups.
+        """
+        if number is not None and number <= 0:
+            return counts.iloc[:0].reset_index(drop=True)
+        values = counts[by].to_numpy()
+        chosen = np.arange(len(values))
+        if number is not None and number < len(values):
+            chosen = np.argpartition(values, len(values) - number)[len(values) - number:]
+        return counts.iloc[chosen[np.argsort(values[chosen], kind='stable')]].reset_index(drop=True)
+
+    def get(self, version):
+        """" returns the counts of every group of the version, or None if they have not been aggregated."""
+        entry = self.entries.get(version)
+        if entry is not None:
+            self.entries.move_to_end(version)
+        return entry
+
+    def put(self, version, aggregate):
+        """" keeps the counts of every group of the version, such as those aggregated in a worker."""
+        self.entries[version] = aggregate
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+        return aggregate
+
+    def version_aggregate(self, version, violations, inspections, rows=None, violation_inspection=None):
+        """" returns the counts of every group of the version, aggregating them if they are not kept."""
+        aggregate = self.get(version)
+        if aggregate is None:
+            aggregate = self.put(version, ViolationAggregation.aggregate(violations, inspections, self.hierarchy,
+                                                                         rows, violation_inspection))
+        return aggregate
+
+    def counts(self, version, violations, inspections, level='code', number=None, rows=None,
+               violation_inspection=None):
+        """" returns the number of groups of the level with the most establishments, aggregating once per version."""
+        aggregate = self.version_aggregate(version, violations, inspections, rows, violation_inspection)
+        return ViolationAggregation.top(aggregate[level], number)
+
+    def set_hierarchy(self, hierarchy):
+        """" groups the codes with other rules, which needs every version to be aggregated again."""
+        self.hierarchy = ViolationAggregation.check_hierarchy(hierarchy)
+        self.clear()
+
+    def clear(self):
+        """" forgets the counts of every version."""
+        self.entries.clear()
@@ -0,0 +1,188 @@
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+try:
+    from scipy import stats
+except ImportError:  # without scipy only the permutation test gives p values
+    stats = None
+
+from Instrumentation import instrumented
+from KeyCodes import KeyCodes
+
+DEFAULT_PERMUTATIONS = 2000
+# values shuffled at a time by one batch of the permutation test
+BATCH_VALUES = 4000000
+# permutations drawn from one seed, a batch is a whole number of blocks so the batches do not change the draws
+PERMUTATION_BLOCK = 50
+
+
+class ZipAnalysis(object):
+    """" tests whether facilities in some zip codes commit more violations than facilities elsewhere.
+
+    Each facility is counted once per zip code it was inspected in, with the violations of those
+    inspections, including facilities without any. The zip codes are compared with a chi-square
+    test of the violations against the number of facilities in each zip code and with a
+    Kruskal-Wallis test of the violations per facility. Counts of violations are overdispersed so
+    both are also checked with a permutation test, which shuffles the zip codes between the
+    facilities a batch of permutations at a time as array operations.
+    """
+
+    @staticmethod
+    @instrumented
+    def facility_counts(violations, inspections):
+        """" returns the number of violations of each facility in each zip code it was inspected in.
+
+        This is the facility by zip code matrix kept as its nonzero cells, as a facility is nearly
+        always in a single zip code.
+        """
+        if 'Zip Codes' not in inspections.columns or 'SEAT NUMBERS' not in inspections.columns:
+            raise TypeError("inspections have not been cleaned")
+        facility_codes, facilities = pd.factorize(inspections['FACILITY ID'])
+        zip_codes, zips = pd.factorize(inspections['Zip Codes'])
+        valid = (facility_codes >= 0) & (zip_codes >= 0)
+        cells, cell_of_inspection = np.unique((facility_codes.astype('int64') * len(zips) + zip_codes)[valid],
+                                              return_inverse=True)
+        inspection_cell = np.full(len(inspections), -1)
+        inspection_cell[valid] = cell_of_inspection
+        # a violation belongs to the first inspection of its serial number, as its zip code does
+        positions = KeyCodes.first_rows(inspections['SERIAL NUMBER'], violations['SERIAL NUMBER'])
+        violation_cell = inspection_cell[positions[positions >= 0]]
+        counts = np.bincount(violation_cell[violation_cell >= 0], minlength=len(cells))
+        return pd.DataFrame({'FACILITY ID': KeyCodes.text(facilities)[cells // len(zips)],
+                             'Zip Codes': np.asarray(zips)[cells % len(zips)],
+                             'violations': counts})
+
+    @staticmethod
+    def zip_rates(facilities):
+        """" returns the facilities, violations and violations per facility of each zip code, highest rate first."""
+        grouped = facilities.groupby('Zip Codes', observed=True)['violations']
+        rates = pd.DataFrame({'facilities': grouped.size(), 'violations': grouped.sum(),
+                              'median per facility': grouped.median()})
+        rates['violations per facility'] = rates['violations'] / rates['facilities']
+        overall = facilities['violations'].sum() / len(facilities)
+        rates['rate ratio'] = rates['violations per facility'] / overall if overall else np.nan
+        rates = rates.reset_index().rename(columns={'Zip Codes': 'zip area'})
+        return rates.sort_values(by=['violations per facility'], ascending=False).reset_index(drop=True)
+
+    @staticmethod
+    def average_ranks(values):
+        """" returns the ranks of the values with ties given their average rank, and the tie correction."""
+        _, inverse, ties = np.unique(values, return_inverse=True, return_counts=True)
+        ranks = (np.cumsum(ties) - (ties - 1) / 2)[inverse]
+        size = len(values)
+        correction = 1 - (ties.astype('float64') ** 3 - ties).sum() / (float(size) ** 3 - size) if size > 1 else 1
+        return ranks, correction
+
+    @staticmethod
+    def group_statistics(group_counts, group_ranks, sizes, expected, correction):
+        """" returns the chi-square and Kruskal-Wallis statistics from the sums of each group.
+
+        The sums can have a leading axis of permutations.
+        """
+        total = sizes.sum()
+        chi_square = ((group_counts - expected) ** 2 / expected).sum(axis=-1)
+        kruskal_wallis = 12 / (total * (total + 1)) * (group_ranks ** 2 / sizes).sum(axis=-1) - 3 * (total + 1)
+        # every facility with the same count leaves nothing to rank
+        return chi_square, kruskal_wallis / correction if correction > 0 else np.full_like(kruskal_wallis, np.nan)
+
+    @staticmethod
+    def permutation_batch(labels, counts, ranks, groups, sizes, seeds):
+        """" returns the group sums of the counts and ranks for blocks of random shuffles of the labels.
+
+        Each block shuffles the labels its size times with the generator of its seed.
+        """
+        shuffled = np.concatenate([np.random.default_rng(seed).permuted(np.tile(labels, (size, 1)), axis=1)
+                                   for size, seed in zip(sizes, seeds)])
+        permutations = len(shuffled)
+        # each permutation gets its own range of bins so one bincount sums them all
+        keys = (shuffled + (np.arange(permutations) * groups)[:, None]).ravel()
+        size = permutations * groups
+        group_counts = np.bincount(keys, weights=np.tile(counts, permutations), minlength=size)
+        group_ranks = np.bincount(keys, weights=np.tile(ranks, permutations), minlength=size)
+        return group_counts.reshape(permutations, groups), group_ranks.reshape(permutations, groups)
+
+    @staticmethod
+    @instrumented
+    def permutation_test(labels, counts, ranks, groups, permutations, seed=0, workers=1, batch=None):
+        """" returns the group sums of the counts and ranks for each permutation.
+
+        The permutations are drawn in blocks of PERMUTATION_BLOCK with seeds of their own and the
+        blocks are run a batch at a time, of batch permutations or as many as shuffle BATCH_VALUES
+        values. The result is the same whatever the batches and whether they run here or over a pool
+        of worker processes.
+        """
+        batch = max(1, BATCH_VALUES // max(1, len(labels))) if batch is None else batch
+        blocks = [min(PERMUTATION_BLOCK, permutations - start) for start in range(0, permutations, PERMUTATION_BLOCK)]
+        seeds = np.random.SeedSequence(seed).spawn(len(blocks))
+        step = max(1, batch // PERMUTATION_BLOCK)
+        batches = [(labels, counts, ranks, groups, blocks[start:start + step], seeds[start:start + step])
+                   for start in range(0, len(blocks), step)]
+        if workers == 1 or len(batches) == 1:
+            results = [ZipAnalysis.permutation_batch(*arguments) for arguments in batches]
+        else:
+            with ProcessPoolExecutor(workers) as executor:
+                results = list(executor.map(ZipAnalysis.permutation_batch, *zip(*batches)))
+        if not results:
+            return np.zeros((0, groups)), np.zeros((0, groups))
+        return np.concatenate([result[0] for result in results]), np.concatenate([result[1] for result in results])
+
+    @staticmethod
+    @instrumented
+    def analyse(violations, inspections, permutations=DEFAULT_PERMUTATIONS, seed=0, workers=1, batch=None):
+        """" returns the violations per facility of each zip code and whether they differ significantly.
+
+        The result holds the facility counts, the zip code rates, a table of the statistics and the
+        statistics of every permutation, which is what draw_figure plots.
+        """
+        facilities = ZipAnalysis.facility_counts(violations, inspections)
+        labels, zips = pd.factorize(facilities['Zip Codes'])
+        counts = facilities['violations'].to_numpy(dtype='float64')
+        groups = len(zips)
+        sizes = np.bincount(labels, minlength=groups).astype('float64')
+        expected = counts.sum() * sizes / sizes.sum() if len(sizes) else sizes
+        ranks, correction = ZipAnalysis.average_ranks(counts)
+        observed = ZipAnalysis.group_statistics(np.bincount(labels, weights=counts, minlength=groups),
+                                                np.bincount(labels, weights=ranks, minlength=groups),
+                                                sizes, expected, correction)
+        if permutations > 0 and groups > 1:
+            null = ZipAnalysis.group_statistics(
+                *ZipAnalysis.permutation_test(labels, counts, ranks, groups, permutations, seed, workers, batch),
+                sizes, expected, correction)
+        else:
+            null = (np.arange(0.0), np.arange(0.0))
+        rows = []
+        for name, statistic, permuted in zip(['chi-square', 'Kruskal-Wallis'], observed, null):
+            asymptotic = stats.chi2.sf(statistic, groups - 1) if stats is not None and groups > 1 else np.nan
+            rows.append({'test': name, 'statistic': statistic, 'degrees of freedom': groups - 1,
+                         'p value': asymptotic,
+                         'permutation p value': (1 + (permuted >= statistic).sum()) / (1 + len(permuted))
+                         if len(permuted) else np.nan})
+        return {'facilities': facilities, 'rates': ZipAnalysis.zip_rates(facilities),
+                'statistics': pd.DataFrame(rows), 'permutations': {'chi-square': null[0], 'Kruskal-Wallis': null[1]}}
+
+    @staticmethod
+    def draw_figure(result, figure, number=30):
+        """" plots the violations per facility of the zip codes with the highest rates and the permutation test."""
+        rates = result['rates']
+        ax = figure.add_subplot(1, 2, 1)
+        top = rates.head(number)
+        ax.bar(top['zip area'].astype(str), top['violations per facility'])
+        overall = rates['violations'].sum() / max(1, rates['facilities'].sum())
+        ax.axhline(overall, color='black', linestyle='--', label='all zip codes')
+        ax.set_xlabel('zip area')
+        ax.set_ylabel('violations per facility')
+        ax.tick_params(axis='x', labelrotation=90)
+        ax.legend()
+        ax = figure.add_subplot(1, 2, 2)
+        permuted = result['permutations']['Kruskal-Wallis']
+        observed = result['statistics'].set_index('test').loc['Kruskal-Wallis', 'statistic']
+        if len(permuted):
+            ax.hist(permuted, bins=50, color='grey', label='shuffled zip codes')
+        ax.axvline(observed, color='red', label='observed')
+        ax.set_xlabel('Kruskal-Wallis statistic')
+        ax.set_ylabel('permutations')
+        ax.legend()
+        figure.tight_layout()
+        return figure
@@ -0,0 +1,18 @@
+import os
+import sys
+
+import pytest
+
+# the modules of the application sit at the top of the repository rather than in a package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope='session')
+def cleaned_dataset(tmp_path_factory):
+    """" a cleaned synthetic data set, shared by the tests that only read it."""
+    from DataController import DataController
+    from SyntheticData import SyntheticData
+    files = SyntheticData.write_dataset(tmp_path_factory.mktemp('cleaned'), 3000, seed=13)
+    dataset = [DataController.read_csv_to_frame(files[name])[1] for name in ['violations', 'inspections', 'inventory']]
+    dataset[0] = dataset[0].set_index('SERIAL NUMBER')
+    return DataController.clean_dataset(dataset)
@@ -0,0 +1,11 @@
+import pytest
+
+pytest.importorskip('seaborn')
+
+from BatchRunner import BatchRunner  # noqa: E402
+
+
+def test_data_sets_with_the_same_name_get_their_own_output():
+    names = BatchRunner.output_names(['2019/data', '2020/data/', 'data-2', '2021/data'])
+
+    assert names == ['data', 'data-2', 'data-2-2', 'data-3']
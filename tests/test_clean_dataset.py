@@ -0,0 +1,65 @@
+import pandas as pd
+import pytest
+
+from DataController import DataController
+from DataStream import DataStream
+from SyntheticData import SyntheticData
+
+NAMES = ['violations', 'inspections', 'inventory']
+
+
+@pytest.fixture
+def repeated_serials(tmp_path):
+    """" writes an export where two serial numbers have a second inspection, one in another zip code, one INACTIVE.
+
+    Returns the files and the two serial numbers.
+    """
+    files = SyntheticData.write_dataset(tmp_path, 2000, seed=11, inactive_rate=0.0)
+    violations, inspections = pd.read_csv(files['violations']), pd.read_csv(files['inspections'])
+    moved, inactive = violations['SERIAL NUMBER'].drop_duplicates().iloc[:2]
+    repeats = inspections[inspections['SERIAL NUMBER'].isin([moved, inactive])].copy()
+    repeats.loc[repeats['SERIAL NUMBER'].eq(moved), 'Zip Codes'] += 1
+    repeats.loc[repeats['SERIAL NUMBER'].eq(inactive), 'PROGRAM STATUS'] = 'INACTIVE'
+    pd.concat([inspections, repeats]).to_csv(files['inspections'], index=False)
+    return files, moved, inactive
+
+
+def clean(files):
+    dataset = [DataController.read_csv_to_frame(files[name])[1] for name in NAMES]
+    dataset[0] = dataset[0].set_index('SERIAL NUMBER')
+    return DataController.clean_dataset(dataset, compact=False)
+
+
+def test_violations_take_the_first_inspection_of_their_serial_number(repeated_serials):
+    files, moved, _ = repeated_serials
+    violations, inspections, _ = clean(files)
+    source = pd.read_csv(files['violations'])
+    zips = inspections.loc[inspections['SERIAL NUMBER'].eq(moved), 'Zip Codes']
+
+    assert len(zips) == 2
+    # each violation is kept once, with the zip code of the first inspection
+    assert (violations['SERIAL NUMBER'] == moved).sum() == (source['SERIAL NUMBER'] == moved).sum()
+    assert (violations.loc[violations['SERIAL NUMBER'].eq(moved), 'Zip Codes'] == zips.iloc[0]).all()
+
+
+def test_an_inactive_inspection_takes_out_the_violations_of_its_serial_number(repeated_serials):
+    files, _, inactive = repeated_serials
+    violations, inspections, _ = clean(files)
+
+    assert not violations['SERIAL NUMBER'].eq(inactive).any()
+    # the ACTIVE inspection itself is kept, as only INACTIVE rows are removed
+    assert inspections['SERIAL NUMBER'].eq(inactive).sum() == 1
+
+
+def test_streaming_cleans_repeated_serial_numbers_the_same_way(repeated_serials):
+    files, _, _ = repeated_serials
+    expected = clean(files)[0]
+    chunks = []
+    DataStream.stream_dataset(list(files.values()), chunk_size=500,
+                              sink=lambda chunk, name, first: chunks.append(chunk) if name == 'violations' else None)
+    streamed = pd.concat(chunks)
+
+    keys = ['SERIAL NUMBER', 'VIOLATION CODE', 'POINTS']
+    pd.testing.assert_frame_equal(
+        expected.astype(object).sort_values(keys).reset_index(drop=True),
+        streamed.astype(object)[list(expected.columns)].sort_values(keys).reset_index(drop=True))
@@ -0,0 +1,109 @@
+import pandas as pd
+import pytest
+
+from DataAppend import DataAppend
+from DataController import DataController
+from KeyCodes import KeyCodes
+from SyntheticData import SyntheticData
+
+KEYS = [['SERIAL NUMBER', 'VIOLATION CODE', 'POINTS'], ['SERIAL NUMBER'], ['FACILITY ID']]
+
+
+def load(directory):
+    """" reads and cleans the three csv files of the directory as loading them in the GUI does."""
+    dataset = [DataController.read_csv_to_frame(directory / f"{name}.csv")[1]
+               for name in ['violations', 'inspections', 'inventory']]
+    dataset[0] = dataset[0].set_index('SERIAL NUMBER')
+    return DataController.clean_dataset(dataset)
+
+
+def write(directory, violations, inspections, inventory=None):
+    directory.mkdir()
+    violations.to_csv(directory / 'violations.csv', index=False)
+    inspections.to_csv(directory / 'inspections.csv', index=False)
+    if inventory is not None:
+        inventory.to_csv(directory / 'inventory.csv', index=False)
+
+
+def same_rows(expected, actual, keys):
+    """" compares the tables as rows of plain values, in the order of their keys."""
+    expected = expected.astype(object).sort_values(keys).reset_index(drop=True)
+    actual = actual.astype(object)[list(expected.columns)].sort_values(keys).reset_index(drop=True)
+    pd.testing.assert_frame_equal(expected, actual)
+
+
+@pytest.fixture
+def exports(tmp_path):
+    """" writes a synthetic export split by serial number into an earlier export and the rows added since.
+
+    A facility that was ACTIVE in the earlier export has its new inspections INACTIVE.
+    """
+    files = SyntheticData.write_dataset(tmp_path / 'source', 3000, seed=3, inactive_rate=0.2)
+    violations, inspections, inventory = [pd.read_csv(files[name]) for name in
+                                          ['violations', 'inspections', 'inventory']]
+    cut = inspections['SERIAL NUMBER'].str[2:].astype(int).max() // 2
+    old = inspections['SERIAL NUMBER'].str[2:].astype(int) < cut
+    old_violations = violations['SERIAL NUMBER'].str[2:].astype(int) < cut
+    facility = inspections.loc[old & inspections['PROGRAM STATUS'].eq('ACTIVE'), 'FACILITY ID'].iloc[0]
+    inspections.loc[~old & inspections['FACILITY ID'].eq(facility), 'PROGRAM STATUS'] = 'INACTIVE'
+    write(tmp_path / 'old', violations[old_violations], inspections[old], inventory)
+    write(tmp_path / 'new', violations[~old_violations], inspections[~old])
+    write(tmp_path / 'full', violations, inspections, inventory)
+    return tmp_path, facility
+
+
+def test_append_matches_cleaning_every_export(exports):
+    directory, facility = exports
+    full = load(directory / 'full')
+    old = load(directory / 'old')
+    delta = DataAppend.read_delta([directory / 'new' / 'violations.csv', directory / 'new' / 'inspections.csv'])
+    appended = DataAppend.merge_delta(old, DataAppend.clean_delta(old, delta))
+
+    for expected, actual, keys in zip(full, appended, KEYS):
+        same_rows(expected, actual, keys)
+    # the earlier ACTIVE inspections of the facility are kept, its inventory is not
+    assert (KeyCodes.text(appended[1]['FACILITY ID']) == facility).any()
+    assert not (KeyCodes.text(appended[2]['FACILITY ID']) == facility).any()
+
+
+def test_appending_rows_already_loaded_adds_nothing(exports):
+    directory, _ = exports
+    full = load(directory / 'full')
+    delta = DataAppend.read_delta([directory / 'new' / 'violations.csv', directory / 'new' / 'inspections.csv'])
+    changes = DataAppend.clean_delta(full, delta)
+
+    assert DataAppend.summary(changes)['inspections'] == {'added': 0, 'removed': 0}
+    assert DataAppend.summary(changes)['violations'] == {'added': 0, 'removed': 0}
+
+
+def test_an_inactive_inspection_of_a_loaded_serial_removes_its_violations(exports):
+    directory, _ = exports
+    old_violations, old_inspections = [pd.read_csv(directory / 'old' / f"{name}.csv")
+                                       for name in ['violations', 'inspections']]
+    new_violations, new_inspections = [pd.read_csv(directory / 'new' / f"{name}.csv")
+                                       for name in ['violations', 'inspections']]
+    inventory = pd.read_csv(directory / 'full' / 'inventory.csv')
+    # an ACTIVE inspection already loaded is exported again as INACTIVE, with violations of its own
+    active = old_inspections['PROGRAM STATUS'].eq('ACTIVE') & \
+        old_inspections['SERIAL NUMBER'].isin(old_violations['SERIAL NUMBER'])
+    inspection = old_inspections[active].iloc[[0]].assign(**{'PROGRAM STATUS': 'INACTIVE'})
+    serial = inspection['SERIAL NUMBER'].iloc[0]
+    new_inspections = pd.concat([new_inspections, inspection], ignore_index=True)
+    late = old_violations[old_violations['SERIAL NUMBER'].eq(serial)].assign(**{'VIOLATION CODE': 'F999'})
+    new_violations = pd.concat([new_violations, late], ignore_index=True)
+    write(directory / 'new inactive', new_violations, new_inspections)
+    write(directory / 'full inactive', pd.concat([old_violations, new_violations]),
+          pd.concat([old_inspections, new_inspections]), inventory)
+
+    full = load(directory / 'full inactive')
+    old = load(directory / 'old')
+    delta = DataAppend.read_delta([directory / 'new inactive' / 'violations.csv',
+                                   directory / 'new inactive' / 'inspections.csv'])
+    changes = DataAppend.clean_delta(old, delta)
+    appended = DataAppend.merge_delta(old, changes)
+
+    loaded = (KeyCodes.text(old[0]['SERIAL NUMBER']) == serial).sum()
+    assert loaded and DataAppend.summary(changes)['violations']['removed'] == loaded
+    assert not (KeyCodes.text(appended[0]['SERIAL NUMBER']) == serial).any()
+    for expected, actual, keys in zip(full, appended, KEYS):
+        same_rows(expected, actual, keys)
@@ -0,0 +1,51 @@
+import os
+
+import pandas as pd
+import pytest
+
+from DataCache import DataCache
+
+pytest.importorskip('pyarrow')
+
+
+@pytest.fixture
+def sources(tmp_path):
+    files = []
+    for name in ['violations', 'inspections', 'inventory']:
+        path = tmp_path / f"{name}.csv"
+        path.write_text(f"{name}\n1\n")
+        files.append(str(path))
+    return files
+
+
+def test_snapshot_is_read_back_with_its_layout(cleaned_dataset, sources, tmp_path):
+    DataCache.save_snapshot(cleaned_dataset, sources, tmp_path / 'cache')
+
+    loaded = DataCache.load_snapshot(sources, tmp_path / 'cache')
+
+    for expected, actual in zip(cleaned_dataset, loaded):
+        pd.testing.assert_frame_equal(expected.reset_index(drop=True), actual)
+
+
+def test_snapshot_is_found_whatever_the_order_of_the_files(cleaned_dataset, sources, tmp_path):
+    DataCache.save_snapshot(cleaned_dataset, sources, tmp_path / 'cache')
+
+    assert DataCache.load_snapshot(sources[::-1], tmp_path / 'cache') is not None
+
+
+def test_changed_source_file_has_no_snapshot(cleaned_dataset, sources, tmp_path):
+    DataCache.save_snapshot(cleaned_dataset, sources, tmp_path / 'cache')
+    with open(sources[1], 'a') as outFile:
+        outFile.write("2\n")
+
+    assert DataCache.load_snapshot(sources, tmp_path / 'cache') is None
+
+
+def test_a_new_snapshot_replaces_the_older_ones(cleaned_dataset, sources, tmp_path):
+    first = DataCache.save_snapshot(cleaned_dataset, sources, tmp_path / 'cache')
+    with open(sources[0], 'a') as outFile:
+        outFile.write("2\n")
+    second = DataCache.save_snapshot(cleaned_dataset, sources, tmp_path / 'cache')
+
+    assert first != second
+    assert os.listdir(tmp_path / 'cache') == [second]
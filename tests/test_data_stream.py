@@ -0,0 +1,49 @@
+import numpy as np
+import pandas as pd
+
+from DataController import DataController
+from DataStream import BoundedHashSet, DataStream, SpilledKeys
+from SyntheticData import SyntheticData
+
+KEYS = [['SERIAL NUMBER', 'VIOLATION CODE', 'POINTS'], ['SERIAL NUMBER'], ['FACILITY ID']]
+
+
+def test_hash_set_drops_repeated_hashes():
+    seen = BoundedHashSet(100)
+    assert seen.add_new(np.array([5, 3, 5, 7], dtype='uint64')).tolist() == [True, True, False, True]
+    assert seen.add_new(np.array([7, 9, 3, 9], dtype='uint64')).tolist() == [False, True, False, False]
+    assert len(seen) == 4
+
+
+def test_hash_set_forgets_the_oldest_generation():
+    seen = BoundedHashSet(8)
+    for start in range(0, 40, 2):
+        seen.add_new(np.arange(start, start + 2, dtype='uint64'))
+        assert len(seen) <= 8 + seen.generation_size
+    assert seen.add_new(np.array([0, 39], dtype='uint64')).tolist() == [True, False]
+
+
+def test_spilled_keys_keep_the_first_value(tmp_path):
+    keys = SpilledKeys(str(tmp_path), 'zips', buffer_size=3)
+    keys.add(pd.Series(['a', 'b', 'c']), [1, 2, 3])
+    keys.add(pd.Series(['b', 'd']), [4, 5])
+    keys.add(pd.Series(['d']), [6])
+    values, found = keys.lookup(pd.Series(['a', 'b', 'd', 'e']))
+    assert found.tolist() == [True, True, True, False]
+    assert values[found].tolist() == [1, 2, 5]
+    assert keys.contains(pd.Series(['c', 'x'])).tolist() == [True, False]
+
+
+def test_stream_matches_clean_dataset(tmp_path):
+    files = SyntheticData.write_dataset(tmp_path, 3000, seed=5, inactive_rate=0.2)
+    dataset = [DataController.read_csv_to_frame(files[name])[1] for name in ['violations', 'inspections', 'inventory']]
+    dataset[0] = dataset[0].set_index('SERIAL NUMBER')
+    expected = DataController.clean_dataset(dataset, compact=False)
+    chunks = {}
+    DataStream.stream_dataset(list(files.values()), chunk_size=500,
+                              sink=lambda chunk, name, first: chunks.setdefault(name, []).append(chunk))
+    streamed = [pd.concat(chunks[name]) for name in ['violations', 'inspections', 'inventory']]
+    for keys, data, frame in zip(KEYS, expected, streamed):
+        data = data.astype(object).sort_values(keys).reset_index(drop=True)
+        frame = frame.astype(object)[list(data.columns)].sort_values(keys).reset_index(drop=True)
+        pd.testing.assert_frame_equal(data, frame)
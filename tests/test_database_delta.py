@@ -0,0 +1,91 @@
+import pandas as pd
+import pytest
+
+import DatabaseController as database
+from DatabaseController import DatabaseController
+
+mongomock = pytest.importorskip('mongomock')
+
+
+@pytest.fixture(autouse=True)
+def client(monkeypatch):
+    """" stands in for the database with an in memory client."""
+    monkeypatch.setattr(database, '_client', mongomock.MongoClient())
+
+
+def test_applying_a_delta_again_does_not_duplicate_rows():
+    collection = DatabaseController.get_collection('violations')
+    collection.insert_one({'SERIAL NUMBER': 'DA0', 'VIOLATION CODE': 'F001', 'POINTS': 1})
+    added = pd.DataFrame({'SERIAL NUMBER': pd.Categorical(['DA1', 'DA1', 'DA2']),
+                          'VIOLATION CODE': ['F001', 'F002', 'F001'], 'POINTS': [1, 2, 3]})
+
+    assert DatabaseController.apply_delta(added, 'violations')
+    assert DatabaseController.apply_delta(added, 'violations')
+
+    assert collection.count_documents({}) == 4
+    assert collection.count_documents({'SERIAL NUMBER': 'DA1'}) == 2
+
+
+def test_removed_values_are_deleted():
+    collection = DatabaseController.get_collection('inventory')
+    DatabaseController.apply_delta(pd.DataFrame({'FACILITY ID': ['FA1', 'FA2']}), 'inventory')
+    DatabaseController.apply_delta(pd.DataFrame({'FACILITY ID': ['FA3']}), 'inventory', 'FACILITY ID', ['FA1'])
+
+    assert sorted(collection.distinct('FACILITY ID')) == ['FA2', 'FA3']
+
+
+def test_binary_save_is_read_back_in_block_order():
+    pytest.importorskip('pyarrow')
+    data = pd.DataFrame({'FACILITY ID': [f"FA{number}" for number in range(25)], 'SCORE': range(25)})
+    DatabaseController.replace_collection(data, 'inventory', batch_size=10, binary=True)
+    collection = DatabaseController.get_collection('inventory')
+
+    assert 'block' in collection.index_information()
+    assert DatabaseController.read_collection('inventory')['SCORE'].tolist() == list(range(25))
+    assert DatabaseController.get_client()[database.DATABASE_NAME].list_collection_names() == ['inventory']
+
+
+def test_failed_save_drops_its_staging_collection():
+    DatabaseController.replace_collection(pd.DataFrame({'FACILITY ID': ['FA1']}), 'inventory')
+
+    def stop(fraction, message):
+        if fraction > 0:
+            raise InterruptedError(message)
+
+    with pytest.raises(InterruptedError):
+        DatabaseController.replace_collection(pd.DataFrame({'FACILITY ID': ['FA2', 'FA3']}), 'inventory',
+                                              batch_size=1, progress=stop)
+    assert DatabaseController.get_client()[database.DATABASE_NAME].list_collection_names() == ['inventory']
+    assert DatabaseController.get_collection('inventory').distinct('FACILITY ID') == ['FA1']
+
+
+def test_every_write_creates_the_aggregation_indexes():
+    chunk = pd.DataFrame({'SERIAL NUMBER': ['DA1'], 'VIOLATION CODE': ['F001'], 'Zip Codes': [90001]})
+    DatabaseController.append_collection(chunk, 'violations', drop=True)
+    DatabaseController.apply_delta(chunk.assign(**{'SERIAL NUMBER': 'DA2'}), 'inspections')
+    DatabaseController.update_collection(chunk.assign(**{'SERIAL NUMBER': 'DA3'}), 'violations')
+
+    for choice in ['violations', 'inspections']:
+        names = DatabaseController.get_collection(choice).index_information()
+        assert {f"{' '.join(keys)} aggregation" for keys in database.AGGREGATION_INDEXES[choice]} <= set(names)
+
+
+def test_saving_the_data_set_as_binary_and_back_to_documents():
+    pytest.importorskip('pyarrow')
+    from DataController import DataController
+    from KeyCodes import KeyCodes
+    data = pd.DataFrame({'FACILITY ID': KeyCodes.pack(['FA0000001', 'FA0000002']), 'SCORE': [91, 85]})
+    collection = DatabaseController.get_collection('inventory')
+
+    DataController.replace_database_collection(data, 'inventory', binary=True)
+    assert collection.count_documents({'arrow': {'$exists': True}}) == 1
+    assert DatabaseController.read_collection('inventory')['FACILITY ID'].tolist() == ['FA0000001', 'FA0000002']
+
+    DataController.update_database_collection(data.assign(SCORE=[92, 85]), 'inventory', binary=True)
+    assert collection.count_documents({'arrow': {'$exists': True}}) == 1
+    assert DatabaseController.read_collection('inventory')['SCORE'].tolist() == [92, 85]
+
+    # a save without binary turns the blocks back into a document per row
+    DataController.update_database_collection(data, 'inventory')
+    assert collection.count_documents({'arrow': {'$exists': True}}) == 0
+    assert sorted(collection.distinct('FACILITY ID')) == ['FA0000001', 'FA0000002']
@@ -0,0 +1,85 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from DataController import DataController
+from DatasetIndex import DatasetIndex
+
+
+@pytest.fixture(scope='module')
+def cleaned(cleaned_dataset):
+    violations, inspections, _ = cleaned_dataset
+    return violations, inspections, DatasetIndex(violations, inspections)
+
+
+FILTERS = [
+    {},
+    {'start': '2016-01-01', 'end': '2016-12-31'},
+    {'zip_codes': [23524, 24462, 24608]},
+    {'seating': ['0-30'], 'score_range': (90, 100)},
+    {'start': '2016-06-01', 'zip_codes': [23524, 23232, 24109], 'seating': ['61-150', '151 +']},
+    {'end': '2014-01-01'},
+    {'zip_codes': [12345]},
+]
+
+
+def inspection_mask(inspections, start=None, end=None, zip_codes=None, seating=None, score_range=None):
+    """" the filter as a boolean mask over the inspections."""
+    mask = np.ones(len(inspections), dtype=bool)
+    if start is not None:
+        mask &= inspections['ACTIVITY DATE'] >= pd.Timestamp(start)
+    if end is not None:
+        mask &= inspections['ACTIVITY DATE'] <= pd.Timestamp(end)
+    if zip_codes is not None:
+        mask &= inspections['Zip Codes'].isin(zip_codes)
+    if seating is not None:
+        mask &= inspections['SEAT NUMBERS'].isin(seating)
+    if score_range is not None:
+        mask &= inspections['SCORE'].between(*score_range)
+    return np.asarray(mask)
+
+
+@pytest.mark.parametrize('filters', FILTERS)
+def test_inspection_filters_match_a_mask(cleaned, filters):
+    _, inspections, index = cleaned
+
+    positions = index.filter_inspections(**filters)
+
+    assert positions.tolist() == np.flatnonzero(inspection_mask(inspections, **filters)).tolist()
+
+
+@pytest.mark.parametrize('filters', FILTERS)
+def test_violation_filters_match_a_mask(cleaned, filters):
+    violations, inspections, index = cleaned
+    codes = violations['VIOLATION CODE'].astype(object).value_counts().index[:3].tolist()
+    serials = inspections['SERIAL NUMBER'][inspection_mask(inspections, **filters)]
+
+    positions = index.filter_violations(index.filter_inspections(**filters), codes)
+
+    expected = violations['SERIAL NUMBER'].isin(serials) & violations['VIOLATION CODE'].isin(codes)
+    assert positions.tolist() == np.flatnonzero(expected.to_numpy()).tolist()
+
+
+def test_counts_of_every_violation_match_the_data_controller(cleaned):
+    violations, _, index = cleaned
+    positions = index.filter_violations()
+
+    expected = DataController.violation_code_counts(violations, 5)
+    actual = index.violation_code_counts(positions, 5)
+    assert actual.set_index('violation code')['number of violations'].to_dict() == \
+        expected.set_index('violation code')['number of violations'].to_dict()
+
+
+def test_violations_of_a_repeated_serial_follow_its_first_inspection():
+    inspections = pd.DataFrame({
+        'SERIAL NUMBER': ['DA0000001', 'DA0000002', 'DA0000001'],
+        'ACTIVITY DATE': pd.to_datetime(['2017-01-05', '2017-02-05', '2018-03-05']),
+        'SCORE': [91, 85, 72], 'Zip Codes': [90001, 90002, 90003], 'SEAT NUMBERS': ['0-30', '0-30', '31-60']})
+    violations = pd.DataFrame({'SERIAL NUMBER': ['DA0000001', 'DA0000002', 'DA0000001', 'DA0000009'],
+                               'VIOLATION CODE': ['F030', 'F031', 'F032', 'F030'],
+                               'Zip Codes': [90001, 90002, 90001, 90004]})
+    index = DatasetIndex(violations, DataController.compact_frame(inspections))
+
+    assert index.violation_inspection.tolist() == [0, 1, 0, -1]
+    assert index.filter_violations(index.filter_inspections(end='2017-12-31')).tolist() == [0, 1, 2]
+    assert index.filter_violations(index.filter_inspections(start='2018-01-01')).tolist() == []
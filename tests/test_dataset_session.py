@@ -0,0 +1,97 @@
+import gc
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from DatasetSession import DatasetSession, NoDatasetError
+
+pytest.importorskip('pyarrow')
+
+
+def make_dataset(rows=20000):
+    violations = pd.DataFrame({'SERIAL NUMBER': [f"DA{number % 5000:08d}" for number in range(rows)],
+                               'POINTS': np.arange(rows) % 4}).set_index('SERIAL NUMBER')
+    inspections = pd.DataFrame({'SERIAL NUMBER': [f"DA{number:08d}" for number in range(rows)],
+                                'SCORE': np.arange(rows) % 40 + 60,
+                                'GRADE': pd.Categorical(np.array(list('ABC'))[np.arange(rows) % 3])})
+    inventory = pd.DataFrame({'FACILITY ID': [f"FA{number:07d}" for number in range(rows // 10)]})
+    return [violations, inspections, inventory]
+
+
+@pytest.fixture
+def session(tmp_path):
+    session = DatasetSession(spill_dir=str(tmp_path))
+    yield session
+    session.close()
+
+
+def test_spilled_tables_read_back_the_same(session):
+    dataset = make_dataset()
+    session.set_dataset(dataset)
+    session.set_budget(0)
+
+    assert session.memory_report()[2] == ['violations', 'inspections', 'inventory']
+    assert session.memory_used() == 0
+    for name, data in zip(['violations', 'inspections', 'inventory'], dataset):
+        pd.testing.assert_frame_equal(session.view(name), data)
+
+
+def test_views_keep_their_table_counted(session):
+    session.set_dataset(make_dataset())
+    session.set_budget(0)
+    view = session.view('inspections')
+    used = session.memory_used()
+
+    assert used >= session.sizes['inspections']
+    assert 'inspections' in session.tables
+    del view
+    gc.collect()
+    session.enforce_budget()
+    assert session.memory_used() < used
+    assert 'inspections' not in session.tables
+
+
+def test_views_read_columns_without_loading(session):
+    dataset = make_dataset()
+    session.set_dataset(dataset)
+    session.set_budget(0)
+    violations, inspections = session.views(['violations', 'inspections'],
+                                            {'violations': ['POINTS'], 'inspections': ['SCORE']})
+
+    assert session.memory_report()[2] == ['violations', 'inspections', 'inventory']
+    pd.testing.assert_frame_equal(violations, dataset[0][['POINTS']])
+    pd.testing.assert_frame_equal(inspections, dataset[1][['SCORE']])
+    with pytest.raises(KeyError):
+        session.view('inventory', ['SCORE'], load=False)
+
+
+def test_sources_are_files_for_a_process(session):
+    dataset = make_dataset()
+    session.set_dataset(dataset)
+    sources = session.sources(reserve=True)
+
+    assert all(isinstance(source, tuple) for source in sources)
+    for source, data in zip(sources, dataset):
+        pd.testing.assert_frame_equal(DatasetSession.read_source(source), data)
+    # the tables are in their files, so a thread is given the ones still in memory themselves
+    session.load('inventory')
+    assert isinstance(session.sources(['inventory'], thread=True)[0], pd.DataFrame)
+
+
+def test_a_new_version_drops_the_old_files(session, tmp_path):
+    session.set_dataset(make_dataset())
+    session.set_budget(0)
+    assert len(list(tmp_path.iterdir())) == 3
+    session.set_dataset(make_dataset(100))
+
+    assert session.version == 2
+    assert len(list(tmp_path.iterdir())) == 3
+    assert len(session.view('inventory')) == 10
+
+
+def test_no_dataset(session):
+    with pytest.raises(NoDatasetError):
+        session.view('violations')
+    with pytest.raises(NoDatasetError):
+        session.sources()
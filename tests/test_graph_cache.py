@@ -0,0 +1,55 @@
+import pytest
+
+from DataController import DataController
+from GraphCache import GraphCache
+
+pytest.importorskip('matplotlib')
+
+
+@pytest.fixture(scope='module')
+def counts(cleaned_dataset):
+    violations = cleaned_dataset[0]
+    return DataController.violation_code_counts(violations, None), DataController.violation_zip_counts(violations)
+
+
+def test_an_entry_is_kept_per_source_and_version(counts):
+    cache = GraphCache()
+    entry = cache.put('memory', 1, *counts, 10)
+
+    assert cache.get('memory', 1) is entry
+    assert cache.get('memory', 2) is None and cache.get('database', 1) is None
+    assert len(entry['bar'].axes[0].patches) == len(counts[0])
+
+
+def test_the_least_recently_used_entry_is_dropped(counts):
+    cache = GraphCache(max_entries=2)
+    cache.put('memory', 1, *counts, 10)
+    cache.put('memory', 2, *counts, 10)
+    cache.get('memory', 1)
+    cache.put('memory', 3, *counts, 10)
+
+    assert cache.get('memory', 2) is None
+    assert cache.get('memory', 1) is not None and cache.get('memory', 3) is not None
+
+
+def test_showing_another_number_of_codes_only_moves_the_axis(counts):
+    code_counts = counts[0]
+    entry = GraphCache().put('memory', 1, *counts, 5)
+    bars = len(code_counts)
+
+    assert entry['bar'].axes[0].get_xlim() == (bars - 5.5, bars - 0.5)
+    assert not GraphCache.set_number(entry, 5)
+    assert GraphCache.set_number(entry, bars + 10)
+    assert entry['number'] == bars
+    assert entry['bar'].axes[0].get_xlim() == (-0.5, bars - 0.5)
+
+
+def test_clear_forgets_only_the_source_given(counts):
+    cache = GraphCache()
+    cache.put('memory', 1, *counts, 10)
+    cache.put('database', 1, *counts, 10)
+    cache.clear('database')
+
+    assert cache.get('database', 1) is None and cache.get('memory', 1) is not None
+    cache.clear()
+    assert cache.get('memory', 1) is None
@@ -0,0 +1,78 @@
+import json
+
+import pandas as pd
+import pytest
+
+from Instrumentation import Instrumentation, count_rows, instrumented
+
+
+@instrumented
+def head(data, number):
+    return data.head(number)
+
+
+@instrumented
+def outer(data):
+    return head(data, 2)
+
+
+@pytest.fixture(autouse=True)
+def stopped():
+    """" leaves recording off after each test."""
+    yield
+    Instrumentation.disable()
+
+
+def test_nothing_is_recorded_while_it_is_off():
+    assert not Instrumentation.is_enabled()
+    assert len(head(pd.DataFrame({'a': range(5)}), 3)) == 3
+
+
+def test_calls_are_recorded_with_their_rows_and_depth():
+    session = Instrumentation.enable()
+    outer(pd.DataFrame({'a': range(5)}))
+    outer(pd.DataFrame({'a': range(7)}))
+
+    events = {(event['name'], event['depth']) for event in session.events}
+    assert events == {('outer', 0), ('head', 1)}
+    totals = {total['name']: total for total in session.totals()}
+    assert totals['outer']['calls'] == 2 and totals['outer']['rows_in'] == 12 and totals['outer']['rows_out'] == 4
+    assert totals['head']['seconds'] <= totals['outer']['seconds']
+
+
+def test_memory_and_profiles_are_recorded_when_asked_for():
+    session = Instrumentation.enable(memory=True, profile_stage='head')
+    outer(pd.DataFrame({'a': range(1000)}))
+
+    assert all(event['peak_mb'] is not None for event in session.events)
+    assert [event['name'] for event in session.profiles()] == ['head']
+    assert 'function calls' in session.profiles()[0]['profile']
+
+
+def test_unknown_profile_mode_is_refused():
+    with pytest.raises(ValueError):
+        Instrumentation.enable(profile_mode='perf')
+
+
+def test_stages_and_worker_events_are_kept_together(tmp_path):
+    # as a worker process runs a job, then passes its operations back to the session of the GUI
+    result, events = Instrumentation.run_job(lambda data, progress: outer(data), {'memory': False},
+                                             pd.DataFrame({'a': range(4)}), progress=None)
+    assert not Instrumentation.is_enabled()
+    session = Instrumentation.enable()
+    Instrumentation.add_stage('clean: seat numbers', 0.5)
+    session.add_events(events)
+    session.save_json(tmp_path / 'operations.json')
+    session.save_chrome_trace(tmp_path / 'trace.json')
+
+    assert len(result) == 2
+    saved = json.loads((tmp_path / 'operations.json').read_text())
+    assert sorted(event['name'] for event in saved['events']) == ['clean: seat numbers', 'head', 'outer']
+    trace = json.loads((tmp_path / 'trace.json').read_text())['traceEvents']
+    assert {event['ph'] for event in trace} == {'X'} and len(trace) == 3
+
+
+def test_count_rows_adds_up_the_frames_of_a_list():
+    frames = [pd.DataFrame({'a': range(3)}), pd.DataFrame({'a': range(4)}), 'text']
+    assert count_rows(frames) == 7
+    assert count_rows('text') is None
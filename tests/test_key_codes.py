@@ -0,0 +1,84 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from DataAppend import DataAppend
+from DataController import DataController
+from DatasetIndex import DatasetIndex
+from KeyCodes import KeyCodes
+from SyntheticData import SyntheticData
+from ViolationAggregation import ViolationAggregation
+from ZipAnalysis import ZipAnalysis
+
+
+def test_ids_are_packed_and_unpacked_in_order():
+    ids = ['A1', 'A10', 'A2', 'DAJ00E07B', 'FA0170465', 'ZZZZZZZZZZZZ']
+    codes = KeyCodes.pack(ids)
+
+    assert list(KeyCodes.unpack(codes)) == ids
+    assert list(np.argsort(codes)) == list(range(len(ids)))
+
+
+def test_ids_that_do_not_fit_are_not_packed():
+    codes = KeyCodes.pack(['DA1', 'da1', 'DA-1', '', 'D' * 13, None, np.nan, 'DÉ1'])
+
+    assert codes[0] >= 0 and (codes[1:] == -1).all()
+    assert KeyCodes.pack_column(pd.Series(['DA1', 'da1'])) is None
+
+
+@pytest.fixture(scope='module')
+def cleaned(tmp_path_factory):
+    files = SyntheticData.write_dataset(tmp_path_factory.mktemp('keys'), 2000, seed=7, inactive_rate=0.2)
+    dataset = [DataController.read_csv_to_frame(files[name])[1] for name in ['violations', 'inspections', 'inventory']]
+    dataset[0] = dataset[0].set_index('SERIAL NUMBER')
+    return DataController.clean_dataset(dataset, compact=False)
+
+
+def test_compacting_packs_the_ids(cleaned):
+    compacted, report = DataController.compact_dataset(cleaned)
+
+    for data in compacted:
+        for column in ['FACILITY ID', 'SERIAL NUMBER']:
+            if column in data.columns:
+                assert data[column].dtype == 'int64'
+    assert list(KeyCodes.text(compacted[1]['SERIAL NUMBER'])) == list(cleaned[1]['SERIAL NUMBER'])
+    assert (report['after MB'] < report['before MB']).all()
+
+
+def test_an_id_packed_in_one_table_only_is_left_as_text(cleaned):
+    inspections = cleaned[1].assign(**{'SERIAL NUMBER': cleaned[1]['SERIAL NUMBER'].str.lower()})
+    compacted = DataController.compact_dataset([cleaned[0], inspections, cleaned[2]])[0]
+
+    assert hasattr(compacted[0]['SERIAL NUMBER'], 'cat') and hasattr(compacted[1]['SERIAL NUMBER'], 'cat')
+    assert compacted[2]['FACILITY ID'].dtype == 'int64'
+
+
+def test_analyses_match_on_packed_ids(cleaned):
+    compacted = DataController.compact_dataset(cleaned)[0]
+    for dataset in [cleaned, compacted]:
+        index = DatasetIndex(dataset[0], dataset[1])
+        counts = ViolationAggregation.aggregate(dataset[0], dataset[1])['code']
+        facilities = ZipAnalysis.facility_counts(dataset[0], dataset[1])
+        if dataset is cleaned:
+            expected = index.violation_inspection, counts, facilities
+    assert (index.violation_inspection == expected[0]).all()
+    pd.testing.assert_frame_equal(counts.sort_values('violation code').reset_index(drop=True),
+                                  expected[1].sort_values('violation code').reset_index(drop=True))
+    pd.testing.assert_frame_equal(facilities, expected[2])
+
+
+def test_rows_with_ids_that_do_not_fit_are_appended_as_text(cleaned):
+    compacted = DataController.compact_dataset(cleaned)[0]
+    added = cleaned[2].iloc[:1].assign(**{'FACILITY ID': 'fa-new'})
+
+    inventory = DataAppend.concat_frames(compacted[2], DataController.compact_frame(added))
+
+    assert hasattr(inventory['FACILITY ID'], 'cat')
+    assert list(inventory['FACILITY ID'].astype(object)) == list(cleaned[2]['FACILITY ID']) + ['fa-new']
+
+
+def test_first_rows_finds_the_first_row_of_a_repeated_id():
+    column = pd.Series(KeyCodes.pack(['DA0000001', 'DA0000002', 'DA0000001']))
+
+    assert KeyCodes.first_rows(column, ['DA0000001', 'DA0000002', 'DA0000003']).tolist() == [0, 1, -1]
+    assert KeyCodes.first_rows(column.astype('category'), column.to_numpy()[::-1]).tolist() == [0, 1, 0]
@@ -0,0 +1,60 @@
+import pandas as pd
+import pytest
+
+from DatabaseController import DatabaseController
+from LazyCollection import LazyCollection
+
+INSPECTIONS = pd.DataFrame({
+    'SCORE': range(90, 100),
+    'GRADE': list('AAABBBCCCA'),
+    'ACTIVITY DATE': pd.date_range('2020-01-01', periods=10),
+}, index=[f"id{day}" for day in range(10)])
+
+
+@pytest.fixture
+def reads(monkeypatch):
+    """" stands in for the database with the inspections above, recording every query read."""
+    queries = []
+
+    def read_query(choice, columns, start=None, end=None):
+        queries.append((list(columns), start, end))
+        data = INSPECTIONS
+        if start is not None or end is not None:
+            data = data[data['ACTIVITY DATE'].between(pd.Timestamp(start or pd.Timestamp.min),
+                                                      pd.Timestamp(end or pd.Timestamp.max))]
+        return data.reindex(columns=list(columns))
+
+    monkeypatch.setattr(DatabaseController, 'read_query', staticmethod(read_query))
+    return queries
+
+
+def test_new_columns_over_several_fetched_ranges(reads):
+    handle = LazyCollection('inspections')
+    handle.fetch(['SCORE'], '2020-01-01', '2020-01-02')
+    handle.fetch(['SCORE'], '2020-01-06', '2020-01-07')
+    view = handle.fetch(['SCORE', 'GRADE'], '2020-01-01', '2020-01-10')
+
+    assert len(view) == 10
+    assert view.index.is_unique
+    assert view['SCORE'].dtype == INSPECTIONS['SCORE'].dtype
+    pd.testing.assert_frame_equal(view.sort_values('SCORE'), INSPECTIONS[['SCORE', 'GRADE']])
+    assert handle.ranges == [(pd.Timestamp('2020-01-01'), pd.Timestamp('2020-01-10'))]
+
+
+def test_fetched_view_is_not_read_again(reads):
+    handle = LazyCollection('inspections')
+    handle.fetch(['SCORE', 'GRADE'], '2020-01-01', '2020-01-05')
+    count = len(reads)
+    view = handle.fetch(['GRADE'], '2020-01-02', '2020-01-04')
+
+    assert len(reads) == count
+    assert view['GRADE'].tolist() == ['A', 'A', 'B']
+
+
+def test_plan_kinds(reads):
+    handle = LazyCollection('inspections')
+    handle.fetch(['SCORE'], '2020-01-01', '2020-01-02')
+    queries = handle.plan(['SCORE', 'GRADE'], '2020-01-01', '2020-01-04')
+
+    assert [query['kind'] for query in queries] == ['columns', 'range']
+    assert queries[0]['columns'] == ['GRADE']
@@ -0,0 +1,62 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from PeDescription import PeDescription, NUMBER_COLUMNS, TEXT_COLUMNS
+
+NAN = np.nan
+
+
+@pytest.mark.parametrize('description, expected', [
+    ('RESTAURANT (61-150) SEATS LOW RISK', ('RESTAURANT  SEATS LOW RISK', '61-150', 'RESTAURANT',
+                                            61.0, 150.0, NAN, NAN, 1)),
+    ('FOOD MKT RETAIL (1-1,999 SF) MODERATE RISK', ('FOOD MKT RETAIL  MODERATE RISK', '1-1,999 SF', 'FOOD MKT RETAIL',
+                                                    NAN, NAN, 1.0, 1999.0, 2)),
+    ('RESTAURANT (151 + ) SEATS HIGH RISK', ('RESTAURANT  SEATS HIGH RISK', '151 + ', 'RESTAURANT',
+                                             151.0, NAN, NAN, NAN, 3)),
+    ('FOOD MKT RETAIL (25 SF) HIGH RISK', ('FOOD MKT RETAIL  HIGH RISK', '25 SF', 'FOOD MKT RETAIL',
+                                           NAN, NAN, 25.0, 25.0, 3)),
+    ('CATERER', ('CATERER', NAN, 'CATERER', NAN, NAN, NAN, NAN, NAN)),
+    ('CATERER HIGH RISK', ('CATERER HIGH RISK', NAN, 'CATERER', NAN, NAN, NAN, NAN, 3)),
+])
+def test_parse_splits_the_description_into_its_fields(description, expected):
+    parsed = PeDescription.parse(description)
+
+    assert len(parsed) == len(TEXT_COLUMNS) + len(NUMBER_COLUMNS)
+    for field, value in zip(parsed, expected):
+        assert field == value or (pd.isna(field) and pd.isna(value))
+
+
+def test_parse_column_maps_the_fields_to_every_row_and_missing_descriptions_to_nan():
+    descriptions = pd.Series(['RESTAURANT (0-30) SEATS MODERATE RISK', NAN, 'CATERER',
+                              'RESTAURANT (0-30) SEATS MODERATE RISK'], index=[7, 3, 9, 1])
+
+    fields = PeDescription.parse_column(descriptions)
+
+    assert list(fields.columns) == TEXT_COLUMNS + NUMBER_COLUMNS
+    assert fields.index.tolist() == [7, 3, 9, 1]
+    assert fields['SEAT NUMBERS'].tolist()[0] == '0-30' and fields['SEAT NUMBERS'].tolist()[3] == '0-30'
+    assert fields.loc[3].isna().all()
+    assert fields.loc[9, 'PE CATEGORY'] == 'CATERER' and pd.isna(fields.loc[9, 'SEAT NUMBERS'])
+    assert fields['RISK LEVEL'].tolist()[:1] + fields['SEATS HIGH'].tolist()[:1] == [2.0, 30.0]
+    assert all(hasattr(fields[column], 'cat') for column in TEXT_COLUMNS)
+    assert all(fields[column].dtype == 'float64' for column in NUMBER_COLUMNS)
+
+
+def test_parse_column_gives_the_same_fields_for_a_categorical():
+    descriptions = pd.Series(['RESTAURANT (31-60) SEATS HIGH RISK', 'FOOD MKT RETAIL (2,000+ SF) LOW RISK', NAN,
+                              'RESTAURANT (31-60) SEATS HIGH RISK'])
+
+    pd.testing.assert_frame_equal(PeDescription.parse_column(descriptions.astype('category')),
+                                  PeDescription.parse_column(descriptions), check_categorical=False)
+
+
+def test_each_distinct_description_is_parsed_once():
+    PeDescription.parse.cache_clear()
+    descriptions = pd.Series(['RESTAURANT (61-150) SEATS LOW RISK', 'CATERER'] * 500)
+
+    PeDescription.parse_column(descriptions)
+    PeDescription.parse_column(descriptions.astype('category'))
+
+    info = PeDescription.parse.cache_info()
+    assert (info.misses, info.hits) == (2, 2)
@@ -0,0 +1,73 @@
+import pandas as pd
+import pytest
+
+from DataController import DataController
+from DatasetIndex import DatasetIndex
+from ScoreCube import ScoreCube
+
+COLUMNS = ['mean grouped by year', 'median grouped by year', 'mode grouped by year']
+
+
+def same_statistics(expected, actual, group_by):
+    keys = [group_by, 'ACTIVITY DATE']
+    expected = expected.astype({group_by: object}).sort_values(keys).reset_index(drop=True)
+    actual = actual.astype({group_by: object}).sort_values(keys).reset_index(drop=True)
+    pd.testing.assert_frame_equal(expected[keys + COLUMNS], actual[keys + COLUMNS], check_dtype=False)
+
+
+@pytest.mark.parametrize('group_by', ['PE DESCRIPTION', 'Zip Codes'])
+def test_cube_statistics_match_the_inspections(cleaned_dataset, group_by):
+    inspections = cleaned_dataset[1]
+    same_statistics(DataController.score_statistics(inspections, group_by),
+                    ScoreCube.build(inspections).statistics(group_by), group_by)
+
+
+def test_cube_statistics_of_a_date_range_and_filter(cleaned_dataset):
+    inspections = cleaned_dataset[1]
+    kept = inspections[inspections['ACTIVITY DATE'].between('2016-03-01', '2017-08-31') &
+                       inspections['SEAT NUMBERS'].isin(['0-30', '31-60'])]
+    statistics = ScoreCube.build(inspections).statistics('Zip Codes', '2016-03', '2017-08',
+                                                         {'SEAT NUMBERS': ['0-30', '31-60']})
+    assert len(statistics)
+    same_statistics(DataController.score_statistics(kept, 'Zip Codes'), statistics, 'Zip Codes')
+
+
+def plain(histogram):
+    """" the histogram with its index as plain values and without scores that have no inspections."""
+    histogram = histogram.loc[:, histogram.sum() > 0]
+    return histogram.set_axis(pd.MultiIndex.from_tuples(histogram.index.to_list(), names=histogram.index.names)) \
+        .sort_index()
+
+
+def test_adding_and_removing_inspections_matches_building_the_cube(cleaned_dataset):
+    inspections = cleaned_dataset[1]
+    earlier, later = inspections.iloc[:len(inspections) // 2], inspections.iloc[len(inspections) // 2:]
+
+    appended = ScoreCube.build(earlier).append(later)
+    pd.testing.assert_frame_equal(plain(appended.histogram), plain(ScoreCube.build(inspections).histogram))
+    removed = ScoreCube.build(inspections).remove(later)
+    pd.testing.assert_frame_equal(plain(removed.histogram), plain(ScoreCube.build(earlier).histogram))
+    pd.testing.assert_frame_equal(removed.statistics('Zip Codes'), ScoreCube.build(earlier).statistics('Zip Codes'),
+                                  check_dtype=False, check_categorical=False)
+
+
+FILTERS = [
+    {'start': '2016-03-01', 'end': '2017-08-31', 'seating': ['0-30', '31-60']},
+    {'start': '2016-03-17', 'end': '2017-08-09', 'zip_codes': [23524, 24462, 24608, 23232, 24109]},
+    {'start': '2017-05-04', 'end': '2017-05-26'},
+    {'start': '2016-11-20', 'end': '2016-12-10', 'score_range': (80, 95)},
+    {'end': '2016-06-15', 'seating': ['61-150', '151 +'], 'score_range': (90, 100)},
+    {'score_range': (0, 50)},
+]
+
+
+@pytest.mark.parametrize('filters', FILTERS)
+@pytest.mark.parametrize('group_by', ['PE DESCRIPTION', 'Zip Codes'])
+def test_cube_answers_the_filters_of_the_index(cleaned_dataset, filters, group_by):
+    violations, inspections, _ = cleaned_dataset
+    rows = DatasetIndex(violations, inspections).filter_inspections(**filters)
+    cube = ScoreCube.build(inspections)
+
+    expected = DataController.score_statistics(inspections.iloc[rows], group_by)
+    same_statistics(expected, cube.filtered_statistics(group_by, inspections, rows, **filters), group_by)
+    same_statistics(expected, cube.filtered_statistics(group_by, inspections, **filters), group_by)
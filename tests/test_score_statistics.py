@@ -0,0 +1,33 @@
+import pandas as pd
+import pytest
+
+from DataController import DataController
+
+COLUMNS = ['mean grouped by year', 'median grouped by year', 'mode grouped by year']
+
+
+def legacy_statistics(inspections, group_by):
+    """" the yearly groupby the averages were first taken with, with the lowest of several modes."""
+    grouped = inspections[[group_by, 'SCORE', 'ACTIVITY DATE']].groupby(
+        [pd.Grouper(key=group_by), pd.Grouper(key='ACTIVITY DATE', freq='Y')], observed=True)['SCORE']
+    return pd.DataFrame({'mean grouped by year': grouped.mean(), 'median grouped by year': grouped.median(),
+                         'mode grouped by year': grouped.agg(lambda scores: scores.mode().min())}).reset_index()
+
+
+def same_statistics(expected, actual, group_by):
+    keys = [group_by, 'ACTIVITY DATE']
+    expected = expected.astype({group_by: object}).sort_values(keys).reset_index(drop=True)
+    actual = actual.astype({group_by: object}).sort_values(keys).reset_index(drop=True)
+    pd.testing.assert_frame_equal(expected[keys + COLUMNS], actual[keys + COLUMNS], check_dtype=False)
+
+
+@pytest.mark.parametrize('group_by', ['PE DESCRIPTION', 'Zip Codes'])
+def test_score_statistics_match_the_legacy_groupby(cleaned_dataset, group_by):
+    inspections = cleaned_dataset[1]
+    same_statistics(legacy_statistics(inspections, group_by), DataController.score_statistics(inspections, group_by),
+                    group_by)
+
+
+def test_score_statistics_of_no_inspections_are_empty(cleaned_dataset):
+    statistics = DataController.score_statistics(cleaned_dataset[1].iloc[:0], 'Zip Codes')
+    assert statistics.empty
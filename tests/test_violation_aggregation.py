@@ -0,0 +1,35 @@
+import pandas as pd
+
+from DataController import DataController
+from ViolationAggregation import ViolationAggregation
+
+COUNTS = pd.DataFrame({'violation code': ['F1', 'F2', 'F3', 'F4'], 'number of establishments': [5, 9, 1, 7]})
+
+
+def test_top_keeps_the_highest_least_first():
+    assert ViolationAggregation.top(COUNTS, 2)['violation code'].tolist() == ['F4', 'F2']
+    assert ViolationAggregation.top(COUNTS)['violation code'].tolist() == ['F3', 'F1', 'F4', 'F2']
+    assert len(ViolationAggregation.top(COUNTS, 10)) == 4
+
+
+def test_top_of_no_groups_is_empty():
+    for number in [0, -3]:
+        top = ViolationAggregation.top(COUNTS, number)
+        assert top.empty and list(top.columns) == list(COUNTS.columns)
+
+
+def test_violations_of_a_repeated_serial_count_the_facility_of_its_first_inspection():
+    inspections = pd.DataFrame({'SERIAL NUMBER': ['DA0000001', 'DA0000002', 'DA0000001'],
+                                'FACILITY ID': ['FA0000001', 'FA0000002', 'FA0000003']})
+    violations = pd.DataFrame({'SERIAL NUMBER': ['DA0000001', 'DA0000002', 'DA0000001', 'DA0000009'],
+                               'VIOLATION CODE': ['F030', 'F030', 'F030', 'F031'],
+                               'Zip Codes': [90001, 90002, 90001, 90004]})
+
+    aggregate = ViolationAggregation.aggregate(violations, DataController.compact_frame(inspections))
+
+    codes = aggregate['code'].set_index('violation code')
+    assert codes.loc['F030', 'number of establishments'] == 2
+    assert codes.loc['F030', 'number of violations'] == 3
+    assert codes.loc['F031', 'number of establishments'] == 0
+    zips = aggregate['zip'].set_index('zip area')['number of establishments']
+    assert zips.to_dict() == {90001: 1, 90002: 1, 90004: 0}
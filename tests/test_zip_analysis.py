@@ -0,0 +1,63 @@
+import numpy as np
+import pandas as pd
+import pytest
+from scipy import stats
+
+from DataController import DataController
+from ZipAnalysis import ZipAnalysis
+
+INSPECTIONS = pd.DataFrame({
+    'SERIAL NUMBER': ['DA0000001', 'DA0000002', 'DA0000003', 'DA0000004', 'DA0000005', 'DA0000001'],
+    'FACILITY ID': ['FA0000001', 'FA0000002', 'FA0000003', 'FA0000003', 'FA0000004', 'FA0000001'],
+    'Zip Codes': [90001, 90001, 90002, 90002, 90003, 90001],
+    'SEAT NUMBERS': ['0-30'] * 6})
+VIOLATIONS = pd.DataFrame({'SERIAL NUMBER': ['DA0000001', 'DA0000001', 'DA0000003', 'DA0000004', 'DA0000004',
+                                             'DA0000004', 'DA0000009']})
+
+
+def test_facility_counts_and_rates_of_each_zip_code():
+    facilities = ZipAnalysis.facility_counts(VIOLATIONS, DataController.compact_frame(INSPECTIONS))
+
+    assert facilities.set_index('FACILITY ID')['violations'].to_dict() == \
+        {'FA0000001': 2, 'FA0000002': 0, 'FA0000003': 4, 'FA0000004': 0}
+    rates = ZipAnalysis.zip_rates(facilities).set_index('zip area')
+    assert rates['facilities'].to_dict() == {90002: 1, 90001: 2, 90003: 1}
+    assert rates['violations per facility'].to_dict() == {90002: 4.0, 90001: 1.0, 90003: 0.0}
+    assert rates.loc[90001, 'rate ratio'] == pytest.approx(1 / 1.5)
+    assert rates.loc[90001, 'median per facility'] == 1.0
+
+
+def test_statistics_match_scipy(cleaned_dataset):
+    violations, inspections, _ = cleaned_dataset
+
+    result = ZipAnalysis.analyse(violations, inspections, permutations=0)
+
+    facilities = result['facilities']
+    groups = [group.to_numpy(dtype='float64')
+              for _, group in facilities.groupby('Zip Codes', observed=True)['violations']]
+    sizes = np.array([len(group) for group in groups], dtype='float64')
+    sums = np.array([group.sum() for group in groups])
+    chi_square = stats.chisquare(sums, sums.sum() * sizes / sizes.sum())
+    kruskal_wallis = stats.kruskal(*groups)
+    statistics = result['statistics'].set_index('test')
+    assert statistics.loc['chi-square', 'statistic'] == pytest.approx(chi_square.statistic)
+    assert statistics.loc['chi-square', 'p value'] == pytest.approx(chi_square.pvalue)
+    assert statistics.loc['Kruskal-Wallis', 'statistic'] == pytest.approx(kruskal_wallis.statistic)
+    assert statistics.loc['Kruskal-Wallis', 'p value'] == pytest.approx(kruskal_wallis.pvalue)
+    assert statistics['degrees of freedom'].tolist() == [len(groups) - 1] * 2
+
+
+def test_permutation_p_values_do_not_depend_on_batches_or_workers(cleaned_dataset):
+    violations, inspections, _ = cleaned_dataset
+
+    results = [ZipAnalysis.analyse(violations, inspections, permutations=230, seed=5, workers=workers, batch=batch)
+               for workers, batch in [(1, None), (1, 50), (1, 120), (2, 100)]]
+
+    first = results[0]
+    for result in results[1:]:
+        pd.testing.assert_frame_equal(result['statistics'], first['statistics'])
+        for test, permuted in first['permutations'].items():
+            np.testing.assert_array_equal(result['permutations'][test], permuted)
+    assert len(first['permutations']['chi-square']) == 230
+    other = ZipAnalysis.analyse(violations, inspections, permutations=230, seed=6)
+    assert not np.array_equal(other['permutations']['chi-square'], first['permutations']['chi-square'])